@@ -2,18 +2,57 @@
 
 from __future__ import annotations
 
+from collections.abc import Mapping
+import cProfile
+import logging
+import time
+
 from aiohttp import ClientSession
+import voluptuous as vol
 
-from homeassistant.config_entries import ConfigEntry, ConfigSubentry
-from homeassistant.const import CONF_API_KEY, CONF_SCAN_INTERVAL, Platform
-from homeassistant.core import HomeAssistant
-from homeassistant.exceptions import ConfigEntryAuthFailed, ConfigEntryNotReady
+from homeassistant.config_entries import ConfigSubentry
+from homeassistant.const import (
+    CONF_API_KEY,
+    CONF_SCAN_INTERVAL,
+    EVENT_HOMEASSISTANT_CLOSE,
+    Platform,
+)
+from homeassistant.core import (
+    Event,
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import (
+    ConfigEntryAuthFailed,
+    ConfigEntryNotReady,
+    HomeAssistantError,
+)
+from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.typing import ConfigType
+from homeassistant.util.ssl import client_context
 
-from .api import ApiAuthenticationError, ApiGeneralError, SgBusArrivals
+from .api import (
+    ApiAuthenticationError,
+    ApiGeneralError,
+    SgBusArrivals,
+    create_dedicated_session,
+)
 from .const import (
+    CONF_DEDICATED_SESSION,
+    CONF_FAST_STARTUP,
+    CONF_INSTRUMENTATION,
     DOMAIN,
+    SERVICE_ATTR_REFRESH_CYCLES,
+    SERVICE_PROFILE,
     SERVICE_REFRESH_BUS_ARRIVALS,
+    SUBENTRY_TYPE_APPROACHING_BUS,
+    SUBENTRY_TYPE_BUS_SERVICE,
+    SUBENTRY_TYPE_BUS_STOP,
+    SUBENTRY_TYPE_NEARBY_BUS_STOPS,
     SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
 )
 from .coordinator import (
@@ -21,19 +60,61 @@ from .coordinator import (
     SgBusArrivalsConfigEntry,
     SgBusArrivalsData,
     TrainServiceAlertsUpdateCoordinator,
+    get_arrival_history_store,
+    get_bus_arrivals_store,
+    get_bus_stops_store,
 )
+from .models import ConnectionStatistics
+from .websocket_api import async_setup as async_setup_websocket_api
+
+_LOGGER = logging.getLogger(__name__)
 
 _PLATFORMS: list[Platform] = [Platform.SENSOR]
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+PROFILE_SCHEMA: vol.Schema = vol.Schema(
+    {
+        vol.Optional(SERVICE_ATTR_REFRESH_CYCLES, default=5): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=100)
+        )
+    }
+)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the websocket commands of SG Bus Arrivals."""
+    async_setup_websocket_api(hass)
+    return True
+
 
 async def async_setup_entry(
     hass: HomeAssistant, entry: SgBusArrivalsConfigEntry
 ) -> bool:
     """Set up SG Bus Arrivals from a config entry."""
 
-    # create instance of our api
-    session: ClientSession = async_get_clientsession(hass)
-    sg_bus_arrivals: SgBusArrivals = SgBusArrivals(session, entry.data[CONF_API_KEY])
+    # create instance of our api, optionally with its own tuned connection pool
+    session: ClientSession
+    connection_statistics: ConnectionStatistics | None = None
+    if entry.data.get(CONF_DEDICATED_SESSION, False):
+        connection_statistics = ConnectionStatistics()
+        session = create_dedicated_session(client_context(), connection_statistics)
+        entry.async_on_unload(session.close)
+
+        async def _async_close_session(event: Event) -> None:
+            await session.close()
+
+        entry.async_on_unload(
+            hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, _async_close_session)
+        )
+    else:
+        session = async_get_clientsession(hass)
+    sg_bus_arrivals: SgBusArrivals = SgBusArrivals(
+        session,
+        entry.data[CONF_API_KEY],
+        entry.data.get(CONF_INSTRUMENTATION, False),
+        connection_statistics,
+    )
     bus_arrivals_coordinator: BusArrivalsUpdateCoordinator = (
         BusArrivalsUpdateCoordinator(
             hass, entry, sg_bus_arrivals, entry.data[CONF_SCAN_INTERVAL]
@@ -52,16 +133,28 @@ async def async_setup_entry(
         )
     )
     sg_bus_arrivals_data: SgBusArrivalsData = SgBusArrivalsData(
-        sg_bus_arrivals, bus_arrivals_coordinator, train_service_alerts_coordinator
+        sg_bus_arrivals,
+        bus_arrivals_coordinator,
+        train_service_alerts_coordinator,
+        loaded_data=entry.data,
+        loaded_subentries=entry.subentries,
     )
 
-    # validate our api
-    try:
-        await sg_bus_arrivals.authenticate()
-    except ApiAuthenticationError as e:
-        raise ConfigEntryAuthFailed from e
-    except ApiGeneralError as e:
-        raise ConfigEntryNotReady from e
+    # sensors start with the last bus arrivals until the first refresh
+    await bus_arrivals_coordinator.async_restore_data()
+    await bus_arrivals_coordinator.async_restore_arrival_history()
+
+    # validate our api, with fast startup the first poll validates it instead
+    if not entry.data.get(CONF_FAST_STARTUP, False):
+        try:
+            await sg_bus_arrivals.authenticate()
+        except ApiAuthenticationError as e:
+            raise ConfigEntryAuthFailed from e
+        except ApiGeneralError as e:
+            # the restored bus arrivals are shown until the api is reachable
+            if not bus_arrivals_coordinator.has_restored_arrivals:
+                raise ConfigEntryNotReady from e
+            _LOGGER.warning("Starting with the saved bus arrivals: %s", e)
 
     # store reference to our api so that sensor entites can use it
     entry.runtime_data = sg_bus_arrivals_data
@@ -77,17 +170,109 @@ async def async_setup_entry(
         DOMAIN, SERVICE_REFRESH_BUS_ARRIVALS, refresh_bus_arrivals
     )
 
+    async def profile(call: ServiceCall) -> ServiceResponse:
+        """Service call to capture a cProfile trace of bus arrivals refreshes."""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as err:
+            # only 1 profiler can be active, e.g. the Profiler integration
+            raise HomeAssistantError(f"Another profiler is active: {err}") from err
+        try:
+            for _ in range(call.data[SERVICE_ATTR_REFRESH_CYCLES]):
+                await bus_arrivals_coordinator.async_refresh()
+        finally:
+            profiler.disable()
+
+        filename: str = hass.config.path(f"{DOMAIN}_profile_{int(time.time())}.cprof")
+        await hass.async_add_executor_job(profiler.dump_stats, filename)
+        return {"filename": filename}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PROFILE,
+        profile,
+        schema=PROFILE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
     # pass config to sensor.py to create sensor entites
     await hass.config_entries.async_forward_entry_setups(entry, _PLATFORMS)
 
     return True
 
 
-async def _async_update_listener(hass: HomeAssistant, config_entry: ConfigEntry):
-    """Handle options update."""
+async def _async_update_listener(
+    hass: HomeAssistant, config_entry: SgBusArrivalsConfigEntry
+):
+    """Handle options update.
+
+    Bus service, bus stop, nearby bus stops and approaching bus subentries are
+    added and removed without a reload.
+    Any other change reloads the config entry.
+    """
+    sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+    if _async_update_bus_subentries(config_entry, sg_bus_arrivals_data):
+        await sg_bus_arrivals_data.bus_arrivals_coordinator.async_request_refresh()
+        return
+
     await hass.config_entries.async_reload(config_entry.entry_id)
 
 
+@callback
+def _async_update_bus_subentries(
+    config_entry: SgBusArrivalsConfigEntry, sg_bus_arrivals_data: SgBusArrivalsData
+) -> bool:
+    """Attach the entities of added bus subentries to the loaded config entry.
+
+    The entities of removed subentries are removed with their registry entries.
+    Returns False if the change requires a reload.
+    """
+    loaded_subentries: Mapping[str, ConfigSubentry] = (
+        sg_bus_arrivals_data.loaded_subentries
+    )
+    added_subentries: list[ConfigSubentry] = [
+        subentry
+        for subentry_id, subentry in config_entry.subentries.items()
+        if subentry_id not in loaded_subentries
+    ]
+    if (
+        sg_bus_arrivals_data.async_add_bus_entities is None
+        or config_entry.data != sg_bus_arrivals_data.loaded_data
+        or any(
+            subentry_id in config_entry.subentries
+            and config_entry.subentries[subentry_id] != subentry
+            for subentry_id, subentry in loaded_subentries.items()
+        )
+        or any(
+            subentry.subentry_type
+            not in (
+                SUBENTRY_TYPE_BUS_SERVICE,
+                SUBENTRY_TYPE_BUS_STOP,
+                SUBENTRY_TYPE_NEARBY_BUS_STOPS,
+                SUBENTRY_TYPE_APPROACHING_BUS,
+            )
+            for subentry in added_subentries
+        )
+    ):
+        return False
+
+    sg_bus_arrivals_data.loaded_subentries = config_entry.subentries
+    for subentry in added_subentries:
+        sg_bus_arrivals_data.async_add_bus_entities(subentry)
+    sg_bus_arrivals_data.bus_arrivals_coordinator.async_reset_bus_stop_codes()
+    return True
+
+
+async def async_remove_entry(
+    hass: HomeAssistant, entry: SgBusArrivalsConfigEntry
+) -> None:
+    """Remove the saved data of a removed config entry."""
+    await get_bus_arrivals_store(hass, entry.entry_id).async_remove()
+    await get_arrival_history_store(hass, entry.entry_id).async_remove()
+    await get_bus_stops_store(hass, entry.entry_id).async_remove()
+
+
 async def async_unload_entry(
     hass: HomeAssistant, entry: SgBusArrivalsConfigEntry
 ) -> bool:
@@ -98,5 +283,6 @@ async def async_unload_entry(
     )
 
     hass.services.async_remove(DOMAIN, SERVICE_REFRESH_BUS_ARRIVALS)
+    hass.services.async_remove(DOMAIN, SERVICE_PROFILE)
 
     return isUnloaded
@@ -1,44 +1,175 @@
 """Handle API calls to LTA DataMall for querying bus arrivals."""
 
-from datetime import UTC, datetime
+import asyncio
+from collections import deque
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
 import logging
+import json
+import re
+import ssl
 import time
+from types import SimpleNamespace
 from typing import Any
 
 import aiohttp
-
-from .models import BusArrival, BusStop, NextBus, TrainServiceAlert
+from aiohttp import hdrs
+
+from .models import (
+    AffectedSegment,
+    BusArrival,
+    BusStop,
+    CircuitBreakerStatistics,
+    ConnectionStatistics,
+    EndpointStatistics,
+    NextBus,
+    OperatingHours,
+    RateLimitEvent,
+    TrainServiceAlert,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
 API_BASE_URL: str = "https://datamall2.mytransport.sg/ltaodataservice"
 MAX_PAGES: int = 100
 BUS_ARRIVALS_COUNT: int = 3
+ACCEPT_ENCODING: str = "gzip, deflate"
+# upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS: tuple[float, ...] = (0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# requests are counted per minute over this window
+RECENT_REQUESTS_MINUTES: int = 60
+RATE_LIMIT_EVENTS_COUNT: int = 20
+# dedicated session tuning
+MAX_CONNECTIONS: int = 10
+KEEPALIVE_TIMEOUT_SECONDS: float = 60
+DNS_CACHE_TTL_SECONDS: int = 300
+REQUEST_TIMEOUT: aiohttp.ClientTimeout = aiohttp.ClientTimeout(
+    total=10, connect=5, sock_read=10
+)
+# each endpoint family fails fast after consecutive failures, until a probe
+# request succeeds
+CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5
+CIRCUIT_BREAKER_OPEN_SECONDS: float = 60
+CIRCUIT_BREAKER_STATES: list[str] = ["closed", "half_open", "open"]
+TRAIN_LINES: list[str] = [
+    "ccl",
+    "cel",
+    "cgl",
+    "dtl",
+    "ewl",
+    "nel",
+    "nsl",
+    "pel",
+    "pwl",
+    "sel",
+    "swl",
+    "bpl",
+]
+
+# matches whole line codes only, e.g. "CCL" but not "CCLE"
+TRAIN_LINE_PATTERN: re.Pattern[str] = re.compile(
+    r"\b(" + "|".join(line.upper() for line in TRAIN_LINES) + r")\b"
+)
 
 
 # https://datamall.lta.gov.sg/content/dam/datamall/datasets/LTA_DataMall_API_User_Guide.pdf
 class SgBusArrivals:
     """LTA DataMall API client."""
 
-    def __init__(self, session: aiohttp.ClientSession, account_key: str) -> None:
-        """Initialize with the given account key."""
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        account_key: str,
+        instrumented: bool = False,
+        connection_statistics: ConnectionStatistics | None = None,
+    ) -> None:
+        """Initialize with the given account key.
+
+        With instrumentation enabled, status codes and latencies are also recorded.
+        The connection statistics are those of a dedicated session, if any.
+        """
 
         self._session = session
         self._account_key = account_key
+        self._instrumented = instrumented
+        self._connection_statistics = connection_statistics
+        self._statistics: dict[str, EndpointStatistics] = {}
+        # [minute, requests] buckets of the recent requests by endpoint
+        self._recent_requests: dict[str, deque[list[int]]] = {}
+        self._rate_limit_events: deque[RateLimitEvent] = deque(
+            maxlen=RATE_LIMIT_EVENTS_COUNT
+        )
+        self._circuit_breakers: dict[str, CircuitBreaker] = {
+            family: CircuitBreaker(family)
+            for family in ("bus_arrivals", "train_service_alerts", "datasets")
+        }
+
+    async def _get_request(self, endpoint: str, decode: bool = True) -> Any:
+        """Invoke the given API endpoint through its circuit breaker.
+
+        Timeouts, connection errors, rate limiting and server errors count as
+        failures, other responses count as successes.
+        Returns the body undecoded if decode is False.
+        """
 
-    async def _get_request(self, endpoint: str) -> Any:
+        circuit_breaker: CircuitBreaker = self._circuit_breakers[
+            _get_endpoint_family(endpoint)
+        ]
+        circuit_breaker.before_request()
+        try:
+            response: Any = await self._invoke(endpoint, decode)
+        except ApiGeneralError as err:
+            if err.http_status == 429 or err.http_status >= 500:
+                circuit_breaker.record_failure()
+            else:
+                circuit_breaker.record_success()
+            raise
+        except ApiAuthenticationError:
+            circuit_breaker.record_success()
+            raise
+        except (aiohttp.ClientError, TimeoutError):
+            circuit_breaker.record_failure()
+            raise
+        else:
+            circuit_breaker.record_success()
+            return response
+        finally:
+            # e.g. cancelled, the next request probes again
+            circuit_breaker.release_probe()
+
+    async def _invoke(self, endpoint: str, decode: bool) -> Any:
         """Invoke the given API endpoint."""
 
+        start: float = time.perf_counter()
         async with self._session.get(
             API_BASE_URL + endpoint,
-            headers={"AccountKey": self._account_key},
+            headers={
+                "AccountKey": self._account_key,
+                hdrs.ACCEPT_ENCODING: ACCEPT_ENCODING,
+            },
         ) as response:
+            # aiohttp decompresses the body while reading it and caches the
+            # result, so json() and text() below do not read it again
+            body: bytes = await response.read()
+            statistics: EndpointStatistics = self._record_statistics(
+                endpoint, response.content_length, len(body)
+            )
+            if self._instrumented:
+                self._record_instrumentation(
+                    statistics, response.status, time.perf_counter() - start
+                )
+            if response.status == 429:
+                self._record_rate_limit(
+                    statistics, endpoint, response.headers.get(hdrs.RETRY_AFTER)
+                )
+
             if response.status == 200:
-                json: Any = await response.json()
                 _LOGGER.debug(
                     "Api invoked, endpoint: %s, status: %s", endpoint, response.status
                 )
-                return json
+                if not decode:
+                    return body
+                return await response.json()
 
             text: str = await response.text()
             _LOGGER.warning(
@@ -53,6 +184,110 @@ class SgBusArrivals:
 
             raise ApiGeneralError(endpoint, response.status)
 
+    def _record_statistics(
+        self, endpoint: str, content_length: int | None, decoded_length: int
+    ) -> EndpointStatistics:
+        """Record the response size for the given endpoint.
+
+        Content-Length is the compressed size when the response is encoded.
+        If the server does not send it (chunked response), the decoded size is used.
+        """
+
+        endpoint_name: str = _get_endpoint_name(endpoint)
+        if endpoint_name not in self._statistics:
+            self._statistics[endpoint_name] = EndpointStatistics()
+            self._recent_requests[endpoint_name] = deque()
+
+        minute: int = int(time.monotonic() // 60)
+        recent_requests: deque[list[int]] = self._recent_requests[endpoint_name]
+        if recent_requests and recent_requests[-1][0] == minute:
+            recent_requests[-1][1] += 1
+        else:
+            recent_requests.append([minute, 1])
+        while recent_requests[0][0] <= minute - RECENT_REQUESTS_MINUTES:
+            recent_requests.popleft()
+
+        statistics: EndpointStatistics = self._statistics[endpoint_name]
+        statistics.requests += 1
+        statistics.bytes_on_wire += (
+            content_length if content_length is not None else decoded_length
+        )
+        statistics.bytes_decoded += decoded_length
+        return statistics
+
+    def _record_instrumentation(
+        self, statistics: EndpointStatistics, status: int, latency: float
+    ) -> None:
+        """Record the status code and latency of a response."""
+
+        statistics.status_codes[status] = statistics.status_codes.get(status, 0) + 1
+        statistics.total_latency += latency
+
+        bucket: str = next(
+            (str(bound) for bound in LATENCY_BUCKETS if latency <= bound), "+Inf"
+        )
+        statistics.latency_histogram[bucket] = (
+            statistics.latency_histogram.get(bucket, 0) + 1
+        )
+
+    def _record_rate_limit(
+        self, statistics: EndpointStatistics, endpoint: str, retry_after: str | None
+    ) -> None:
+        """Record a rate limited (HTTP 429) response."""
+
+        statistics.rate_limited += 1
+        self._rate_limit_events.append(
+            RateLimitEvent(
+                _get_endpoint_name(endpoint), datetime.now(UTC).isoformat(), retry_after
+            )
+        )
+
+    def get_statistics(self) -> dict[str, EndpointStatistics]:
+        """Get network usage statistics by endpoint."""
+        return self._statistics
+
+    def get_connection_statistics(self) -> ConnectionStatistics | None:
+        """Get the connection reuse statistics of the dedicated session."""
+        return self._connection_statistics
+
+    def get_recent_requests(self) -> dict[str, int]:
+        """Get the number of requests by endpoint in the last hour."""
+
+        minute: int = int(time.monotonic() // 60)
+        return {
+            endpoint_name: sum(
+                requests
+                for request_minute, requests in recent_requests
+                if request_minute > minute - RECENT_REQUESTS_MINUTES
+            )
+            for endpoint_name, recent_requests in self._recent_requests.items()
+        }
+
+    def get_rate_limit_events(self) -> list[RateLimitEvent]:
+        """Get the most recent rate limited responses, oldest first."""
+        return list(self._rate_limit_events)
+
+    def get_circuit_breakers(self) -> dict[str, CircuitBreakerStatistics]:
+        """Get the circuit breaker state by endpoint family."""
+        return {
+            family: circuit_breaker.statistics
+            for family, circuit_breaker in self._circuit_breakers.items()
+        }
+
+    def get_circuit_breaker_state(self) -> str:
+        """Get the worst circuit breaker state of all endpoint families."""
+        return max(
+            (
+                circuit_breaker.statistics.state
+                for circuit_breaker in self._circuit_breakers.values()
+            ),
+            key=CIRCUIT_BREAKER_STATES.index,
+        )
+
+    def get_circuit_breaker_states(self) -> list[str]:
+        """Get circuit breaker states."""
+        return CIRCUIT_BREAKER_STATES
+
     async def authenticate(self) -> None:
         """Verify the account key by making an API call."""
 
@@ -76,11 +311,7 @@ class SgBusArrivals:
             # filter by bus stop code
             bus_stop = next(
                 (
-                    BusStop(
-                        bus_stop["BusStopCode"],
-                        bus_stop["RoadName"],
-                        bus_stop["Description"],
-                    )
+                    _parse_bus_stop(bus_stop)
                     for bus_stop in response["value"]
                     if bus_stop["BusStopCode"] == bus_stop_code
                 ),
@@ -92,32 +323,71 @@ class SgBusArrivals:
 
         return None
 
-    async def get_all_bus_services(self) -> dict[str, set[str]]:
-        """Get all bus services for all bus stops.
+    async def _get_dataset(
+        self, endpoint: str, parse_page: Callable[[list[dict[str, Any]]], None]
+    ) -> None:
+        """Get all pages of a dataset endpoint.
 
-        Returns a mapping of bus stop codes to the bus services.
-        This is a slow API call.
+        Each page is decoded and parsed in an executor thread so the large
+        responses do not block the event loop, one page at a time.
         """
 
-        start: float = time.time()
-
-        all_bus_services: dict[str, set[str]] = {}
-
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
         page: int = 0
         while page < MAX_PAGES:
             page = page + 1
-            response: Any = await self._get_request(f"/BusRoutes?page={page}")
-
-            if response["value"] == []:
+            body: bytes = await self._get_request(
+                f"{endpoint}?page={page}", decode=False
+            )
+            if not await loop.run_in_executor(None, _parse_page, body, parse_page):
                 break
 
-            for bus_route in response["value"]:
-                bus_stop_code: str = bus_route["BusStopCode"]
-                if bus_stop_code not in all_bus_services:
-                    all_bus_services[bus_stop_code] = set()
+    async def get_all_bus_stops(self) -> dict[str, BusStop]:
+        """Get all bus stops.
+
+        Returns a mapping of bus stop codes to the bus stops.
+        """
+
+        all_bus_stops: dict[str, BusStop] = {}
 
-                bus_services: set[str] = all_bus_services[bus_stop_code]
-                bus_services.add(bus_route["ServiceNo"])
+        def _parse_bus_stops(rows: list[dict[str, Any]]) -> None:
+            for bus_stop in rows:
+                all_bus_stops[bus_stop["BusStopCode"]] = _parse_bus_stop(bus_stop)
+
+        await self._get_dataset("/BusStops", _parse_bus_stops)
+        return all_bus_stops
+
+    async def get_all_bus_services(self) -> dict[str, dict[str, OperatingHours]]:
+        """Get all bus services for all bus stops.
+
+        Returns a mapping of bus stop codes to the bus services and their first
+        and last bus times at the bus stop.
+        This is a slow API call.
+        """
+
+        start: float = time.time()
+
+        all_bus_services: dict[str, dict[str, OperatingHours]] = {}
+
+        def _parse_bus_routes(rows: list[dict[str, Any]]) -> None:
+            for bus_route in rows:
+                bus_services: dict[str, OperatingHours] = (
+                    all_bus_services.setdefault(bus_route["BusStopCode"], {})
+                )
+                operating_hours: OperatingHours = _parse_operating_hours(bus_route)
+                # loop services pass some bus stops twice
+                previous: OperatingHours | None = bus_services.get(
+                    bus_route["ServiceNo"]
+                )
+                if previous is not None:
+                    operating_hours = OperatingHours(
+                        _merge_times(previous.weekdays, operating_hours.weekdays),
+                        _merge_times(previous.saturdays, operating_hours.saturdays),
+                        _merge_times(previous.sundays, operating_hours.sundays),
+                    )
+                bus_services[bus_route["ServiceNo"]] = operating_hours
+
+        await self._get_dataset("/BusRoutes", _parse_bus_routes)
 
         end: float = time.time()
         seconds_elapsed: float = end - start
@@ -127,8 +397,10 @@ class SgBusArrivals:
     async def get_bus_services(self, bus_stop_code: str) -> set[str]:
         """Get bus services for the given bus stop."""
 
-        all_bus_services: dict[str, set[str]] = await self.get_all_bus_services()
-        return all_bus_services[bus_stop_code]
+        all_bus_services: dict[str, dict[str, OperatingHours]] = (
+            await self.get_all_bus_services()
+        )
+        return set(all_bus_services[bus_stop_code])
 
     async def get_bus_arrivals(self, bus_stop_code: str) -> list[BusArrival]:
         """Get bus arrivals."""
@@ -137,24 +409,14 @@ class SgBusArrivals:
             f"/v3/BusArrival?BusStopCode={bus_stop_code}"
         )
 
+        now_utc: datetime = datetime.now(UTC)
         return [
             BusArrival(
                 response["BusStopCode"],
                 bus_arrival["ServiceNo"],
                 bus_arrival["Operator"].lower(),
                 [
-                    NextBus(
-                        self._compute_arrival_minutes(
-                            bus_arrival[index]["EstimatedArrival"]
-                        ),
-                        bus_arrival[index]["Type"].lower(),
-                        bus_arrival[index]["Feature"].lower()
-                        if bus_arrival[index]["Feature"] != ""
-                        else "none",
-                        bus_arrival[index]["Load"].lower(),
-                    )
-                    if bus_arrival[index]["EstimatedArrival"] != ""
-                    else NextBus()
+                    self._parse_next_bus(bus_arrival[index], now_utc)
                     for index in [
                         "NextBus",
                         "NextBus2",
@@ -165,19 +427,22 @@ class SgBusArrivals:
             for bus_arrival in response["Services"]
         ]
 
-    def _compute_arrival_minutes(self, arrival_str: str) -> int:
-        """Compute arrival minutes."""
+    def _parse_next_bus(self, next_bus: dict[str, Any], now_utc: datetime) -> NextBus:
+        """Parse the next bus, with the arrival time kept to recompute the minutes."""
 
-        arrival_datetime: datetime = datetime.fromisoformat(arrival_str)
-        now_utc: datetime = datetime.now(UTC)
-
-        minutes: float = (arrival_datetime - now_utc).total_seconds() / 60
-
-        # If the bus is already past, return 0
-        if minutes < 0:
-            return 0
+        if next_bus["EstimatedArrival"] == "":
+            return NextBus()
 
-        return int(minutes)  # rounded down
+        arrival_datetime: datetime = datetime.fromisoformat(
+            next_bus["EstimatedArrival"]
+        )
+        return NextBus(
+            compute_arrival_minutes(arrival_datetime, now_utc),
+            next_bus["Type"].lower(),
+            next_bus["Feature"].lower() if next_bus["Feature"] != "" else "none",
+            next_bus["Load"].lower(),
+            arrival_datetime,
+        )
 
     def get_bus_types(self) -> list[str]:
         """Get bus types."""
@@ -201,50 +466,316 @@ class SgBusArrivals:
 
     def get_train_lines(self) -> list[str]:
         """Get train service lines."""
-        return [
-            "ccl",
-            "cel",
-            "cgl",
-            "dtl",
-            "ewl",
-            "nel",
-            "nsl",
-            "pel",
-            "pwl",
-            "sel",
-            "swl",
-            "bpl",
-        ]
+        return TRAIN_LINES
 
     async def get_train_service_alerts(self) -> dict[str, TrainServiceAlert]:
         """Get train service alerts."""
-        alerts: dict[str, TrainServiceAlert] = {}
 
         response: Any = await self._get_request("/TrainServiceAlerts")
-        value: dict[str, Any] = response["value"]
-        all_messages: list[dict[str, str]] = value["Message"]
-
-        train_lines: list[str] = self.get_train_lines()
-        for train_line in train_lines:
-            messages: list[str] = [
-                message["Content"]
-                for message in all_messages
-                if train_line.upper() in message["Content"]
-            ]
-            alerts[train_line] = TrainServiceAlert(
-                "disrupted" if messages else "normal", messages
+        return self._parse_train_service_alerts(response["value"])
+
+    def _parse_train_service_alerts(
+        self, value: dict[str, Any]
+    ) -> dict[str, TrainServiceAlert]:
+        """Assign messages and affected segments to train lines in a single pass."""
+
+        messages_by_line: dict[str, list[str]] = {line: [] for line in TRAIN_LINES}
+        for message in value["Message"]:
+            content: str = message["Content"]
+            # a message may mention the same line more than once
+            for line in dict.fromkeys(TRAIN_LINE_PATTERN.findall(content)):
+                messages_by_line[line.lower()].append(content)
+
+        segments_by_line: dict[str, list[AffectedSegment]] = {
+            line: [] for line in TRAIN_LINES
+        }
+        for segment in value.get("AffectedSegments", []):
+            line = segment["Line"].lower()
+            if line in segments_by_line:
+                segments_by_line[line].append(
+                    AffectedSegment(
+                        line,
+                        segment.get("Direction", ""),
+                        self._split_stations(segment.get("Stations")),
+                        self._split_stations(segment.get("FreePublicBus")),
+                        self._split_stations(segment.get("FreeMRTShuttle")),
+                        segment.get("MRTShuttleDirection", ""),
+                    )
+                )
+
+        return {
+            line: TrainServiceAlert(
+                "disrupted" if messages or segments_by_line[line] else "normal",
+                messages,
+                segments_by_line[line],
             )
+            for line, messages in messages_by_line.items()
+        }
+
+    def _split_stations(self, stations: str | None) -> list[str]:
+        """Split a comma separated list of station codes."""
+
+        if not stations:
+            return []
+        return [station.strip() for station in stations.split(",") if station.strip()]
+
+
+class CircuitBreaker:
+    """Fail fast while the endpoints of a family are failing.
+
+    The circuit opens after CIRCUIT_BREAKER_FAILURE_THRESHOLD consecutive
+    failures and requests are rejected without calling the API. After
+    CIRCUIT_BREAKER_OPEN_SECONDS, a single probe request is let through
+    (half-open), which closes the circuit if it succeeds and opens it again if it
+    fails.
+    """
+
+    def __init__(self, family: str) -> None:
+        """Initialize a closed circuit."""
+        self._family = family
+        self._opened_at: float = 0
+        self._probing: bool = False
+        self.statistics: CircuitBreakerStatistics = CircuitBreakerStatistics()
+
+    def before_request(self) -> None:
+        """Reject the request while open, or let it through as the probe."""
+
+        if self.statistics.state == "closed":
+            return
+        if (
+            self._probing
+            or time.monotonic() < self._opened_at + CIRCUIT_BREAKER_OPEN_SECONDS
+        ):
+            self.statistics.rejected += 1
+            raise ApiCircuitOpenError(self._family)
+        self.statistics.state = "half_open"
+        self._probing = True
+
+    def record_success(self) -> None:
+        """Close the circuit."""
+
+        if self.statistics.state != "closed":
+            _LOGGER.info("Api recovered, endpoints: %s", self._family)
+        self.statistics.state = "closed"
+        self.statistics.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        """Open the circuit after consecutive failures or a failed probe."""
+
+        self.statistics.consecutive_failures += 1
+        if (
+            self.statistics.state == "half_open"
+            or self.statistics.consecutive_failures
+            >= CIRCUIT_BREAKER_FAILURE_THRESHOLD
+        ):
+            if self.statistics.state == "closed":
+                _LOGGER.warning(
+                    "Api failing, skipping requests for %s seconds, endpoints: %s",
+                    CIRCUIT_BREAKER_OPEN_SECONDS,
+                    self._family,
+                )
+                self.statistics.opened += 1
+                self.statistics.last_opened = datetime.now(UTC).isoformat()
+            self.statistics.state = "open"
+            self._opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """Allow another probe if the probe request ended without a result."""
+
+        if self._probing and self.statistics.state == "half_open":
+            self.statistics.state = "open"
+        self._probing = False
+
+
+def create_dedicated_session(
+    ssl_context: ssl.SSLContext, statistics: ConnectionStatistics
+) -> aiohttp.ClientSession:
+    """Create a session used only for the LTA DataMall API.
+
+    Connections are kept alive between polls so TLS handshakes are amortised,
+    the host name is resolved once per DNS cache TTL, and new and reused
+    connections are counted in the given statistics.
+    """
+
+    async def _on_connection_create_start(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceConnectionCreateStartParams,
+    ) -> None:
+        context.connect_start = time.perf_counter()
+
+    async def _on_connection_create_end(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceConnectionCreateEndParams,
+    ) -> None:
+        statistics.new_connections += 1
+        statistics.total_connect_time += time.perf_counter() - context.connect_start
+
+    async def _on_connection_reuseconn(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceConnectionReuseconnParams,
+    ) -> None:
+        statistics.reused_connections += 1
+
+    async def _on_dns_cache_hit(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceDnsCacheHitParams,
+    ) -> None:
+        statistics.dns_cache_hits += 1
+
+    async def _on_dns_cache_miss(
+        session: aiohttp.ClientSession,
+        context: SimpleNamespace,
+        params: aiohttp.TraceDnsCacheMissParams,
+    ) -> None:
+        statistics.dns_cache_misses += 1
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(_on_connection_create_start)
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+    trace_config.on_dns_cache_hit.append(_on_dns_cache_hit)
+    trace_config.on_dns_cache_miss.append(_on_dns_cache_miss)
+
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            ssl=ssl_context,
+            limit=MAX_CONNECTIONS,
+            limit_per_host=MAX_CONNECTIONS,
+            keepalive_timeout=KEEPALIVE_TIMEOUT_SECONDS,
+            use_dns_cache=True,
+            ttl_dns_cache=DNS_CACHE_TTL_SECONDS,
+        ),
+        timeout=REQUEST_TIMEOUT,
+        trace_configs=[trace_config],
+    )
+
+
+def compute_arrival_minutes(arrival_datetime: datetime, now_utc: datetime) -> int:
+    """Compute the minutes until the arrival, rounded down."""
+
+    minutes: float = (arrival_datetime - now_utc).total_seconds() / 60
+
+    # If the bus is already past, return 0
+    if minutes < 0:
+        return 0
+
+    return int(minutes)  # rounded down
+
+
+def is_operating(
+    operating_hours: OperatingHours, now: datetime, margin: timedelta
+) -> bool:
+    """Return if the bus service runs at the local time, within the margin.
+
+    The last buses of the previous day may run past midnight.
+    """
+
+    def _get_times(day: datetime) -> tuple[int, int] | None:
+        if day.weekday() < 5:
+            return operating_hours.weekdays
+        if day.weekday() == 5:
+            return operating_hours.saturdays
+        return operating_hours.sundays
+
+    minute: int = now.hour * 60 + now.minute
+    margin_minutes: float = margin.total_seconds() / 60
+    today: tuple[int, int] | None = _get_times(now)
+    yesterday: tuple[int, int] | None = _get_times(now - timedelta(days=1))
+    return (
+        today is not None
+        and today[0] - margin_minutes <= minute <= today[1] + margin_minutes
+    ) or (yesterday is not None and minute + 1440 <= yesterday[1] + margin_minutes)
+
+
+def _parse_page(
+    body: bytes, parse_page: Callable[[list[dict[str, Any]]], None]
+) -> bool:
+    """Decode and parse the rows of a dataset page, False if there are none."""
+
+    rows: list[dict[str, Any]] = json.loads(body)["value"]
+    parse_page(rows)
+    return rows != []
+
+
+def _parse_operating_hours(bus_route: dict[str, Any]) -> OperatingHours:
+    """Parse the first and last bus times of a bus route."""
+    return OperatingHours(
+        _parse_times(bus_route.get("WD_FirstBus"), bus_route.get("WD_LastBus")),
+        _parse_times(bus_route.get("SAT_FirstBus"), bus_route.get("SAT_LastBus")),
+        _parse_times(bus_route.get("SUN_FirstBus"), bus_route.get("SUN_LastBus")),
+    )
+
+
+def _parse_times(first_bus: str | None, last_bus: str | None) -> tuple[int, int] | None:
+    """Parse the HHMM first and last bus times, "-" if there is no bus."""
+    if (
+        first_bus is None
+        or last_bus is None
+        or not first_bus.isdigit()
+        or not last_bus.isdigit()
+    ):
+        return None
+
+    first: int = int(first_bus[:-2]) * 60 + int(first_bus[-2:])
+    last: int = int(last_bus[:-2]) * 60 + int(last_bus[-2:])
+    # the last bus is after midnight
+    if last < first:
+        last += 1440
+    return (first, last)
+
+
+def _merge_times(
+    times: tuple[int, int] | None, other_times: tuple[int, int] | None
+) -> tuple[int, int] | None:
+    """Merge the first and last bus times of 2 visits of a bus stop."""
+    if times is None or other_times is None:
+        return times or other_times
+    return (min(times[0], other_times[0]), max(times[1], other_times[1]))
+
 
-        return alerts
+def _parse_bus_stop(bus_stop: dict[str, Any]) -> BusStop:
+    """Parse a bus stop returned by the BusStops endpoint."""
+    return BusStop(
+        bus_stop["BusStopCode"],
+        bus_stop["RoadName"],
+        bus_stop["Description"],
+        bus_stop.get("Latitude"),
+        bus_stop.get("Longitude"),
+    )
+
+
+def _get_endpoint_name(endpoint: str) -> str:
+    """Get the endpoint path without the query string."""
+    return endpoint.split("?", 1)[0]
+
+
+def _get_endpoint_family(endpoint: str) -> str:
+    """Get the circuit breaker family of the endpoint."""
+
+    endpoint_name: str = _get_endpoint_name(endpoint)
+    if endpoint_name == "/v3/BusArrival":
+        return "bus_arrivals"
+    if endpoint_name == "/TrainServiceAlerts":
+        return "train_service_alerts"
+    # the slow, paged datasets
+    return "datasets"
 
 
 class ApiGeneralError(Exception):
     """Error to indicate api failed."""
 
-    def __init__(self, endpoint: str, http_status: int) -> None:
-        """Initialize with the given status code."""
+    def __init__(
+        self, endpoint: str, http_status: int | None, message: str | None = None
+    ) -> None:
+        """Initialize with the given status code, None if there was no response."""
         super().__init__(
-            f"LTA DataMall API call failed. Endpoint: {endpoint}, Status: {http_status}"
+            message
+            or "LTA DataMall API call failed. "
+            f"Endpoint: {endpoint}, Status: {http_status}"
         )
         self.http_status = http_status
 
@@ -255,3 +786,16 @@ class ApiAuthenticationError(Exception):
     def __init__(self) -> None:
         """Initialize with the given status code."""
         super().__init__("Authentication failed. Please check your API account key.")
+
+
+class ApiCircuitOpenError(ApiGeneralError):
+    """Error to indicate api calls are skipped while the endpoints are failing."""
+
+    def __init__(self, family: str) -> None:
+        """Initialize with the given endpoint family."""
+        super().__init__(
+            family,
+            None,
+            "LTA DataMall API calls skipped while the circuit breaker is open. "
+            f"Endpoint family: {family}",
+        )
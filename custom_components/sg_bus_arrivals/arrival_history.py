@@ -0,0 +1,291 @@
+"""Compact history of the bus arrival estimates, for headway and reliability."""
+
+from __future__ import annotations
+
+from array import array
+import base64
+from collections import deque
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+import sys
+from typing import Any
+
+# polls kept per bus service, 2 hours at the minimum scan interval
+HISTORY_SIZE: int = 360
+# estimated arrivals are saved as seconds after the poll
+NO_ARRIVAL: int = -32768
+MAX_ARRIVAL_SECONDS: int = 32767
+# the first bus has arrived when it was due within this and the next first bus
+# is later by more than the tolerance, i.e. it is the bus after it
+ARRIVED_WITHIN_SECONDS: int = 120
+NEXT_BUS_TOLERANCE_SECONDS: int = 60
+# buses arriving within this of the bus before them are bunched
+BUNCHING_HEADWAY_SECONDS: int = 120
+# the statistics are over the last arrivals
+STATISTICS_ARRIVALS: int = 10
+# polls further apart than this many scan intervals, e.g. across a restart or an
+# outage, do not detect arrivals or headways across the gap
+MAX_POLL_GAP_SCAN_INTERVALS: int = 5
+
+
+@dataclass
+class ArrivalStatistics:
+    """Statistics of the last arrivals of a bus service at a bus stop.
+
+    Each is None until enough buses have arrived.
+    """
+
+    # average minutes between consecutive buses
+    headway: float | None = None
+    # percentage of buses arriving within BUNCHING_HEADWAY_SECONDS of the bus before
+    bunching: float | None = None
+    # average minutes between the arrival and the estimate when the bus became
+    # the next bus
+    prediction_error: float | None = None
+
+
+class _RollingWindow:
+    """Last values with their sum and the count of values below a limit."""
+
+    def __init__(self, limit: float = 0) -> None:
+        self._values: deque[float] = deque(maxlen=STATISTICS_ARRIVALS)
+        self._limit: float = limit
+        self.total: float = 0
+        self.below_limit: int = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def append(self, value: float) -> None:
+        if len(self._values) == self._values.maxlen:
+            removed: float = self._values[0]
+            self.total -= removed
+            self.below_limit -= removed < self._limit
+        self._values.append(value)
+        self.total += value
+        self.below_limit += value < self._limit
+
+
+class ServiceHistory:
+    """Ring buffer of the polls of a bus service at a bus stop.
+
+    Each column holds one value per poll: the poll time in seconds and the
+    estimated arrival of each next bus in seconds after the poll. The statistics
+    are updated with each poll, and rebuilt by replaying the polls when loaded.
+    The arrival detection restarts after polls more than max_poll_gap seconds
+    apart.
+    """
+
+    def __init__(
+        self,
+        bus_count: int,
+        size: int = HISTORY_SIZE,
+        max_poll_gap: int | None = None,
+    ) -> None:
+        """Initialize an empty history."""
+        self.max_poll_gap: int | None = max_poll_gap
+        self.polled: array[int] = array("q", bytes(8 * size))
+        self.arrivals: list[array[int]] = [
+            array("h", [NO_ARRIVAL]) * size for _ in range(bus_count)
+        ]
+        self.index: int = 0
+        self.count: int = 0
+        self._reset_statistics()
+
+    def _reset_statistics(self) -> None:
+        # estimated arrival of the first bus at the last poll
+        self._first_arrival: int | None = None
+        self._first_polled: int = 0
+        # estimated arrival when the first bus became the first bus
+        self._first_estimate: int | None = None
+        self._last_arrival: int | None = None
+        self._headways: _RollingWindow = _RollingWindow(BUNCHING_HEADWAY_SECONDS)
+        self._errors: _RollingWindow = _RollingWindow()
+
+    def __len__(self) -> int:
+        """Return the number of polls in the history."""
+        return self.count
+
+    def record(self, polled: int, arrivals: Sequence[int | None]) -> None:
+        """Record the estimated arrivals of a poll, as POSIX timestamps."""
+        size: int = len(self.polled)
+        self.polled[self.index] = polled
+        for i, column in enumerate(self.arrivals):
+            arrival: int | None = arrivals[i] if i < len(arrivals) else None
+            column[self.index] = (
+                NO_ARRIVAL
+                if arrival is None
+                else max(
+                    NO_ARRIVAL + 1, min(arrival - polled, MAX_ARRIVAL_SECONDS)
+                )
+            )
+        self.index = (self.index + 1) % size
+        self.count = min(self.count + 1, size)
+        self._update_statistics(polled, arrivals[0] if arrivals else None)
+
+    def _update_statistics(self, polled: int, first_arrival: int | None) -> None:
+        """Detect the arrival of the first bus since the last poll."""
+        if (
+            self.max_poll_gap is not None
+            and polled - self._first_polled > self.max_poll_gap
+        ):
+            # the buses between the polls are unknown
+            self._first_arrival = None
+            self._first_estimate = None
+            self._last_arrival = None
+
+        last_first_arrival: int | None = self._first_arrival
+        if last_first_arrival is None:
+            self._first_estimate = first_arrival
+        elif last_first_arrival <= self._first_polled + ARRIVED_WITHIN_SECONDS and (
+            first_arrival is None
+            or first_arrival > last_first_arrival + NEXT_BUS_TOLERANCE_SECONDS
+        ):
+            arrival: int = min(last_first_arrival, polled)
+            if self._last_arrival is not None:
+                self._headways.append(arrival - self._last_arrival)
+            self._last_arrival = arrival
+            if self._first_estimate is not None:
+                self._errors.append(abs(arrival - self._first_estimate))
+            self._first_estimate = first_arrival
+        elif first_arrival is None:
+            self._first_estimate = None
+
+        self._first_arrival = first_arrival
+        self._first_polled = polled
+
+    def get_statistics(self) -> ArrivalStatistics:
+        """Return the statistics of the last arrivals."""
+        headways: int = len(self._headways)
+        errors: int = len(self._errors)
+        return ArrivalStatistics(
+            round(self._headways.total / headways / 60, 1) if headways else None,
+            round(self._headways.below_limit / headways * 100, 1)
+            if headways
+            else None,
+            round(self._errors.total / errors / 60, 1) if errors else None,
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the history to save, with the columns as little endian bytes."""
+        return {
+            "index": self.index,
+            "count": self.count,
+            "polled": _encode(self.polled),
+            "arrivals": [_encode(column) for column in self.arrivals],
+        }
+
+    @classmethod
+    def from_dict(
+        cls, data: dict[str, Any], max_poll_gap: int | None = None
+    ) -> ServiceHistory:
+        """Return the saved history with the statistics rebuilt."""
+        polled: array[int] = _decode("q", data["polled"])
+        history: ServiceHistory = cls(
+            len(data["arrivals"]), len(polled), max_poll_gap
+        )
+        history.polled = polled
+        history.arrivals = [_decode("h", column) for column in data["arrivals"]]
+        history.index = data["index"]
+        history.count = data["count"]
+
+        size: int = len(polled)
+        for i in range(history.index - history.count, history.index):
+            first_arrival: int = history.arrivals[0][i % size]
+            history._update_statistics(
+                polled[i % size],
+                None
+                if first_arrival == NO_ARRIVAL
+                else polled[i % size] + first_arrival,
+            )
+        return history
+
+
+def _encode(column: array[int]) -> str:
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return base64.b64encode(column.tobytes()).decode()
+
+
+def _decode(typecode: str, data: str) -> array[int]:
+    column: array[int] = array(typecode, base64.b64decode(data))
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+class ArrivalHistory:
+    """Histories of the bus services, by bus stop and bus service."""
+
+    def __init__(self, bus_count: int, scan_interval: int | None = None) -> None:
+        """Initialize without any history, polled every scan_interval seconds."""
+        self._bus_count: int = bus_count
+        self._max_poll_gap: int | None = (
+            scan_interval * MAX_POLL_GAP_SCAN_INTERVALS
+            if scan_interval is not None
+            else None
+        )
+        self._histories: dict[tuple[str, str], ServiceHistory] = {}
+
+    def __len__(self) -> int:
+        """Return the number of bus services with a history."""
+        return len(self._histories)
+
+    def record(
+        self,
+        bus_stop_code: str,
+        service_no: str,
+        polled: int,
+        arrivals: Sequence[int | None],
+    ) -> None:
+        """Record the estimated arrivals of a bus service at a poll."""
+        history: ServiceHistory | None = self._histories.get(
+            (bus_stop_code, service_no)
+        )
+        if history is None:
+            history = self._histories[(bus_stop_code, service_no)] = ServiceHistory(
+                self._bus_count, max_poll_gap=self._max_poll_gap
+            )
+        history.record(polled, arrivals)
+
+    def retain(self, keys: Iterable[tuple[str, str]]) -> None:
+        """Discard the histories of the other bus services."""
+        retained: set[tuple[str, str]] = set(keys)
+        self._histories = {
+            key: history
+            for key, history in self._histories.items()
+            if key in retained
+        }
+
+    def get_statistics(
+        self, bus_stop_code: str, service_no: str
+    ) -> ArrivalStatistics:
+        """Return the statistics of a bus service at a bus stop."""
+        history: ServiceHistory | None = self._histories.get(
+            (bus_stop_code, service_no)
+        )
+        if history is None:
+            return ArrivalStatistics()
+        return history.get_statistics()
+
+    def get_polls(self) -> int:
+        """Return the number of polls across all histories."""
+        return sum(len(history) for history in self._histories.values())
+
+    def to_dict(self) -> dict[str, dict[str, dict[str, Any]]]:
+        """Return the histories to save, by bus stop and bus service."""
+        data: dict[str, dict[str, dict[str, Any]]] = {}
+        for (bus_stop_code, service_no), history in self._histories.items():
+            data.setdefault(bus_stop_code, {})[service_no] = history.to_dict()
+        return data
+
+    def load(self, data: dict[str, dict[str, dict[str, Any]]]) -> None:
+        """Replace the histories with the saved histories."""
+        self._histories = {
+            (bus_stop_code, service_no): ServiceHistory.from_dict(
+                history, self._max_poll_gap
+            )
+            for bus_stop_code, histories in data.items()
+            for service_no, history in histories.items()
+        }
@@ -0,0 +1,198 @@
+"""Indexes over the bus stops for searching without the LTA DataMall API."""
+
+from __future__ import annotations
+
+import bisect
+from collections.abc import Iterable
+import math
+import re
+
+from .models import BusStop
+
+EARTH_RADIUS_METRES: float = 6371008.8
+METRES_PER_DEGREE: float = EARTH_RADIUS_METRES * math.pi / 180
+# about 250 metres, most searches only visit a few cells
+GRID_CELL_DEGREES: float = 0.0025
+# nearest bus stop searches double the radius until enough bus stops are found
+NEAREST_INITIAL_RADIUS_METRES: float = 500
+NEAREST_MAX_RADIUS_METRES: float = 32000
+
+WORD_PATTERN: re.Pattern[str] = re.compile(r"[a-z0-9]+")
+# a word matching a query word by prefix ranks above any fuzzy match
+PREFIX_SCORE: float = 2
+MIN_SCORE: float = 0.5
+
+
+def distance_metres(
+    latitude1: float, longitude1: float, latitude2: float, longitude2: float
+) -> float:
+    """Return the great circle distance between 2 points in metres."""
+    phi1: float = math.radians(latitude1)
+    phi2: float = math.radians(latitude2)
+    a: float = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1)
+        * math.cos(phi2)
+        * math.sin(math.radians(longitude2 - longitude1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METRES * math.asin(math.sqrt(a))
+
+
+class BusStopSpatialIndex:
+    """Uniform latitude/longitude grid over the bus stops.
+
+    Each bus stop is placed in the grid cell containing it, so a search only
+    measures the distance to the bus stops in the cells overlapping the search
+    radius instead of to all bus stops.
+    """
+
+    def __init__(self, bus_stops: Iterable[BusStop]) -> None:
+        """Build the index, skipping bus stops without a location."""
+        self._cells: dict[tuple[int, int], list[BusStop]] = {}
+        self._size: int = 0
+        for bus_stop in bus_stops:
+            if bus_stop.latitude is None or bus_stop.longitude is None:
+                continue
+            self._cells.setdefault(
+                _get_cell(bus_stop.latitude, bus_stop.longitude), []
+            ).append(bus_stop)
+            self._size += 1
+
+    def __len__(self) -> int:
+        """Return the number of indexed bus stops."""
+        return self._size
+
+    def search(
+        self, latitude: float, longitude: float, radius: float, limit: int
+    ) -> list[tuple[float, BusStop]]:
+        """Return the nearest bus stops within the radius in metres.
+
+        Returns up to limit pairs of distance in metres and bus stop, nearest first.
+        """
+        latitude_span: int = math.ceil(radius / METRES_PER_DEGREE / GRID_CELL_DEGREES)
+        longitude_span: int = math.ceil(
+            radius
+            / (METRES_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+            / GRID_CELL_DEGREES
+        )
+        row, column = _get_cell(latitude, longitude)
+
+        results: list[tuple[float, BusStop]] = []
+        for cell_row in range(row - latitude_span, row + latitude_span + 1):
+            for cell_column in range(
+                column - longitude_span, column + longitude_span + 1
+            ):
+                for bus_stop in self._cells.get((cell_row, cell_column), ()):
+                    assert bus_stop.latitude is not None
+                    assert bus_stop.longitude is not None
+                    distance: float = distance_metres(
+                        latitude, longitude, bus_stop.latitude, bus_stop.longitude
+                    )
+                    if distance <= radius:
+                        results.append((distance, bus_stop))
+
+        results.sort(key=lambda result: result[0])
+        return results[:limit]
+
+    def nearest(
+        self, latitude: float, longitude: float, count: int
+    ) -> list[tuple[float, BusStop]]:
+        """Return the count nearest bus stops, nearest first."""
+        radius: float = NEAREST_INITIAL_RADIUS_METRES
+        while True:
+            results: list[tuple[float, BusStop]] = self.search(
+                latitude, longitude, radius, count
+            )
+            if len(results) >= count or radius >= NEAREST_MAX_RADIUS_METRES:
+                return results
+            radius *= 2
+
+
+def _get_cell(latitude: float, longitude: float) -> tuple[int, int]:
+    """Return the grid cell containing the location."""
+    return (
+        math.floor(latitude / GRID_CELL_DEGREES),
+        math.floor(longitude / GRID_CELL_DEGREES),
+    )
+
+
+class BusStopTextIndex:
+    """Prefix and trigram index over the bus stop codes, descriptions and roads.
+
+    Query words are matched against the start of the indexed words, e.g. "blk 1"
+    finds "Blk 123", and trigrams tolerate typos, e.g. "wodlands" finds
+    "Woodlands".
+    """
+
+    def __init__(self, bus_stops: Iterable[BusStop]) -> None:
+        """Build the index."""
+        self._bus_stops: dict[str, BusStop] = {}
+        words: set[tuple[str, str]] = set()
+        self._trigrams: dict[str, set[str]] = {}
+        for bus_stop in bus_stops:
+            self._bus_stops[bus_stop.bus_stop_code] = bus_stop
+            for word in _get_words(
+                f"{bus_stop.bus_stop_code} {bus_stop.description} {bus_stop.road_name}"
+            ):
+                words.add((word, bus_stop.bus_stop_code))
+                for trigram in _get_trigrams(word):
+                    self._trigrams.setdefault(trigram, set()).add(
+                        bus_stop.bus_stop_code
+                    )
+        # sorted so the words starting with a prefix are a contiguous slice
+        self._words: list[tuple[str, str]] = sorted(words)
+
+    def __len__(self) -> int:
+        """Return the number of indexed bus stops."""
+        return len(self._bus_stops)
+
+    def search(self, query: str, limit: int) -> list[BusStop]:
+        """Return up to limit bus stops matching the query, best match first."""
+        query_words: list[str] = _get_words(query)
+        scores: dict[str, float] = {}
+
+        for query_word in query_words:
+            # prefix matches, each bus stop is counted once per query word
+            matched: set[str] = set()
+            index: int = bisect.bisect_left(self._words, (query_word, ""))
+            while index < len(self._words) and self._words[index][0].startswith(
+                query_word
+            ):
+                matched.add(self._words[index][1])
+                index += 1
+            for bus_stop_code in matched:
+                scores[bus_stop_code] = scores.get(bus_stop_code, 0) + PREFIX_SCORE
+
+            # fuzzy matches, the fraction of the query word trigrams found
+            trigrams: set[str] = _get_trigrams(query_word)
+            for trigram in trigrams:
+                for bus_stop_code in self._trigrams.get(trigram, ()):
+                    scores[bus_stop_code] = (
+                        scores.get(bus_stop_code, 0) + 1 / len(trigrams)
+                    )
+
+        # fuzzy matches need at least half of the trigrams of a query word
+        ranked: list[str] = sorted(
+            (
+                bus_stop_code
+                for bus_stop_code, score in scores.items()
+                if score >= MIN_SCORE
+            ),
+            key=lambda bus_stop_code: (
+                -scores[bus_stop_code],
+                self._bus_stops[bus_stop_code].description,
+                bus_stop_code,
+            ),
+        )
+        return [self._bus_stops[bus_stop_code] for bus_stop_code in ranked[:limit]]
+
+
+def _get_words(text: str) -> list[str]:
+    """Return the lowercase words in the text."""
+    return WORD_PATTERN.findall(text.lower())
+
+
+def _get_trigrams(word: str) -> set[str]:
+    """Return the trigrams of the word, padded to match its start and end."""
+    padded: str = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
@@ -27,14 +27,28 @@ from homeassistant.helpers.selector import (
 
 from .api import ApiAuthenticationError, ApiGeneralError, SgBusArrivals
 from .const import (
+    CONF_ARRIVAL_HISTORY,
+    CONF_COMPACT_MODE,
+    CONF_DEDICATED_SESSION,
+    CONF_FAST_STARTUP,
+    CONF_INSTRUMENTATION,
+    CONF_RECORD_ATTRIBUTES,
     DOMAIN,
     MIN_SCAN_INTERVAL_SECONDS,
+    SUBENTRY_TYPE_APPROACHING_BUS,
+    SUBENTRY_TYPE_BULK_BUS_SERVICES,
     SUBENTRY_TYPE_BUS_SERVICE,
+    SUBENTRY_TYPE_BUS_STOP,
+    SUBENTRY_TYPE_NEARBY_BUS_STOPS,
     SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
 )
 from .coordinator import SgBusArrivalsData
 from .subentry_flow import (
+    ApproachingBusSubEntryFlowHandler,
+    BulkBusServicesSubEntryFlowHandler,
     BusServiceSubEntryFlowHandler,
+    BusStopSubEntryFlowHandler,
+    NearbyBusStopsSubEntryFlowHandler,
     TrainServiceAlertsSubEntryFlowHandler,
 )
 
@@ -42,7 +56,14 @@ _LOGGER = logging.getLogger(__name__)
 
 
 def get_data_schema(
-    api_key: str | None = None, scan_interval: int = MIN_SCAN_INTERVAL_SECONDS
+    api_key: str | None = None,
+    scan_interval: int = MIN_SCAN_INTERVAL_SECONDS,
+    compact_mode: bool = False,
+    record_attributes: bool = False,
+    arrival_history: bool = False,
+    instrumentation: bool = False,
+    fast_startup: bool = False,
+    dedicated_session: bool = False,
 ) -> vol.Schema:
     """Return the schema for the config flow."""
     return vol.Schema(
@@ -55,6 +76,12 @@ def get_data_schema(
             vol.Required(CONF_SCAN_INTERVAL, default=scan_interval): vol.All(
                 vol.Coerce(int), vol.Range(min=MIN_SCAN_INTERVAL_SECONDS)
             ),
+            vol.Optional(CONF_COMPACT_MODE, default=compact_mode): bool,
+            vol.Optional(CONF_RECORD_ATTRIBUTES, default=record_attributes): bool,
+            vol.Optional(CONF_ARRIVAL_HISTORY, default=arrival_history): bool,
+            vol.Optional(CONF_INSTRUMENTATION, default=instrumentation): bool,
+            vol.Optional(CONF_FAST_STARTUP, default=fast_startup): bool,
+            vol.Optional(CONF_DEDICATED_SESSION, default=dedicated_session): bool,
         }
     )
 
@@ -72,6 +99,10 @@ class SgBusArrivalsConfigFlow(ConfigFlow, domain=DOMAIN):
         """Return subentries supported by this integration."""
         return {
             SUBENTRY_TYPE_BUS_SERVICE: BusServiceSubEntryFlowHandler,
+            SUBENTRY_TYPE_BULK_BUS_SERVICES: BulkBusServicesSubEntryFlowHandler,
+            SUBENTRY_TYPE_BUS_STOP: BusStopSubEntryFlowHandler,
+            SUBENTRY_TYPE_NEARBY_BUS_STOPS: NearbyBusStopsSubEntryFlowHandler,
+            SUBENTRY_TYPE_APPROACHING_BUS: ApproachingBusSubEntryFlowHandler,
             SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS: TrainServiceAlertsSubEntryFlowHandler,
         }
 
@@ -113,9 +144,36 @@ class SgBusArrivalsConfigFlow(ConfigFlow, domain=DOMAIN):
 
         api_key: str = self._get_reconfigure_entry().data[CONF_API_KEY]
         scan_interval: int = self._get_reconfigure_entry().data[CONF_SCAN_INTERVAL]
+        compact_mode: bool = self._get_reconfigure_entry().data.get(
+            CONF_COMPACT_MODE, False
+        )
+        record_attributes: bool = self._get_reconfigure_entry().data.get(
+            CONF_RECORD_ATTRIBUTES, False
+        )
+        arrival_history: bool = self._get_reconfigure_entry().data.get(
+            CONF_ARRIVAL_HISTORY, False
+        )
+        instrumentation: bool = self._get_reconfigure_entry().data.get(
+            CONF_INSTRUMENTATION, False
+        )
+        fast_startup: bool = self._get_reconfigure_entry().data.get(
+            CONF_FAST_STARTUP, False
+        )
+        dedicated_session: bool = self._get_reconfigure_entry().data.get(
+            CONF_DEDICATED_SESSION, False
+        )
         return self.async_show_form(
             step_id="reconfigure",
-            data_schema=get_data_schema(api_key, scan_interval),
+            data_schema=get_data_schema(
+                api_key,
+                scan_interval,
+                compact_mode,
+                record_attributes,
+                arrival_history,
+                instrumentation,
+                fast_startup,
+                dedicated_session,
+            ),
             errors=errors,
         )
 
@@ -4,12 +4,69 @@ DOMAIN = "sg_bus_arrivals"
 
 MIN_SCAN_INTERVAL_SECONDS = 20
 
+CONF_COMPACT_MODE = "compact_mode"
+CONF_RECORD_ATTRIBUTES = "record_attributes"
+CONF_INSTRUMENTATION = "instrumentation"
+CONF_FAST_STARTUP = "fast_startup"
+CONF_DEDICATED_SESSION = "dedicated_session"
+CONF_ARRIVAL_HISTORY = "arrival_history"
+
+# the last bus arrivals are saved at most once per interval
+BUS_ARRIVALS_STORAGE_VERSION = 1
+BUS_ARRIVALS_SAVE_INTERVAL_SECONDS = 60
+
+# the arrival history is saved at most once per interval
+ARRIVAL_HISTORY_STORAGE_VERSION = 1
+ARRIVAL_HISTORY_SAVE_INTERVAL_SECONDS = 300
+
+# the bus stops are polled in shards spread across the scan interval, each shard
+# refresh has its own time budget
+BUS_ARRIVALS_SHARD_SIZE = 50
+BUS_ARRIVALS_SHARD_TIMEOUT_SECONDS = 10
+
+# the bus stops rarely change so the saved bus stops are used for a week
+BUS_STOPS_STORAGE_VERSION = 1
+BUS_STOPS_MAX_AGE_DAYS = 7
+BUS_STOPS_RETRY_HOURS = 1
+
+# bus stops are not polled while none of their bus services run, the first and
+# last bus times are in Singapore time and extended by the margin for late buses
+OPERATING_HOURS_TIME_ZONE = "Asia/Singapore"
+OPERATING_HOURS_MARGIN_MINUTES = 30
+
+TRAIN_SERVICE_ALERTS_SCAN_INTERVAL_SECONDS = 600
+TRAIN_SERVICE_ALERTS_MIN_SCAN_INTERVAL_SECONDS = 60
+
 SUBENTRY_TYPE_BUS_SERVICE = "bus_service"
 SUBENTRY_CONF_BUS_STOP_CODE = "bus_stop_code"
 SUBENTRY_CONF_SERVICE_NO = "service_no"
 SUBENTRY_CONF_ROAD_NAME = "road_name"
 SUBENTRY_CONF_DESCRIPTION = "description"
+SUBENTRY_CONF_NEARBY_DISTANCE = "nearby_distance"
+SUBENTRY_CONF_SEARCH = "search"
+
+SUBENTRY_TYPE_BUS_STOP = "bus_stop"
+
+SUBENTRY_TYPE_NEARBY_BUS_STOPS = "nearby_bus_stops"
+SUBENTRY_CONF_TRACKER = "tracker"
+SUBENTRY_CONF_COUNT = "count"
+# a nearby bus stop is only replaced by a bus stop nearer by more than this,
+# and the nearby bus stops are not re-evaluated until the tracker moves this far
+NEARBY_BUS_STOPS_HYSTERESIS_METRES = 100
+NEARBY_BUS_STOPS_MIN_MOVE_METRES = 25
+
+SUBENTRY_TYPE_APPROACHING_BUS = "approaching_bus"
+SUBENTRY_CONF_MINUTES = "minutes"
+EVENT_APPROACHING = "sg_bus_arrivals_approaching"
+# a bus stays approaching while its arrival fluctuates by up to this, so an
+# estimate going back and forth over the threshold fires once
+APPROACHING_HYSTERESIS_MINUTES = 1
+
+SUBENTRY_TYPE_BULK_BUS_SERVICES = "bulk_bus_services"
+SUBENTRY_CONF_BUS_SERVICES = "bus_services"
 
 SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS = "train_service_alerts"
 
 SERVICE_REFRESH_BUS_ARRIVALS = "refresh_bus_arrivals"
+SERVICE_PROFILE = "profile"
+SERVICE_ATTR_REFRESH_CYCLES = "refresh_cycles"
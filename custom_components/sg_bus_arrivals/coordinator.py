@@ -3,20 +3,88 @@
 from __future__ import annotations
 
 import asyncio
-from asyncio import Task, timeout
+from asyncio import Task
 import collections
-from dataclasses import dataclass
-from datetime import timedelta
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import astuple, dataclass, field
+from datetime import datetime, timedelta
 import logging
+import math
+import time
+from typing import Any
 
-from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from aiohttp import ClientError
+
+from homeassistant.config_entries import ConfigEntry, ConfigSubentry
+from homeassistant.const import ATTR_LATITUDE, ATTR_LONGITUDE
+from homeassistant.core import (
+    CALLBACK_TYPE,
+    Event,
+    EventStateChangedData,
+    HomeAssistant,
+    State,
+    callback,
+)
 from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.event import async_track_state_change_event
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.typing import StateType
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
 
-from .api import ApiAuthenticationError, ApiGeneralError, SgBusArrivals
-from .const import SUBENTRY_CONF_BUS_STOP_CODE, SUBENTRY_TYPE_BUS_SERVICE
-from .models import BusArrival, TrainServiceAlert
+from .api import (
+    BUS_ARRIVALS_COUNT,
+    ApiAuthenticationError,
+    ApiGeneralError,
+    SgBusArrivals,
+    compute_arrival_minutes,
+    is_operating,
+)
+from .arrival_history import ArrivalHistory
+from .bus_stop_index import BusStopSpatialIndex, BusStopTextIndex, distance_metres
+from .const import (
+    APPROACHING_HYSTERESIS_MINUTES,
+    ARRIVAL_HISTORY_SAVE_INTERVAL_SECONDS,
+    ARRIVAL_HISTORY_STORAGE_VERSION,
+    BUS_ARRIVALS_SAVE_INTERVAL_SECONDS,
+    BUS_ARRIVALS_SHARD_SIZE,
+    BUS_ARRIVALS_SHARD_TIMEOUT_SECONDS,
+    BUS_ARRIVALS_STORAGE_VERSION,
+    BUS_STOPS_MAX_AGE_DAYS,
+    BUS_STOPS_RETRY_HOURS,
+    BUS_STOPS_STORAGE_VERSION,
+    CONF_ARRIVAL_HISTORY,
+    CONF_FAST_STARTUP,
+    CONF_INSTRUMENTATION,
+    DOMAIN,
+    EVENT_APPROACHING,
+    NEARBY_BUS_STOPS_HYSTERESIS_METRES,
+    NEARBY_BUS_STOPS_MIN_MOVE_METRES,
+    OPERATING_HOURS_MARGIN_MINUTES,
+    OPERATING_HOURS_TIME_ZONE,
+    SUBENTRY_CONF_BUS_STOP_CODE,
+    SUBENTRY_CONF_COUNT,
+    SUBENTRY_CONF_MINUTES,
+    SUBENTRY_CONF_SERVICE_NO,
+    SUBENTRY_CONF_TRACKER,
+    SUBENTRY_TYPE_APPROACHING_BUS,
+    SUBENTRY_TYPE_BUS_SERVICE,
+    SUBENTRY_TYPE_BUS_STOP,
+    SUBENTRY_TYPE_NEARBY_BUS_STOPS,
+    SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
+    TRAIN_SERVICE_ALERTS_MIN_SCAN_INTERVAL_SECONDS,
+    TRAIN_SERVICE_ALERTS_SCAN_INTERVAL_SECONDS,
+)
+from .models import (
+    BusArrival,
+    BusStop,
+    NearbyBusStop,
+    NextBus,
+    OperatingHours,
+    RefreshStatistics,
+    TrainServiceAlert,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -28,15 +96,163 @@ class SgBusArrivalsData:
     api: SgBusArrivals
     bus_arrivals_coordinator: BusArrivalsUpdateCoordinator
     train_service_alerts_coordinator: TrainServiceAlertsUpdateCoordinator | None
+    # config entry data and subentries the entities were set up with
+    loaded_data: Mapping[str, Any] = field(default_factory=dict)
+    loaded_subentries: Mapping[str, ConfigSubentry] = field(default_factory=dict)
+    async_add_bus_entities: Callable[[ConfigSubentry], None] | None = None
 
 
 type SgBusArrivalsConfigEntry = ConfigEntry[SgBusArrivalsData]
 
 
+@dataclass(frozen=True, slots=True)
+class EntityState:
+    """State of an entity, precomputed once per refresh."""
+
+    native_value: StateType
+    extra_state_attributes: Mapping[str, Any] | None = None
+
+
+UNKNOWN_STATE: EntityState = EntityState(None)
+
+type EntityStateFn = Callable[[dict[str, dict[str, BusArrival]]], EntityState]
+
+
+@callback
+def get_enabled_subentry_ids(
+    hass: HomeAssistant, config_entry: ConfigEntry, subentry_type: str
+) -> set[str]:
+    """Get the subentries of the given type with at least 1 enabled entity.
+
+    Subentries without registered entities (e.g. newly added) are treated as enabled.
+    """
+    subentry_ids: set[str] = {
+        subentry.subentry_id
+        for subentry in config_entry.subentries.values()
+        if subentry.subentry_type == subentry_type
+    }
+
+    registered_subentry_ids: set[str | None] = set()
+    enabled_subentry_ids: set[str | None] = set()
+    for entity_entry in er.async_entries_for_config_entry(
+        er.async_get(hass), config_entry.entry_id
+    ):
+        registered_subentry_ids.add(entity_entry.config_subentry_id)
+        if not entity_entry.disabled:
+            enabled_subentry_ids.add(entity_entry.config_subentry_id)
+
+    return {
+        subentry_id
+        for subentry_id in subentry_ids
+        if subentry_id in enabled_subentry_ids
+        or subentry_id not in registered_subentry_ids
+    }
+
+
+@callback
+def get_bus_arrivals_store(
+    hass: HomeAssistant, entry_id: str
+) -> Store[dict[str, Any]]:
+    """Get the store of the last bus arrivals of a config entry."""
+    return Store(
+        hass, BUS_ARRIVALS_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.bus_arrivals"
+    )
+
+
+@callback
+def get_arrival_history_store(
+    hass: HomeAssistant, entry_id: str
+) -> Store[dict[str, Any]]:
+    """Get the store of the arrival history of a config entry."""
+    return Store(
+        hass, ARRIVAL_HISTORY_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.arrival_history"
+    )
+
+
+@callback
+def get_bus_stops_store(hass: HomeAssistant, entry_id: str) -> Store[dict[str, Any]]:
+    """Get the store of all bus stops of a config entry."""
+    return Store(hass, BUS_STOPS_STORAGE_VERSION, f"{DOMAIN}.{entry_id}.bus_stops")
+
+
+def _bus_stops_to_rows(all_bus_stops: dict[str, BusStop]) -> list[tuple[Any, ...]]:
+    """Convert the bus stops to the saved rows."""
+    return [astuple(bus_stop) for bus_stop in all_bus_stops.values()]
+
+
+def _bus_stops_from_rows(rows: list[list[Any]]) -> dict[str, BusStop]:
+    """Convert the saved rows to the bus stops, by bus stop code."""
+    return {row[0]: BusStop(*row) for row in rows}
+
+
+def _recompute_bus_arrival(
+    bus_arrival: BusArrival, now_utc: datetime
+) -> BusArrival | None:
+    """Return the bus arrival with the minutes recomputed from the arrival times.
+
+    Buses which have already arrived are discarded, and None is returned when all
+    of them have.
+    """
+    next_buses: list[NextBus] = [
+        NextBus(
+            compute_arrival_minutes(next_bus.estimated_arrival, now_utc),
+            next_bus.bus_type,
+            next_bus.feature,
+            next_bus.load,
+            next_bus.estimated_arrival,
+        )
+        for next_bus in bus_arrival.next_bus
+        if next_bus.estimated_arrival is not None
+        and next_bus.estimated_arrival >= now_utc
+    ]
+    if not next_buses:
+        return None
+
+    next_buses.extend(NextBus() for _ in range(BUS_ARRIVALS_COUNT - len(next_buses)))
+    return BusArrival(
+        bus_arrival.bus_stop_code,
+        bus_arrival.service_no,
+        bus_arrival.operator,
+        next_buses,
+    )
+
+
+def _recompute_bus_stop(
+    bus_arrivals: dict[str, BusArrival], now_utc: datetime
+) -> dict[str, BusArrival]:
+    """Return the bus arrivals of a bus stop with buses yet to arrive, recomputed."""
+    recomputed_bus_arrivals: dict[str, BusArrival] = {}
+    for service_no, bus_arrival in bus_arrivals.items():
+        recomputed: BusArrival | None = _recompute_bus_arrival(bus_arrival, now_utc)
+        if recomputed is not None:
+            recomputed_bus_arrivals[service_no] = recomputed
+    return recomputed_bus_arrivals
+
+
+def _get_last_arrival(
+    all_bus_arrivals: dict[str, dict[str, BusArrival]],
+) -> datetime | None:
+    """Return the arrival time of the last bus, None without any."""
+    return max(
+        (
+            next_bus.estimated_arrival
+            for bus_arrivals in all_bus_arrivals.values()
+            for bus_arrival in bus_arrivals.values()
+            for next_bus in bus_arrival.next_bus
+            if next_bus.estimated_arrival is not None
+        ),
+        default=None,
+    )
+
+
 class TrainServiceAlertsUpdateCoordinator(
     DataUpdateCoordinator[dict[str, TrainServiceAlert]]
 ):
-    """Coordinator that polls for train service alerts."""
+    """Coordinator that polls for train service alerts.
+
+    Polls slowly while all lines are normal and at the configured scan interval
+    while any line is disrupted.
+    """
 
     def __init__(
         self,
@@ -46,19 +262,53 @@ class TrainServiceAlertsUpdateCoordinator(
         scan_interval: int,
     ) -> None:
         """Initialize the train service alerts coordinator."""
+        normal_interval = timedelta(seconds=TRAIN_SERVICE_ALERTS_SCAN_INTERVAL_SECONDS)
         super().__init__(
             hass,
             _LOGGER,
             name="Train service alerts",
             config_entry=config_entry,
-            update_interval=timedelta(seconds=600),
+            update_interval=normal_interval,
             always_update=True,
         )
         self._sg_bus_arrivals = sg_bus_arrivals
+        self._normal_interval = normal_interval
+        self._disrupted_interval = timedelta(
+            seconds=max(scan_interval, TRAIN_SERVICE_ALERTS_MIN_SCAN_INTERVAL_SECONDS)
+        )
 
     async def _async_update_data(self):
         """Fetch train service alerts from api."""
-        return await self._sg_bus_arrivals.get_train_service_alerts()
+
+        # enabling a sensor reloads the config entry so polling resumes then
+        assert self.config_entry is not None
+        if not get_enabled_subentry_ids(
+            self.hass, self.config_entry, SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS
+        ):
+            _LOGGER.debug("All train service alert sensors disabled, skip polling")
+            return self.data if self.data is not None else {}
+
+        try:
+            alerts: dict[str, TrainServiceAlert] = (
+                await self._sg_bus_arrivals.get_train_service_alerts()
+            )
+        except ApiAuthenticationError as err:
+            raise ConfigEntryAuthFailed from err
+        except ApiGeneralError as err:
+            raise UpdateFailed from err
+
+        update_interval: timedelta = (
+            self._disrupted_interval
+            if any(alert.status == "disrupted" for alert in alerts.values())
+            else self._normal_interval
+        )
+        if update_interval != self.update_interval:
+            _LOGGER.debug(
+                "Train service alerts update interval changed to %s", update_interval
+            )
+            self.update_interval = update_interval
+
+        return alerts
 
 
 class BusArrivalsUpdateCoordinator(
@@ -83,58 +333,968 @@ class BusArrivalsUpdateCoordinator(
             always_update=True,
         )
         self._sg_bus_arrivals = sg_bus_arrivals
-        self._all_bus_services = {}
+        self._scan_interval: int = scan_interval
+        self._shards: list[set[str]] = []
+        self._shard_index: int = 0
+        self._all_bus_services: dict[str, dict[str, OperatingHours]] = {}
+        self._all_bus_services_loaded: str | None = None
+        self._all_bus_stops: dict[str, BusStop] = {}
+        self._all_bus_stops_task: Task[dict[str, BusStop]] | None = None
+        self._all_bus_stops_loaded: str | None = None
+        self._all_bus_stops_expires: datetime | None = None
+        self._bus_stops_store: Store[dict[str, Any]] = get_bus_stops_store(
+            hass, config_entry.entry_id
+        )
+        self._bus_stop_spatial_index: BusStopSpatialIndex | None = None
+        self._bus_stop_text_index: BusStopTextIndex | None = None
+        self._refresh_start: float | None = None
+        self._store: Store[dict[str, Any]] = get_bus_arrivals_store(
+            hass, config_entry.entry_id
+        )
+        self._next_save: float | None = None
+        # arrival of the last restored bus, until the first successful refresh
+        self._restored_until: datetime | None = None
+        self._bus_stop_codes: set[str] | None = None
+        # configured bus services by bus stop, None for all bus services
+        self._bus_stop_service_nos: dict[str, set[str] | None] = {}
+        self._out_of_service_bus_stop_codes: set[str] = set()
+        # thresholds in minutes by bus stop and bus service, and the last minutes
+        # of the approaching buses by bus stop, bus service and threshold
+        self._approaching_thresholds: dict[tuple[str, str], set[int]] = {}
+        self._approaching: dict[tuple[str, str, int], int] = {}
+        # estimated arrivals of the bus service sensors, recorded on each poll
+        self.arrival_history: ArrivalHistory | None = (
+            ArrivalHistory(BUS_ARRIVALS_COUNT, scan_interval)
+            if config_entry.data.get(CONF_ARRIVAL_HISTORY, False)
+            else None
+        )
+        self._arrival_history_store: Store[dict[str, Any]] = (
+            get_arrival_history_store(hass, config_entry.entry_id)
+        )
+        self._history_service_nos: dict[str, set[str]] = {}
+        self._next_history_save: float | None = None
+        # number of websocket subscriptions by bus stop
+        self._subscribed_bus_stop_codes: dict[str, int] = {}
+        # bus stops near the tracked people or devices, by subentry
+        self.nearby_bus_stops: dict[str, list[NearbyBusStop | None]] = {}
+        self._nearby_subentry_ids: set[str] = set()
+        self._nearby_locations: dict[str, tuple[float, float]] = {}
+        self._nearby_trackers: dict[str, CALLBACK_TYPE] = {}
+        config_entry.async_on_unload(self._async_untrack_nearby_bus_stops)
+        self._state_fns: dict[str, EntityStateFn] = {}
+        self.states: dict[str, EntityState] = {}
+        self.instrumented: bool = config_entry.data.get(CONF_INSTRUMENTATION, False)
+        self.statistics: RefreshStatistics = RefreshStatistics()
 
-        async def _get_all_bus_services():
-            self._all_bus_services = await self._sg_bus_arrivals.get_all_bus_services()
+        @callback
+        def _async_entity_registry_updated(
+            event: Event[er.EventEntityRegistryUpdatedData],
+        ) -> None:
+            """Re-evaluate the polled bus stops when entities are enabled/disabled."""
+            self._bus_stop_codes = None
 
-        # this is a slow api call so we are initializing it on start up
-        self._task: Task = hass.async_create_task(
-            _get_all_bus_services(), "get all bus services"
+        @callback
+        def _async_entity_registry_filter(
+            event_data: er.EventEntityRegistryUpdatedData,
+        ) -> bool:
+            return (
+                event_data["action"] != "update" or "disabled_by" in event_data["changes"]
+            )
+
+        config_entry.async_on_unload(
+            hass.bus.async_listen(
+                er.EVENT_ENTITY_REGISTRY_UPDATED,
+                _async_entity_registry_updated,
+                event_filter=_async_entity_registry_filter,
+            )
         )
 
+        # this is a slow api call so we are initializing it on start up,
+        # unless fast startup defers it to the first use
+        self._task: Task[None] | None = None
+        if not config_entry.data.get(CONF_FAST_STARTUP, False):
+            self._async_load_all_bus_services()
+
+    @callback
+    def _async_load_all_bus_services(self) -> Task[None]:
+        """Start fetching all bus services, once."""
+
+        async def _get_all_bus_services() -> None:
+            self._all_bus_services = await self._sg_bus_arrivals.get_all_bus_services()
+            self._all_bus_services_loaded = dt_util.utcnow().isoformat()
+
+        if self._task is None:
+            self._task = self.hass.async_create_task(
+                _get_all_bus_services(), "get all bus services"
+            )
+        return self._task
+
     async def get_bus_services(self, bus_stop_code: str) -> set[str]:
         """Fetch all bus services for the specified bus stop."""
-        await self._task
-        return self._all_bus_services.get(bus_stop_code, set())
+        await self._async_load_all_bus_services()
+        return set(self._all_bus_services.get(bus_stop_code, {}))
 
-    async def _async_update_data(self):
-        """Fetch data from API endpoint.
+    async def async_restore_data(self) -> None:
+        """Restore the last saved bus arrivals, e.g. after a restart.
 
-        This is the place to pre-process the data to lookup tables
-        so entities can quickly look up their data.
+        The minutes are recomputed from the arrival times and buses which have
+        already arrived are discarded.
         """
-        bus_stop_codes: set[str] = set()
-        assert self.config_entry is not None
-        for subentry in self.config_entry.subentries.values():
-            if subentry.subentry_type == SUBENTRY_TYPE_BUS_SERVICE:
-                bus_stop_codes.add(subentry.data[SUBENTRY_CONF_BUS_STOP_CODE])
+        stored: dict[str, Any] | None = await self._store.async_load()
+        if stored is None:
+            return
 
+        now_utc: datetime = dt_util.utcnow()
         all_bus_arrivals: dict[str, dict[str, BusArrival]] = collections.defaultdict(
             dict
         )
+        for bus_stop_code, bus_arrivals in stored["bus_arrivals"].items():
+            for bus_arrival in bus_arrivals:
+                restored: BusArrival | None = _recompute_bus_arrival(
+                    BusArrival(
+                        bus_stop_code,
+                        bus_arrival["service_no"],
+                        bus_arrival["operator"],
+                        [
+                            NextBus(
+                                None,
+                                next_bus["bus_type"],
+                                next_bus["feature"],
+                                next_bus["load"],
+                                datetime.fromisoformat(next_bus["estimated_arrival"]),
+                            )
+                            for next_bus in bus_arrival["next_bus"]
+                            if next_bus["estimated_arrival"] is not None
+                        ],
+                    ),
+                    now_utc,
+                )
+                if restored is not None:
+                    all_bus_arrivals[bus_stop_code][bus_arrival["service_no"]] = (
+                        restored
+                    )
+
+        _LOGGER.debug("Restored bus arrivals saved at %s", stored["saved"])
+        self.data = all_bus_arrivals
+        self._restored_until = _get_last_arrival(all_bus_arrivals)
+
+    @property
+    def has_restored_arrivals(self) -> bool:
+        """Return if the restored bus arrivals still have buses to arrive.
+
+        The restored bus arrivals are shown until the first successful refresh.
+        """
+        return (
+            self._restored_until is not None
+            and self._restored_until > dt_util.utcnow()
+        )
+
+    async def async_restore_arrival_history(self) -> None:
+        """Restore the saved arrival history, rebuilding its statistics."""
+        if self.arrival_history is None:
+            return
+        stored: dict[str, Any] | None = await self._arrival_history_store.async_load()
+        if stored is not None:
+            self.arrival_history.load(stored["histories"])
+
+    @callback
+    def _async_schedule_save(self) -> None:
+        """Save the bus arrivals at most once per save interval.
+
+        Every refresh reschedules the pending save to the same time, so the latest
+        bus arrivals are saved. Pending saves are written when Home Assistant stops.
+        """
+        now: float = time.monotonic()
+        if self._next_save is None or self._next_save <= now:
+            self._next_save = now + BUS_ARRIVALS_SAVE_INTERVAL_SECONDS
+        self._store.async_delay_save(self._data_to_store, self._next_save - now)
+
+    @callback
+    def _data_to_store(self) -> dict[str, Any]:
+        """Return the bus arrivals to save, with the absolute arrival times."""
+        return {
+            "saved": dt_util.utcnow().isoformat(),
+            "bus_arrivals": {
+                bus_stop_code: [
+                    {
+                        "service_no": bus_arrival.service_no,
+                        "operator": bus_arrival.operator,
+                        "next_bus": [
+                            {
+                                "estimated_arrival": next_bus.estimated_arrival.isoformat()
+                                if next_bus.estimated_arrival is not None
+                                else None,
+                                "bus_type": next_bus.bus_type,
+                                "feature": next_bus.feature,
+                                "load": next_bus.load,
+                            }
+                            for next_bus in bus_arrival.next_bus
+                        ],
+                    }
+                    for bus_arrival in bus_arrivals.values()
+                ]
+                for bus_stop_code, bus_arrivals in (self.data or {}).items()
+            },
+        }
+
+    @callback
+    def _arrival_history_to_store(self) -> dict[str, Any]:
+        """Return the arrival history to save."""
+        assert self.arrival_history is not None
+        return {
+            "saved": dt_util.utcnow().isoformat(),
+            "histories": self.arrival_history.to_dict(),
+        }
+
+    @callback
+    def async_reset_bus_stop_codes(self) -> None:
+        """Re-evaluate the polled bus stops on the next refresh."""
+        self._bus_stop_codes = None
+
+    async def get_all_bus_stops(self) -> dict[str, BusStop]:
+        """Fetch all bus stops, loaded on first use and again when too old."""
+
+        if self._all_bus_stops_task is None or (
+            self._all_bus_stops_task.done()
+            and self._all_bus_stops_expires is not None
+            and self._all_bus_stops_expires < dt_util.utcnow()
+        ):
+            self._all_bus_stops_task = self.hass.async_create_task(
+                self._async_load_all_bus_stops(), "get all bus stops"
+            )
+
         try:
-            # Note: asyncio.TimeoutError and aiohttp.ClientError are already
-            # handled by the data update coordinator.
-            async with timeout(10):
-                responses = await asyncio.gather(
-                    *[
-                        self._sg_bus_arrivals.get_bus_arrivals(bus_stop_code)
-                        for bus_stop_code in bus_stop_codes
+            return await self._all_bus_stops_task
+        except Exception:
+            # retry on next use
+            self._all_bus_stops_task = None
+            raise
+
+    async def _async_load_all_bus_stops(self) -> dict[str, BusStop]:
+        """Load the saved bus stops, fetching and saving them when too old.
+
+        The saved bus stops are still used when they are too old and the fetch fails,
+        and the fetch is retried later. The bus stops are converted from and to the
+        saved rows in an executor. The indexes are rebuilt when the bus stops change.
+        """
+        max_age: timedelta = timedelta(days=BUS_STOPS_MAX_AGE_DAYS)
+        stored: dict[str, Any] | None = await self._bus_stops_store.async_load()
+        if (
+            stored is None
+            or datetime.fromisoformat(stored["saved"]) < dt_util.utcnow() - max_age
+        ):
+            try:
+                all_bus_stops: dict[str, BusStop] = (
+                    await self._sg_bus_arrivals.get_all_bus_stops()
+                )
+            except ApiGeneralError:
+                if stored is None:
+                    raise
+                _LOGGER.warning("Using bus stops saved at %s", stored["saved"])
+                self._all_bus_stops_expires = dt_util.utcnow() + timedelta(
+                    hours=BUS_STOPS_RETRY_HOURS
+                )
+            else:
+                stored = {
+                    "saved": dt_util.utcnow().isoformat(),
+                    "bus_stops": await self.hass.async_add_executor_job(
+                        _bus_stops_to_rows, all_bus_stops
+                    ),
+                }
+                await self._bus_stops_store.async_save(stored)
+
+        saved: datetime = datetime.fromisoformat(stored["saved"])
+        if saved >= dt_util.utcnow() - max_age:
+            self._all_bus_stops_expires = saved + max_age
+        if stored["saved"] == self._all_bus_stops_loaded:
+            return self._all_bus_stops
+
+        self._all_bus_stops = await self.hass.async_add_executor_job(
+            _bus_stops_from_rows, stored["bus_stops"]
+        )
+        self._all_bus_stops_loaded = stored["saved"]
+        self._bus_stop_spatial_index = None
+        self._bus_stop_text_index = None
+        return self._all_bus_stops
+
+    async def get_bus_stop_spatial_index(self) -> BusStopSpatialIndex:
+        """Return the spatial index over all bus stops, built on first use.
+
+        The index is built in an executor, and again when the bus stops change.
+        """
+
+        all_bus_stops: dict[str, BusStop] = await self.get_all_bus_stops()
+        if self._bus_stop_spatial_index is not None:
+            return self._bus_stop_spatial_index
+
+        spatial_index: BusStopSpatialIndex = await self.hass.async_add_executor_job(
+            BusStopSpatialIndex, list(all_bus_stops.values())
+        )
+        if all_bus_stops is self._all_bus_stops:
+            self._bus_stop_spatial_index = spatial_index
+        return spatial_index
+
+    async def get_bus_stop_text_index(self) -> BusStopTextIndex:
+        """Return the text index over all bus stops, built on first use.
+
+        The index is built in an executor, and again when the bus stops change.
+        """
+
+        all_bus_stops: dict[str, BusStop] = await self.get_all_bus_stops()
+        if self._bus_stop_text_index is not None:
+            return self._bus_stop_text_index
+
+        text_index: BusStopTextIndex = await self.hass.async_add_executor_job(
+            BusStopTextIndex, list(all_bus_stops.values())
+        )
+        if all_bus_stops is self._all_bus_stops:
+            self._bus_stop_text_index = text_index
+        return text_index
+
+    def get_cache_statistics(self) -> dict[str, Any]:
+        """Get the sizes and ages of the cached data, for diagnostics."""
+
+        return {
+            "all_bus_services": {
+                "bus_stops": len(self._all_bus_services),
+                "bus_services": sum(
+                    len(bus_services) for bus_services in self._all_bus_services.values()
+                ),
+                "loaded": self._all_bus_services_loaded,
+            },
+            "all_bus_stops": {
+                "bus_stops": len(self._all_bus_stops),
+                "loaded": self._all_bus_stops_loaded,
+            },
+            "bus_stop_spatial_index": len(self._bus_stop_spatial_index)
+            if self._bus_stop_spatial_index is not None
+            else None,
+            "bus_stop_text_index": len(self._bus_stop_text_index)
+            if self._bus_stop_text_index is not None
+            else None,
+            "polled_bus_stops": len(self._get_bus_stop_codes())
+            if self._bus_stop_codes is not None
+            else None,
+            "out_of_service_bus_stops": len(self._out_of_service_bus_stop_codes),
+            "shards": len(self._shards),
+            "subscribed_bus_stops": len(self._subscribed_bus_stop_codes),
+            "arrival_history": {
+                "bus_services": len(self.arrival_history),
+                "polls": self.arrival_history.get_polls(),
+            }
+            if self.arrival_history is not None
+            else None,
+            "entity_states": len(self.states),
+        }
+
+    @callback
+    def async_add_state_fn(
+        self, unique_id: str, state_fn: EntityStateFn
+    ) -> CALLBACK_TYPE:
+        """Add a function which computes the state of an entity on each refresh.
+
+        The states are precomputed so entity properties are a dictionary lookup.
+        """
+        self._state_fns[unique_id] = state_fn
+        if self.data is not None:
+            self.states[unique_id] = state_fn(self.data)
+
+        @callback
+        def _remove_state_fn() -> None:
+            self._state_fns.pop(unique_id, None)
+            self.states.pop(unique_id, None)
+
+        return _remove_state_fn
+
+    @callback
+    def async_subscribe_bus_stop(
+        self, bus_stop_code: str, update_callback: CALLBACK_TYPE
+    ) -> CALLBACK_TYPE:
+        """Poll a bus stop and call update_callback after each refresh.
+
+        A bus stop which is not polled yet is fetched on the next refresh, which is
+        requested. Returns a function which unsubscribes.
+        """
+        count: int = self._subscribed_bus_stop_codes.get(bus_stop_code, 0)
+        self._subscribed_bus_stop_codes[bus_stop_code] = count + 1
+        if count == 0:
+            self._bus_stop_codes = None
+        remove_listener: CALLBACK_TYPE = self.async_add_listener(update_callback)
+        if self.data is None or bus_stop_code not in self.data:
+            assert self.config_entry is not None
+            self.config_entry.async_create_background_task(
+                self.hass,
+                self.async_request_refresh(),
+                f"{self.name} subscribe {bus_stop_code}",
+            )
+
+        @callback
+        def _unsubscribe() -> None:
+            remove_listener()
+            if self._subscribed_bus_stop_codes[bus_stop_code] > 1:
+                self._subscribed_bus_stop_codes[bus_stop_code] -= 1
+            else:
+                del self._subscribed_bus_stop_codes[bus_stop_code]
+                self._bus_stop_codes = None
+
+        return _unsubscribe
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Compute the entity states, then update all registered listeners."""
+        start: float = time.perf_counter()
+        if self.data is not None:
+            self.states = {
+                unique_id: state_fn(self.data)
+                for unique_id, state_fn in self._state_fns.items()
+            }
+        super().async_update_listeners()
+
+        if self.instrumented:
+            self.statistics.last_fan_out_duration = time.perf_counter() - start
+
+    def _get_bus_stop_codes(self) -> set[str]:
+        """Get the bus stops with at least 1 enabled bus arrival or bus stop sensor.
+
+        Includes the bus stops near the trackers of the nearby bus stops subentries,
+        which change without re-evaluating the other bus stops.
+        """
+
+        if self._bus_stop_codes is None:
+            assert self.config_entry is not None
+            self._bus_stop_service_nos = {}
+            self._history_service_nos = {}
+            for subentry_id in get_enabled_subentry_ids(
+                self.hass, self.config_entry, SUBENTRY_TYPE_BUS_SERVICE
+            ):
+                data: Mapping[str, Any] = self.config_entry.subentries[subentry_id].data
+                service_nos: set[str] | None = self._bus_stop_service_nos.setdefault(
+                    data[SUBENTRY_CONF_BUS_STOP_CODE], set()
+                )
+                if service_nos is not None:
+                    service_nos.add(data[SUBENTRY_CONF_SERVICE_NO])
+                self._history_service_nos.setdefault(
+                    data[SUBENTRY_CONF_BUS_STOP_CODE], set()
+                ).add(data[SUBENTRY_CONF_SERVICE_NO])
+            for subentry_id in get_enabled_subentry_ids(
+                self.hass, self.config_entry, SUBENTRY_TYPE_BUS_STOP
+            ):
+                self._bus_stop_service_nos[
+                    self.config_entry.subentries[subentry_id].data[
+                        SUBENTRY_CONF_BUS_STOP_CODE
                     ]
+                ] = None
+            # approaching bus subentries have no entities and are always polled
+            self._approaching_thresholds = {}
+            for subentry in self.config_entry.subentries.values():
+                if subentry.subentry_type != SUBENTRY_TYPE_APPROACHING_BUS:
+                    continue
+                bus_stop_code: str = subentry.data[SUBENTRY_CONF_BUS_STOP_CODE]
+                service_no: str = subentry.data[SUBENTRY_CONF_SERVICE_NO]
+                self._approaching_thresholds.setdefault(
+                    (bus_stop_code, service_no), set()
+                ).add(int(subentry.data[SUBENTRY_CONF_MINUTES]))
+                service_nos = self._bus_stop_service_nos.setdefault(
+                    bus_stop_code, set()
                 )
-                for response in responses:
-                    # Bus arrivals for a specific bus stop code.
-                    bus_arrivals: list[BusArrival] = response
-
-                    # Populate the data structure with bus arrivals.
-                    for bus_arrival in bus_arrivals:
-                        all_bus_arrivals[bus_arrival.bus_stop_code][
-                            bus_arrival.service_no
-                        ] = bus_arrival
-                _LOGGER.debug("coordinator updated data")
-                return all_bus_arrivals
-        except ApiAuthenticationError as err:
-            raise ConfigEntryAuthFailed from err
+                if service_nos is not None:
+                    service_nos.add(service_no)
+            # buses approaching removed thresholds are forgotten
+            self._approaching = {
+                key: minutes
+                for key, minutes in self._approaching.items()
+                if key[2] in self._approaching_thresholds.get(key[:2], set())
+            }
+            # subscriptions show all bus services at the bus stop
+            for bus_stop_code in self._subscribed_bus_stop_codes:
+                self._bus_stop_service_nos[bus_stop_code] = None
+            self._bus_stop_codes = set(self._bus_stop_service_nos)
+            if self.arrival_history is not None:
+                self.arrival_history.retain(
+                    (bus_stop_code, service_no)
+                    for bus_stop_code, service_nos in self._history_service_nos.items()
+                    for service_no in service_nos
+                )
+            self._nearby_subentry_ids = get_enabled_subentry_ids(
+                self.hass, self.config_entry, SUBENTRY_TYPE_NEARBY_BUS_STOPS
+            )
+            self._async_track_nearby_bus_stops()
+            _LOGGER.debug("Polling bus stops: %s", self._bus_stop_codes)
+
+        return self._bus_stop_codes | self._get_nearby_bus_stop_codes()
+
+    def _get_nearby_bus_stop_codes(self) -> set[str]:
+        """Get the bus stops near the trackers of the enabled subentries."""
+        return {
+            nearby_bus_stop.bus_stop.bus_stop_code
+            for subentry_id in self._nearby_subentry_ids
+            for nearby_bus_stop in self.nearby_bus_stops.get(subentry_id, ())
+            if nearby_bus_stop is not None
+        }
+
+    @callback
+    def _async_track_nearby_bus_stops(self) -> None:
+        """Follow the trackers of the enabled nearby bus stops subentries."""
+        assert self.config_entry is not None
+        for subentry_id in set(self._nearby_trackers) - self._nearby_subentry_ids:
+            self._nearby_trackers.pop(subentry_id)()
+            self.nearby_bus_stops.pop(subentry_id, None)
+            self._nearby_locations.pop(subentry_id, None)
+
+        for subentry_id in self._nearby_subentry_ids - set(self._nearby_trackers):
+            subentry: ConfigSubentry = self.config_entry.subentries[subentry_id]
+            self._nearby_trackers[subentry_id] = self._async_track_tracker(subentry)
+            self._async_tracker_moved(
+                subentry, self.hass.states.get(subentry.data[SUBENTRY_CONF_TRACKER])
+            )
+
+    @callback
+    def _async_track_tracker(self, subentry: ConfigSubentry) -> CALLBACK_TYPE:
+        """Follow the location of the tracker of a subentry."""
+
+        @callback
+        def _async_tracker_state_changed(event: Event[EventStateChangedData]) -> None:
+            self._async_tracker_moved(subentry, event.data["new_state"])
+
+        return async_track_state_change_event(
+            self.hass, subentry.data[SUBENTRY_CONF_TRACKER], _async_tracker_state_changed
+        )
+
+    @callback
+    def _async_untrack_nearby_bus_stops(self) -> None:
+        """Stop following the trackers."""
+        for remove_tracker in self._nearby_trackers.values():
+            remove_tracker()
+        self._nearby_trackers.clear()
+
+    @callback
+    def _async_tracker_moved(self, subentry: ConfigSubentry, state: State | None) -> None:
+        """Update the nearby bus stops once the tracker has moved far enough."""
+        if state is None:
+            return
+        latitude: float | None = state.attributes.get(ATTR_LATITUDE)
+        longitude: float | None = state.attributes.get(ATTR_LONGITUDE)
+        if latitude is None or longitude is None:
+            return
+
+        location: tuple[float, float] | None = self._nearby_locations.get(
+            subentry.subentry_id
+        )
+        if (
+            location is not None
+            and distance_metres(*location, latitude, longitude)
+            < NEARBY_BUS_STOPS_MIN_MOVE_METRES
+        ):
+            return
+
+        assert self.config_entry is not None
+        self._nearby_locations[subentry.subentry_id] = (latitude, longitude)
+        self.config_entry.async_create_background_task(
+            self.hass,
+            self._async_update_nearby_bus_stops(subentry, latitude, longitude),
+            "update nearby bus stops",
+        )
+
+    async def _async_update_nearby_bus_stops(
+        self, subentry: ConfigSubentry, latitude: float, longitude: float
+    ) -> None:
+        """Replace the nearby bus stops which are no longer among the nearest.
+
+        A bus stop keeps its place while it is within the hysteresis distance of
+        the nearest bus stops, so GPS jitter does not swap the bus stops of the
+        sensors or the polled bus stops. Freed places get the nearest new bus stops.
+        """
+        try:
+            spatial_index: BusStopSpatialIndex = (
+                await self.get_bus_stop_spatial_index()
+            )
         except ApiGeneralError as err:
-            raise UpdateFailed from err
+            _LOGGER.warning("Unable to find the nearby bus stops: %s", err)
+            # retry on the next move
+            self._nearby_locations.pop(subentry.subentry_id, None)
+            return
+        if subentry.subentry_id not in self._nearby_trackers:
+            return
+
+        count: int = int(subentry.data[SUBENTRY_CONF_COUNT])
+        nearest: list[tuple[float, BusStop]] = spatial_index.nearest(
+            latitude, longitude, count
+        )
+        max_distance: float = (
+            nearest[-1][0] if nearest else 0
+        ) + NEARBY_BUS_STOPS_HYSTERESIS_METRES
+
+        nearby_bus_stops: list[NearbyBusStop | None] = []
+        for nearby_bus_stop in self.nearby_bus_stops.get(
+            subentry.subentry_id, [None] * count
+        ):
+            if nearby_bus_stop is not None:
+                bus_stop: BusStop = nearby_bus_stop.bus_stop
+                assert bus_stop.latitude is not None
+                assert bus_stop.longitude is not None
+                distance: float = distance_metres(
+                    latitude, longitude, bus_stop.latitude, bus_stop.longitude
+                )
+                if distance <= max_distance:
+                    nearby_bus_stops.append(NearbyBusStop(bus_stop, distance))
+                    continue
+            nearby_bus_stops.append(None)
+
+        kept_bus_stop_codes: set[str] = {
+            nearby_bus_stop.bus_stop.bus_stop_code
+            for nearby_bus_stop in nearby_bus_stops
+            if nearby_bus_stop is not None
+        }
+        new_bus_stops = (
+            NearbyBusStop(bus_stop, distance)
+            for distance, bus_stop in nearest
+            if bus_stop.bus_stop_code not in kept_bus_stop_codes
+        )
+        nearby_bus_stops = [
+            nearby_bus_stop
+            if nearby_bus_stop is not None
+            else next(new_bus_stops, None)
+            for nearby_bus_stop in nearby_bus_stops
+        ]
+
+        bus_stop_codes: set[str] = self._get_nearby_bus_stop_codes()
+        self.nearby_bus_stops[subentry.subentry_id] = nearby_bus_stops
+        # the sensors show the new bus stops until their arrivals are fetched
+        self.async_update_listeners()
+        if self._get_nearby_bus_stop_codes() != bus_stop_codes:
+            _LOGGER.debug(
+                "Nearby bus stops of %s: %s",
+                subentry.data[SUBENTRY_CONF_TRACKER],
+                [
+                    nearby_bus_stop.bus_stop.bus_stop_code
+                    for nearby_bus_stop in nearby_bus_stops
+                    if nearby_bus_stop is not None
+                ],
+            )
+            await self.async_request_refresh()
+
+    def _get_operating_bus_stop_codes(self, bus_stop_codes: set[str]) -> set[str]:
+        """Get the bus stops where at least 1 configured bus service is running.
+
+        All bus services at a bus stop are configured for bus stop sensors and
+        nearby bus stops. Bus services are assumed to run until the first and last
+        bus times are loaded, and if the times of a bus service are unknown.
+        """
+        if self._all_bus_services_loaded is None:
+            return bus_stop_codes
+
+        now: datetime = dt_util.now(dt_util.get_time_zone(OPERATING_HOURS_TIME_ZONE))
+        margin: timedelta = timedelta(minutes=OPERATING_HOURS_MARGIN_MINUTES)
+        operating_bus_stop_codes: set[str] = set()
+        for bus_stop_code in bus_stop_codes:
+            bus_services: dict[str, OperatingHours] = self._all_bus_services.get(
+                bus_stop_code, {}
+            )
+            service_nos: set[str] | None = self._bus_stop_service_nos.get(
+                bus_stop_code
+            )
+            if not bus_services or any(
+                service_no not in bus_services
+                or is_operating(bus_services[service_no], now, margin)
+                for service_no in (
+                    service_nos if service_nos is not None else bus_services
+                )
+            ):
+                operating_bus_stop_codes.add(bus_stop_code)
+
+        if bus_stop_codes - operating_bus_stop_codes != (
+            self._out_of_service_bus_stop_codes
+        ):
+            self._out_of_service_bus_stop_codes = (
+                bus_stop_codes - operating_bus_stop_codes
+            )
+            _LOGGER.debug(
+                "Not polling bus stops without running bus services: %s",
+                self._out_of_service_bus_stop_codes,
+            )
+        return operating_bus_stop_codes
+
+    def _get_shard(self, bus_stop_codes: set[str]) -> set[str]:
+        """Get the bus stops to poll in this refresh.
+
+        The bus stops are split into shards of at most BUS_ARRIVALS_SHARD_SIZE
+        which are polled in turn, one shard per scan interval divided by the number
+        of shards. New bus stops are added to the next shard so they are fetched
+        immediately.
+        """
+        shard_count: int = max(
+            1, math.ceil(len(bus_stop_codes) / BUS_ARRIVALS_SHARD_SIZE)
+        )
+        if len(self._shards) != shard_count:
+            ordered_bus_stop_codes: list[str] = sorted(bus_stop_codes)
+            self._shards = [
+                set(ordered_bus_stop_codes[index::shard_count])
+                for index in range(shard_count)
+            ]
+            self._shard_index = 0
+            self.update_interval = timedelta(
+                seconds=self._scan_interval / shard_count
+            )
+            _LOGGER.debug(
+                "Polling %d bus stops in %d shards every %s",
+                len(bus_stop_codes),
+                shard_count,
+                self.update_interval,
+            )
+        else:
+            for shard in self._shards:
+                shard &= bus_stop_codes
+            self._shards[self._shard_index] |= bus_stop_codes.difference(
+                *self._shards
+            )
+
+        shard = self._shards[self._shard_index]
+        self._shard_index = (self._shard_index + 1) % shard_count
+        return shard
+
+    async def _async_get_bus_arrivals(
+        self, bus_stop_codes: set[str]
+    ) -> dict[str, list[BusArrival]]:
+        """Fetch the bus arrivals of a shard within the shard time budget.
+
+        Bus stops which fail or run out of time are left out, unless all of them
+        fail. The account key is always checked. The time budget is at most the
+        interval between the shards, so a slow shard delays the next shard by at
+        most one interval.
+        """
+        tasks: dict[Task[list[BusArrival]], str] = {
+            asyncio.create_task(
+                self._sg_bus_arrivals.get_bus_arrivals(bus_stop_code)
+            ): bus_stop_code
+            for bus_stop_code in bus_stop_codes
+        }
+        if not tasks:
+            return {}
+        timeout: float = BUS_ARRIVALS_SHARD_TIMEOUT_SECONDS
+        if self.update_interval is not None:
+            timeout = min(timeout, self.update_interval.total_seconds())
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+            _LOGGER.debug(
+                "Bus arrivals not fetched in time: %s",
+                {tasks[task] for task in pending},
+            )
+
+        responses: dict[str, list[BusArrival]] = {}
+        error: BaseException | None = None
+        for task in done:
+            exception: BaseException | None = task.exception()
+            if isinstance(exception, ApiAuthenticationError):
+                raise ConfigEntryAuthFailed from exception
+            if isinstance(exception, (ApiGeneralError, ClientError, TimeoutError)):
+                _LOGGER.debug(
+                    "Bus arrivals not fetched for %s: %s", tasks[task], exception
+                )
+                error = exception
+            elif exception is not None:
+                raise exception
+            else:
+                responses[tasks[task]] = task.result()
+
+        if not responses:
+            if error is None:
+                raise UpdateFailed("Bus arrivals not fetched in time")
+            raise UpdateFailed(error) from error
+        return responses
+
+    async def _async_update_data(self):
+        """Fetch data from API endpoint.
+
+        This is the place to pre-process the data to lookup tables
+        so entities can quickly look up their data.
+        """
+        self._refresh_start = time.perf_counter()
+        bus_stop_codes: set[str] = self._get_operating_bus_stop_codes(
+            self._get_bus_stop_codes()
+        )
+
+        start: float = time.perf_counter()
+        shard: set[str] = self._get_shard(bus_stop_codes)
+        responses: dict[str, list[BusArrival]] = await self._async_get_bus_arrivals(
+            shard
+        )
+        fetched: float = time.perf_counter()
+
+        # the bus stops of the other shards keep their last bus arrivals, the bus
+        # stops of this shard which were not fetched keep the buses yet to arrive
+        now_utc: datetime = dt_util.utcnow()
+        all_bus_arrivals: dict[str, dict[str, BusArrival]] = {}
+        for bus_stop_code, bus_arrivals in (self.data or {}).items():
+            if bus_stop_code not in bus_stop_codes or bus_stop_code in responses:
+                continue
+            if bus_stop_code not in shard:
+                all_bus_arrivals[bus_stop_code] = bus_arrivals
+                continue
+            recomputed: dict[str, BusArrival] = _recompute_bus_stop(
+                bus_arrivals, now_utc
+            )
+            if recomputed:
+                all_bus_arrivals[bus_stop_code] = recomputed
+        for bus_stop_code, response in responses.items():
+            # Populate the data structure with bus arrivals.
+            for bus_arrival in response:
+                all_bus_arrivals.setdefault(bus_stop_code, {})[
+                    bus_arrival.service_no
+                ] = bus_arrival
+
+        self._async_fire_approaching_events(responses.keys(), all_bus_arrivals)
+        if self.arrival_history is not None:
+            self._async_record_arrival_history(responses.keys(), all_bus_arrivals)
+
+        if self.instrumented:
+            self.statistics.refreshes += 1
+            self.statistics.last_fetch_duration = fetched - start
+            self.statistics.last_process_duration = time.perf_counter() - fetched
+        _LOGGER.debug("coordinator updated data")
+        self._restored_until = None
+        self._async_schedule_save()
+        return all_bus_arrivals
+
+    @callback
+    def _async_record_arrival_history(
+        self,
+        bus_stop_codes: Iterable[str],
+        all_bus_arrivals: dict[str, dict[str, BusArrival]],
+    ) -> None:
+        """Record the estimated arrivals of the bus service sensors.
+
+        Only the polled bus stops are recorded. A bus service without arrivals is
+        recorded too, as its last bus may have arrived. The history is saved at most
+        once per save interval.
+        """
+        assert self.arrival_history is not None
+        polled: int = int(dt_util.utcnow().timestamp())
+        for bus_stop_code in bus_stop_codes:
+            for service_no in self._history_service_nos.get(bus_stop_code, ()):
+                bus_arrival: BusArrival | None = all_bus_arrivals.get(
+                    bus_stop_code, {}
+                ).get(service_no)
+                self.arrival_history.record(
+                    bus_stop_code,
+                    service_no,
+                    polled,
+                    [
+                        int(next_bus.estimated_arrival.timestamp())
+                        if next_bus.estimated_arrival is not None
+                        else None
+                        for next_bus in bus_arrival.next_bus
+                    ]
+                    if bus_arrival is not None
+                    else [],
+                )
+        now: float = time.monotonic()
+        if self._next_history_save is None or self._next_history_save <= now:
+            self._next_history_save = now + ARRIVAL_HISTORY_SAVE_INTERVAL_SECONDS
+        self._arrival_history_store.async_delay_save(
+            self._arrival_history_to_store, self._next_history_save - now
+        )
+
+    @callback
+    def _async_fire_approaching_events(
+        self,
+        bus_stop_codes: Iterable[str],
+        all_bus_arrivals: dict[str, dict[str, BusArrival]],
+    ) -> None:
+        """Fire an event when the next bus comes within a threshold.
+
+        Only the thresholds of the polled bus stops are evaluated. A bus stays
+        approaching until there is no next bus or its arrival moves later by more
+        than APPROACHING_HYSTERESIS_MINUTES, e.g. when it has arrived and the next
+        bus is the one after it.
+        """
+        polled_bus_stop_codes: set[str] = set(bus_stop_codes)
+        for (
+            bus_stop_code,
+            service_no,
+        ), thresholds in self._approaching_thresholds.items():
+            if bus_stop_code not in polled_bus_stop_codes:
+                continue
+
+            bus_arrival: BusArrival | None = all_bus_arrivals.get(
+                bus_stop_code, {}
+            ).get(service_no)
+            next_bus: NextBus | None = (
+                bus_arrival.next_bus[0] if bus_arrival is not None else None
+            )
+            minutes: int | None = (
+                next_bus.estimated_arrival_minutes if next_bus is not None else None
+            )
+            for threshold in thresholds:
+                key: tuple[str, str, int] = (bus_stop_code, service_no, threshold)
+                last_minutes: int | None = self._approaching.get(key)
+                if minutes is None or (
+                    last_minutes is not None
+                    and minutes > last_minutes + APPROACHING_HYSTERESIS_MINUTES
+                ):
+                    self._approaching.pop(key, None)
+                    last_minutes = None
+                if minutes is None:
+                    continue
+
+                if last_minutes is not None:
+                    self._approaching[key] = minutes
+                elif minutes <= threshold:
+                    assert bus_arrival is not None
+                    assert next_bus is not None
+                    self._approaching[key] = minutes
+                    self.hass.bus.async_fire(
+                        EVENT_APPROACHING,
+                        {
+                            "bus_stop_code": bus_stop_code,
+                            "service_no": service_no,
+                            "threshold": threshold,
+                            "estimated_arrival_minutes": minutes,
+                            "estimated_arrival": next_bus.estimated_arrival.isoformat()
+                            if next_bus.estimated_arrival is not None
+                            else None,
+                            "operator": bus_arrival.operator,
+                            "bus_type": next_bus.bus_type,
+                            "feature": next_bus.feature,
+                            "load": next_bus.load,
+                        },
+                    )
+
+    @callback
+    def _async_refresh_finished(self) -> None:
+        """Record the duration and the success/failure streaks of the refresh."""
+
+        super()._async_refresh_finished()
+        if self._refresh_start is not None:
+            self.statistics.last_refresh_duration = (
+                time.perf_counter() - self._refresh_start
+            )
+            self._refresh_start = None
+
+        now: str = dt_util.utcnow().isoformat()
+        if self.last_update_success:
+            self.statistics.success_streak += 1
+            self.statistics.failure_streak = 0
+            self.statistics.last_success = now
+        else:
+            self.statistics.failure_streak += 1
+            self.statistics.success_streak = 0
+            self.statistics.last_failure = now
+
+        # the restored bus arrivals count down while the refreshes fail
+        if (
+            not self.last_update_success
+            and self._restored_until is not None
+            and self.data is not None
+        ):
+            now_utc: datetime = dt_util.utcnow()
+            self.data = {
+                bus_stop_code: recomputed
+                for bus_stop_code, bus_arrivals in self.data.items()
+                if (recomputed := _recompute_bus_stop(bus_arrivals, now_utc))
+            }
+            # the listeners are only updated by the first of consecutive failures
+            if self.statistics.failure_streak > 1:
+                self.async_update_listeners()
@@ -2,18 +2,27 @@
 
 from __future__ import annotations
 
+from dataclasses import asdict
 from typing import Any
 
 from homeassistant.components.diagnostics import async_redact_data
 from homeassistant.const import CONF_API_KEY
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 
+from .api import SgBusArrivals
 from .const import (
     SUBENTRY_CONF_BUS_STOP_CODE,
     SUBENTRY_CONF_SERVICE_NO,
+    SUBENTRY_TYPE_BUS_SERVICE,
+    SUBENTRY_TYPE_BUS_STOP,
     SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
 )
-from .coordinator import SgBusArrivalsConfigEntry
+from .coordinator import (
+    BusArrivalsUpdateCoordinator,
+    SgBusArrivalsConfigEntry,
+    SgBusArrivalsData,
+)
 
 TO_REDACT = {CONF_API_KEY}
 
@@ -25,17 +34,72 @@ async def async_get_config_entry_diagnostics(
 
     diagnostics: dict[str, Any] = {
         "config_entry_data": async_redact_data(dict(config_entry.data), TO_REDACT),
-        "bus_services": []
+        "bus_services": [],
+        "bus_stops": [],
     }
 
     # collect subentry info
     for subentry in config_entry.subentries.values():
         if subentry.subentry_type == SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS:
             diagnostics["train_service_alerts"] = "True"
-        else:
+        elif subentry.subentry_type == SUBENTRY_TYPE_BUS_STOP:
+            diagnostics["bus_stops"].append(subentry.data[SUBENTRY_CONF_BUS_STOP_CODE])
+        elif subentry.subentry_type == SUBENTRY_TYPE_BUS_SERVICE:
             diagnostics["bus_services"].append({
                 SUBENTRY_CONF_BUS_STOP_CODE: subentry.data[SUBENTRY_CONF_BUS_STOP_CODE],
                 SUBENTRY_CONF_SERVICE_NO: subentry.data[SUBENTRY_CONF_SERVICE_NO]
             })
 
+    # network usage by endpoint
+    sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+    sg_bus_arrivals: SgBusArrivals = sg_bus_arrivals_data.api
+    diagnostics["api_statistics"] = {
+        endpoint: asdict(statistics)
+        for endpoint, statistics in sg_bus_arrivals.get_statistics().items()
+    }
+    diagnostics["api_requests_last_hour"] = sg_bus_arrivals.get_recent_requests()
+    diagnostics["rate_limit_events"] = [
+        asdict(event) for event in sg_bus_arrivals.get_rate_limit_events()
+    ]
+    diagnostics["circuit_breakers"] = {
+        family: asdict(statistics)
+        for family, statistics in sg_bus_arrivals.get_circuit_breakers().items()
+    }
+    connection_statistics = sg_bus_arrivals.get_connection_statistics()
+    diagnostics["connection_statistics"] = (
+        asdict(connection_statistics) if connection_statistics is not None else None
+    )
+
+    # coordinator health and caches
+    bus_arrivals_coordinator: BusArrivalsUpdateCoordinator = (
+        sg_bus_arrivals_data.bus_arrivals_coordinator
+    )
+    diagnostics["refresh_statistics"] = asdict(bus_arrivals_coordinator.statistics)
+    diagnostics["coordinators"] = {
+        "bus_arrivals": _get_coordinator_diagnostics(bus_arrivals_coordinator)
+    }
+    if sg_bus_arrivals_data.train_service_alerts_coordinator is not None:
+        diagnostics["coordinators"]["train_service_alerts"] = (
+            _get_coordinator_diagnostics(
+                sg_bus_arrivals_data.train_service_alerts_coordinator
+            )
+        )
+    diagnostics["caches"] = bus_arrivals_coordinator.get_cache_statistics()
+
     return diagnostics
+
+
+def _get_coordinator_diagnostics(
+    coordinator: DataUpdateCoordinator[Any],
+) -> dict[str, Any]:
+    """Return the update state of a coordinator."""
+
+    return {
+        "last_update_success": coordinator.last_update_success,
+        "last_exception": repr(coordinator.last_exception)
+        if coordinator.last_exception is not None
+        else None,
+        "update_interval": coordinator.update_interval.total_seconds()
+        if coordinator.update_interval is not None
+        else None,
+    }
@@ -1,6 +1,7 @@
 """The SG Bus Arrivals integration models."""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import datetime
 
 
 @dataclass
@@ -11,6 +12,7 @@ class NextBus:
     bus_type: str | None = None
     feature: str | None = None
     load: str | None = None
+    estimated_arrival: datetime | None = None
 
 
 @dataclass
@@ -23,6 +25,19 @@ class BusArrival:
     next_bus: list[NextBus]
 
 
+@dataclass
+class OperatingHours:
+    """First and last bus of a bus service at a bus stop, by day type.
+
+    Each is a pair of minutes after midnight, the last bus is after 1440 (24:00)
+    if it runs past midnight. None if the bus service does not run that day.
+    """
+
+    weekdays: tuple[int, int] | None = None
+    saturdays: tuple[int, int] | None = None
+    sundays: tuple[int, int] | None = None
+
+
 @dataclass
 class BusStop:
     """Class representing a bus stop."""
@@ -30,6 +45,28 @@ class BusStop:
     bus_stop_code: str
     road_name: str
     description: str
+    latitude: float | None = None
+    longitude: float | None = None
+
+
+@dataclass
+class NearbyBusStop:
+    """Class representing a bus stop near a tracked person or device."""
+
+    bus_stop: BusStop
+    distance: float
+
+
+@dataclass
+class AffectedSegment:
+    """Class representing a disrupted segment of a train line."""
+
+    line: str
+    direction: str
+    stations: list[str]
+    free_public_bus: list[str]
+    free_mrt_shuttle: list[str]
+    mrt_shuttle_direction: str
 
 
 @dataclass
@@ -38,3 +75,69 @@ class TrainServiceAlert:
 
     status: str
     messages: list[str]
+    affected_segments: list[AffectedSegment] = field(default_factory=list)
+
+
+@dataclass
+class EndpointStatistics:
+    """Network usage statistics for an API endpoint."""
+
+    requests: int = 0
+    bytes_on_wire: int = 0
+    bytes_decoded: int = 0
+    rate_limited: int = 0
+
+    # only recorded with instrumentation enabled
+    status_codes: dict[int, int] = field(default_factory=dict)
+    latency_histogram: dict[str, int] = field(default_factory=dict)
+    total_latency: float = 0
+
+
+@dataclass
+class ConnectionStatistics:
+    """Connection reuse statistics of the dedicated session."""
+
+    new_connections: int = 0
+    reused_connections: int = 0
+    total_connect_time: float = 0
+    dns_cache_hits: int = 0
+    dns_cache_misses: int = 0
+
+
+@dataclass
+class CircuitBreakerStatistics:
+    """State of the circuit breaker of an endpoint family."""
+
+    state: str = "closed"
+    consecutive_failures: int = 0
+    opened: int = 0
+    rejected: int = 0
+    last_opened: str | None = None
+
+
+@dataclass
+class RateLimitEvent:
+    """A rate limited (HTTP 429) API response."""
+
+    endpoint: str
+    time: str
+    retry_after: str | None = None
+
+
+@dataclass
+class RefreshStatistics:
+    """Timings of the bus arrivals coordinator."""
+
+    # always recorded
+    last_refresh_duration: float = 0
+    success_streak: int = 0
+    failure_streak: int = 0
+    last_success: str | None = None
+    last_failure: str | None = None
+
+    # only recorded with instrumentation enabled
+    refreshes: int = 0
+    last_fetch_duration: float = 0
+    last_process_duration: float = 0
+    last_fan_out_duration: float = 0
+    state_writes: int = 0
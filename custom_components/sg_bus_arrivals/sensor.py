@@ -1,40 +1,72 @@
 """Platform for sensor integration."""
 
+from abc import abstractmethod
 from collections.abc import Callable, Mapping
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 import logging
 from typing import Any
 
 from homeassistant.components.sensor import (
+    RestoreSensor,
     SensorDeviceClass,
     SensorEntity,
     SensorEntityDescription,
 )
-from homeassistant.components.sensor.const import SensorStateClass, UnitOfTime
+from homeassistant.components.sensor.const import SensorStateClass
 from homeassistant.config_entries import ConfigSubentry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import PERCENTAGE, EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr, entity_registry as er
 from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
 from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.helpers.typing import StateType
+from homeassistant.helpers.update_coordinator import (
+    CoordinatorEntity,
+    DataUpdateCoordinator,
+)
 
 from . import SgBusArrivalsConfigEntry
-from .api import BUS_ARRIVALS_COUNT, SgBusArrivals
+from .api import BUS_ARRIVALS_COUNT, CIRCUIT_BREAKER_STATES, SgBusArrivals
+from .arrival_history import ArrivalStatistics
 from .const import (
+    CONF_COMPACT_MODE,
+    CONF_FAST_STARTUP,
+    CONF_INSTRUMENTATION,
+    CONF_RECORD_ATTRIBUTES,
     DOMAIN,
     SUBENTRY_CONF_BUS_STOP_CODE,
+    SUBENTRY_CONF_COUNT,
     SUBENTRY_CONF_DESCRIPTION,
     SUBENTRY_CONF_SERVICE_NO,
+    SUBENTRY_CONF_TRACKER,
     SUBENTRY_TYPE_BUS_SERVICE,
+    SUBENTRY_TYPE_BUS_STOP,
+    SUBENTRY_TYPE_NEARBY_BUS_STOPS,
+    SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
 )
 from .coordinator import (
+    UNKNOWN_STATE,
     BusArrivalsUpdateCoordinator,
+    EntityState,
     SgBusArrivalsData,
     TrainServiceAlertsUpdateCoordinator,
 )
-from .models import BusArrival, NextBus, TrainServiceAlert
+from .models import (
+    AffectedSegment,
+    BusArrival,
+    NearbyBusStop,
+    NextBus,
+    TrainServiceAlert,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+BUS_SUBENTRY_TYPES: tuple[str, ...] = (
+    SUBENTRY_TYPE_BUS_SERVICE,
+    SUBENTRY_TYPE_BUS_STOP,
+    SUBENTRY_TYPE_NEARBY_BUS_STOPS,
+)
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -53,34 +85,117 @@ async def async_setup_entry(
         sg_bus_arrivals_data.train_service_alerts_coordinator
     )
 
-    # Fetch initial data so we have data when entities subscribe
-    await bus_arrival_coordinator.async_refresh()
+    # Fetch initial data so we have data when entities subscribe.
+    # With fast startup, entities restore their last state and the initial data
+    # is fetched in the background.
+    fast_startup: bool = config_entry.data.get(CONF_FAST_STARTUP, False)
+    coordinators: list[DataUpdateCoordinator[Any]] = [bus_arrival_coordinator]
     if train_service_alerts_coordinator is not None:
-        await train_service_alerts_coordinator.async_refresh()
+        coordinators.append(train_service_alerts_coordinator)
+    for coordinator in coordinators:
+        if fast_startup:
+            config_entry.async_create_background_task(
+                hass, coordinator.async_refresh(), f"{coordinator.name} initial refresh"
+            )
+        else:
+            await coordinator.async_refresh()
 
     bus_sensor_descriptions: list[SgBusArrivalsSensorDescription] = (
         _get_sensor_descriptions(sg_bus_arrivals)
     )
 
-    for subentry in config_entry.subentries.values():
+    compact_mode: bool = config_entry.data.get(CONF_COMPACT_MODE, False)
+    bus_service_sensor_class: type[BusServiceSensor] = (
+        RecordedBusServiceSensor
+        if config_entry.data.get(CONF_RECORD_ATTRIBUTES, False)
+        else BusServiceSensor
+    )
+
+    # unique ids of bus sensors, used to remove sensors of the other mode
+    bus_unique_ids: set[str] = set()
+
+    @callback
+    def _async_add_bus_entities(subentry: ConfigSubentry) -> None:
+        """Add the sensors of a bus service, bus stop or nearby bus stops subentry."""
         if subentry.subentry_type == SUBENTRY_TYPE_BUS_SERVICE:
-            bus_sensors: list[BusArrivalSensor] = [
-                BusArrivalSensor(
-                    bus_arrival_coordinator,
-                    subentry,
-                    sensor_description,
-                    subentry.data[SUBENTRY_CONF_BUS_STOP_CODE],
-                    subentry.data[SUBENTRY_CONF_DESCRIPTION],
-                    subentry.data[SUBENTRY_CONF_SERVICE_NO],
+            bus_sensors: list[
+                BusArrivalSensor | BusServiceSensor | ArrivalHistorySensor
+            ] = (
+                [
+                    bus_service_sensor_class(
+                        bus_arrival_coordinator,
+                        subentry,
+                        subentry.data[SUBENTRY_CONF_BUS_STOP_CODE],
+                        subentry.data[SUBENTRY_CONF_DESCRIPTION],
+                        subentry.data[SUBENTRY_CONF_SERVICE_NO],
+                    )
+                ]
+                if compact_mode
+                else [
+                    BusArrivalSensor(
+                        bus_arrival_coordinator,
+                        subentry,
+                        sensor_description,
+                        subentry.data[SUBENTRY_CONF_BUS_STOP_CODE],
+                        subentry.data[SUBENTRY_CONF_DESCRIPTION],
+                        subentry.data[SUBENTRY_CONF_SERVICE_NO],
+                    )
+                    for sensor_description in bus_sensor_descriptions
+                ]
+            )
+            if bus_arrival_coordinator.arrival_history is not None:
+                bus_sensors.extend(
+                    ArrivalHistorySensor(
+                        bus_arrival_coordinator,
+                        subentry,
+                        sensor_description,
+                        subentry.data[SUBENTRY_CONF_BUS_STOP_CODE],
+                        subentry.data[SUBENTRY_CONF_DESCRIPTION],
+                        subentry.data[SUBENTRY_CONF_SERVICE_NO],
+                    )
+                    for sensor_description in ARRIVAL_HISTORY_SENSOR_DESCRIPTIONS
                 )
-                for sensor_description in bus_sensor_descriptions
-            ]
+            bus_unique_ids.update(
+                bus_sensor.unique_id
+                for bus_sensor in bus_sensors
+                if bus_sensor.unique_id is not None
+            )
 
             async_add_entities(
-                bus_sensors, update_before_add=True, config_subentry_id=subentry.subentry_id
+                bus_sensors,
+                update_before_add=not fast_startup,
+                config_subentry_id=subentry.subentry_id,
             )
 
-        else:
+        elif subentry.subentry_type == SUBENTRY_TYPE_BUS_STOP:
+            async_add_entities(
+                [
+                    BusStopSensor(
+                        bus_arrival_coordinator,
+                        subentry,
+                        subentry.data[SUBENTRY_CONF_BUS_STOP_CODE],
+                        subentry.data[SUBENTRY_CONF_DESCRIPTION],
+                    )
+                ],
+                config_subentry_id=subentry.subentry_id,
+            )
+
+        elif subentry.subentry_type == SUBENTRY_TYPE_NEARBY_BUS_STOPS:
+            async_add_entities(
+                [
+                    NearbyBusStopSensor(bus_arrival_coordinator, subentry, rank)
+                    for rank in range(1, int(subentry.data[SUBENTRY_CONF_COUNT]) + 1)
+                ],
+                config_subentry_id=subentry.subentry_id,
+            )
+
+    # bus subentries added later are attached without reloading the config entry
+    sg_bus_arrivals_data.async_add_bus_entities = _async_add_bus_entities
+
+    for subentry in config_entry.subentries.values():
+        if subentry.subentry_type in BUS_SUBENTRY_TYPES:
+            _async_add_bus_entities(subentry)
+        elif subentry.subentry_type == SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS:
             assert train_service_alerts_coordinator is not None
             train_sensors: list[TrainServiceAlertSensor] = [
                 TrainServiceAlertSensor(
@@ -92,8 +207,83 @@ async def async_setup_entry(
             ]
 
             async_add_entities(
-                train_sensors, update_before_add=True, config_subentry_id=subentry.subentry_id
+                train_sensors,
+                update_before_add=not fast_startup,
+                config_subentry_id=subentry.subentry_id,
+            )
+
+    # the circuit breaker is always active, unlike the instrumentation
+    circuit_breaker_sensor: CircuitBreakerSensor = CircuitBreakerSensor(
+        bus_arrival_coordinator,
+        sg_bus_arrivals,
+        config_entry.entry_id,
+        CIRCUIT_BREAKER_SENSOR_DESCRIPTION,
+    )
+    assert circuit_breaker_sensor.unique_id is not None
+    bus_unique_ids.add(circuit_breaker_sensor.unique_id)
+    async_add_entities([circuit_breaker_sensor])
+
+    if config_entry.data.get(CONF_INSTRUMENTATION, False):
+        instrumentation_sensors: list[InstrumentationSensor] = [
+            InstrumentationSensor(
+                bus_arrival_coordinator,
+                sg_bus_arrivals,
+                config_entry.entry_id,
+                sensor_description,
             )
+            for sensor_description in INSTRUMENTATION_SENSOR_DESCRIPTIONS
+        ]
+        bus_unique_ids.update(
+            instrumentation_sensor.unique_id
+            for instrumentation_sensor in instrumentation_sensors
+            if instrumentation_sensor.unique_id is not None
+        )
+
+        async_add_entities(instrumentation_sensors)
+
+    _async_remove_stale_bus_sensors(hass, config_entry, bus_unique_ids)
+
+
+@callback
+def _async_remove_stale_bus_sensors(
+    hass: HomeAssistant, config_entry: SgBusArrivalsConfigEntry, unique_ids: set[str]
+) -> None:
+    """Remove sensors and devices left behind after switching options.
+
+    Covers the bus sensors after switching compact mode and the diagnostic sensors
+    of the config entry after turning off instrumentation.
+    """
+
+    bus_subentry_ids: set[str | None] = {
+        subentry.subentry_id
+        for subentry in config_entry.subentries.values()
+        if subentry.subentry_type == SUBENTRY_TYPE_BUS_SERVICE
+    }
+    # diagnostic sensors do not belong to a subentry
+    bus_subentry_ids.add(None)
+
+    entity_registry: er.EntityRegistry = er.async_get(hass)
+    for entity_entry in er.async_entries_for_config_entry(
+        entity_registry, config_entry.entry_id
+    ):
+        if (
+            entity_entry.config_subentry_id in bus_subentry_ids
+            and entity_entry.unique_id not in unique_ids
+        ):
+            _LOGGER.debug("Removing stale sensor: %s", entity_entry.entity_id)
+            entity_registry.async_remove(entity_entry.entity_id)
+
+    device_registry: dr.DeviceRegistry = dr.async_get(hass)
+    for device_entry in dr.async_entries_for_config_entry(
+        device_registry, config_entry.entry_id
+    ):
+        if not er.async_entries_for_device(
+            entity_registry, device_entry.id, include_disabled_entities=True
+        ) and any(
+            identifier[1] in bus_subentry_ids or identifier[1] == config_entry.entry_id
+            for identifier in device_entry.identifiers
+        ):
+            device_registry.async_remove_device(device_entry.id)
 
 
 # Coordinator is used to centralize the data updates
@@ -113,7 +303,131 @@ class TrainServiceAlertSensorDescription(SensorEntityDescription):
     """Describes the train service alert sensor entity."""
 
     line: str
-    value_fn: Callable[[str, dict[str, TrainServiceAlert]], str]
+    value_fn: Callable[[str, dict[str, TrainServiceAlert]], TrainServiceAlert | None]
+
+
+@dataclass(frozen=True, kw_only=True)
+class InstrumentationSensorDescription(SensorEntityDescription):
+    """Describes the instrumentation sensor entity."""
+
+    value_fn: Callable[[BusArrivalsUpdateCoordinator, SgBusArrivals], StateType]
+
+
+@dataclass(frozen=True, kw_only=True)
+class ArrivalHistorySensorDescription(SensorEntityDescription):
+    """Describes the arrival history sensor entity."""
+
+    value_fn: Callable[[ArrivalStatistics], float | None]
+
+
+ARRIVAL_HISTORY_SENSOR_DESCRIPTIONS: tuple[ArrivalHistorySensorDescription, ...] = (
+    ArrivalHistorySensorDescription(
+        key="headway",
+        native_unit_of_measurement=UnitOfTime.MINUTES,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda statistics: statistics.headway,
+        translation_key="headway",
+    ),
+    ArrivalHistorySensorDescription(
+        key="bunching",
+        native_unit_of_measurement=PERCENTAGE,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda statistics: statistics.bunching,
+        translation_key="bunching",
+    ),
+    ArrivalHistorySensorDescription(
+        key="prediction_error",
+        native_unit_of_measurement=UnitOfTime.MINUTES,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda statistics: statistics.prediction_error,
+        translation_key="prediction_error",
+    ),
+)
+
+
+def _get_average_latency(sg_bus_arrivals: SgBusArrivals) -> float | None:
+    statistics = sg_bus_arrivals.get_statistics().values()
+    requests: int = sum(endpoint.requests for endpoint in statistics)
+    if requests == 0:
+        return None
+    return round(
+        sum(endpoint.total_latency for endpoint in statistics) / requests * 1000, 1
+    )
+
+
+INSTRUMENTATION_SENSOR_DESCRIPTIONS: tuple[InstrumentationSensorDescription, ...] = (
+    InstrumentationSensorDescription(
+        key="api_requests",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda coordinator, sg_bus_arrivals: sum(
+            endpoint.requests for endpoint in sg_bus_arrivals.get_statistics().values()
+        ),
+        translation_key="api_requests",
+    ),
+    InstrumentationSensorDescription(
+        key="api_latency",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda coordinator, sg_bus_arrivals: _get_average_latency(
+            sg_bus_arrivals
+        ),
+        translation_key="api_latency",
+    ),
+    InstrumentationSensorDescription(
+        key="refresh_duration",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda coordinator, sg_bus_arrivals: round(
+            (
+                coordinator.statistics.last_fetch_duration
+                + coordinator.statistics.last_process_duration
+            )
+            * 1000,
+            1,
+        ),
+        translation_key="refresh_duration",
+    ),
+    InstrumentationSensorDescription(
+        key="fan_out_duration",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda coordinator, sg_bus_arrivals: round(
+            coordinator.statistics.last_fan_out_duration * 1000, 1
+        ),
+        translation_key="fan_out_duration",
+    ),
+    InstrumentationSensorDescription(
+        key="state_writes",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda coordinator, sg_bus_arrivals: (
+            coordinator.statistics.state_writes
+        ),
+        translation_key="state_writes",
+    ),
+)
+
+CIRCUIT_BREAKER_SENSOR_DESCRIPTION: InstrumentationSensorDescription = (
+    InstrumentationSensorDescription(
+        key="circuit_breaker",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        device_class=SensorDeviceClass.ENUM,
+        options=CIRCUIT_BREAKER_STATES,
+        value_fn=lambda coordinator, sg_bus_arrivals: (
+            sg_bus_arrivals.get_circuit_breaker_state()
+        ),
+        translation_key="circuit_breaker",
+    )
+)
 
 
 def _get_train_service_alerts_sensor_descriptions(
@@ -127,7 +441,7 @@ def _get_train_service_alerts_sensor_descriptions(
             line=line,
             device_class=SensorDeviceClass.ENUM,
             options=train_statuses,
-            value_fn=lambda line, alerts: alerts[line],
+            value_fn=lambda line, alerts: alerts.get(line),
             translation_key=f"train_service_alerts_{line}",
         )
         for line in lines
@@ -241,11 +555,15 @@ def _get_sensor_descriptions(
 
 
 class TrainServiceAlertSensor(
-    CoordinatorEntity[TrainServiceAlertsUpdateCoordinator], SensorEntity
+    CoordinatorEntity[TrainServiceAlertsUpdateCoordinator], RestoreSensor
 ):
-    """Sensor tracking train service alerts."""
+    """Sensor tracking train service alerts.
+
+    The last state is restored until the coordinator has data.
+    """
 
     _attr_has_entity_name = True
+    _restored_alert: TrainServiceAlert | None = None
 
     def __init__(
         self,
@@ -267,30 +585,226 @@ class TrainServiceAlertSensor(
             identifiers={(DOMAIN, subentry.subentry_id)},
         )
 
-    def _get_data(self):
+    async def async_added_to_hass(self) -> None:
+        """Restore the last state when added to hass."""
+        await super().async_added_to_hass()
+        if self.coordinator.data is not None:
+            return
+
+        last_sensor_data = await self.async_get_last_sensor_data()
+        last_state = await self.async_get_last_state()
+        if (
+            last_sensor_data is not None
+            and last_sensor_data.native_value is not None
+            and last_state is not None
+        ):
+            self._restored_alert = TrainServiceAlert(
+                str(last_sensor_data.native_value),
+                last_state.attributes.get("messages", []),
+                [
+                    AffectedSegment(**segment)
+                    for segment in last_state.attributes.get("affected_segments", [])
+                ],
+            )
+
+    @property
+    def available(self) -> bool:
+        """Return if entity is available."""
+        if self.coordinator.data is None:
+            return super().available and self._restored_alert is not None
+        return (
+            super().available and self.entity_description.line in self.coordinator.data
+        )
+
+    def _get_data(self) -> TrainServiceAlert | None:
+        if self.coordinator.data is None:
+            return self._restored_alert
         line: str = self.entity_description.line
         alerts: dict[str, TrainServiceAlert] = self.coordinator.data
         return self.entity_description.value_fn(line, alerts)
 
     @property
-    def extra_state_attributes(self) -> Mapping[str, Any]:
+    def extra_state_attributes(self) -> Mapping[str, Any] | None:
         """Return the extra state attributes."""
 
+        alert: TrainServiceAlert | None = self._get_data()
+        if alert is None:
+            return None
         attrs: Mapping[str, Any] = {}
-        attrs["messages"] = self._get_data().messages
+        attrs["messages"] = alert.messages
+        attrs["affected_segments"] = [
+            asdict(segment) for segment in alert.affected_segments
+        ]
         return attrs
 
     @property
-    def native_value(self) -> str:
+    def native_value(self) -> str | None:
         """Return the state of the entity."""
-        return self._get_data().status
+        alert: TrainServiceAlert | None = self._get_data()
+        return alert.status if alert is not None else None
 
 
-class BusArrivalSensor(CoordinatorEntity[BusArrivalsUpdateCoordinator], SensorEntity):
-    """Sensor tracking the number of minutes till bus arrival."""
+class InstrumentationSensor(
+    CoordinatorEntity[BusArrivalsUpdateCoordinator], SensorEntity
+):
+    """Diagnostic sensor tracking the performance of the integration.
+
+    The fan-out duration and state writes lag by a refresh, as this sensor is
+    updated during the fan-out.
+    """
 
     _attr_has_entity_name = True
 
+    def __init__(
+        self,
+        coordinator: BusArrivalsUpdateCoordinator,
+        sg_bus_arrivals: SgBusArrivals,
+        entry_id: str,
+        entity_description: InstrumentationSensorDescription,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self.entity_description = entity_description
+        self._sg_bus_arrivals = sg_bus_arrivals
+        self._attr_unique_id = f"instrumentation_{entity_description.key}"
+        self.entity_id = f"sensor.sgbusarrivals_{self._attr_unique_id}"
+
+        self._attr_device_info = DeviceInfo(
+            entry_type=DeviceEntryType.SERVICE,
+            translation_key="instrumentation",
+            identifiers={(DOMAIN, entry_id)},
+        )
+
+    @property
+    def native_value(self) -> StateType:
+        """Return the state of the entity."""
+        return self.entity_description.value_fn(self.coordinator, self._sg_bus_arrivals)
+
+
+class CircuitBreakerSensor(InstrumentationSensor):
+    """Diagnostic sensor tracking the circuit breakers of the API."""
+
+    def __init__(
+        self,
+        coordinator: BusArrivalsUpdateCoordinator,
+        sg_bus_arrivals: SgBusArrivals,
+        entry_id: str,
+        entity_description: InstrumentationSensorDescription,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, sg_bus_arrivals, entry_id, entity_description)
+        self._attr_unique_id = entity_description.key
+        self.entity_id = f"sensor.sgbusarrivals_{self._attr_unique_id}"
+
+        self._attr_device_info = DeviceInfo(
+            entry_type=DeviceEntryType.SERVICE,
+            translation_key="api",
+            identifiers={(DOMAIN, entry_id, "api")},
+        )
+
+
+def _get_bus_arrival(
+    data: dict[str, dict[str, BusArrival]], bus_stop_code: str, service_no: str
+) -> BusArrival:
+    """Get the bus arrival from the coordinator data.
+
+    Returns a bus arrival without next buses if there are no more arrivals.
+    """
+    bus_arrival: BusArrival | None = data.get(bus_stop_code, {}).get(service_no)
+    if bus_arrival is None:
+        return BusArrival(
+            bus_stop_code,
+            service_no,
+            "none",
+            [NextBus() for i in range(1, BUS_ARRIVALS_COUNT + 1)],
+        )
+    return bus_arrival
+
+
+class BusArrivalsEntity(CoordinatorEntity[BusArrivalsUpdateCoordinator], RestoreSensor):
+    """Base class for sensors with states precomputed by the coordinator.
+
+    The last state is restored until the coordinator has data.
+    """
+
+    _attr_has_entity_name = True
+    _written_state: tuple[bool, EntityState] | None = None
+    _restored_state: EntityState = UNKNOWN_STATE
+    # extra state attributes to restore
+    _restored_attributes: frozenset[str] = frozenset()
+
+    async def async_added_to_hass(self) -> None:
+        """Register the state function when added to hass."""
+        await super().async_added_to_hass()
+        assert self.unique_id is not None
+        self.async_on_remove(
+            self.coordinator.async_add_state_fn(self.unique_id, self._compute_state)
+        )
+        if self.coordinator.data is None:
+            await self._async_restore_state()
+        # the state is written when added to hass
+        self._written_state = (self.available, self._state)
+
+    @property
+    def available(self) -> bool:
+        """Return if entity is available.
+
+        The restored bus arrivals stay available while the first refreshes fail,
+        until all restored buses have arrived.
+        """
+        return super().available or self.coordinator.has_restored_arrivals
+
+    @abstractmethod
+    def _compute_state(self, data: dict[str, dict[str, BusArrival]]) -> EntityState:
+        """Compute the state from the coordinator data, once per refresh."""
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only if it changed since the last write."""
+        written_state: tuple[bool, EntityState] = (self.available, self._state)
+        if written_state != self._written_state:
+            self._written_state = written_state
+            if self.coordinator.instrumented:
+                self.coordinator.statistics.state_writes += 1
+            self.async_write_ha_state()
+
+    async def _async_restore_state(self) -> None:
+        """Restore the last state and extra state attributes."""
+        last_sensor_data = await self.async_get_last_sensor_data()
+        last_state = await self.async_get_last_state()
+        if last_sensor_data is None or last_state is None:
+            return
+
+        self._restored_state = EntityState(
+            last_sensor_data.native_value,
+            {
+                key: value
+                for key, value in last_state.attributes.items()
+                if key in self._restored_attributes
+            }
+            if self._restored_attributes
+            else None,
+        )
+
+    @property
+    def _state(self) -> EntityState:
+        assert self.unique_id is not None
+        return self.coordinator.states.get(self.unique_id, self._restored_state)
+
+    @property
+    def extra_state_attributes(self) -> Mapping[str, Any] | None:
+        """Return the extra state attributes."""
+        return self._state.extra_state_attributes
+
+    @property
+    def native_value(self) -> StateType:
+        """Return the state of the entity."""
+        return self._state.native_value
+
+
+class BusArrivalSensor(BusArrivalsEntity):
+    """Sensor tracking the number of minutes till bus arrival."""
+
     def __init__(
         self,
         coordinator: BusArrivalsUpdateCoordinator,
@@ -321,20 +835,278 @@ class BusArrivalSensor(CoordinatorEntity[BusArrivalsUpdateCoordinator], SensorEn
             },
         )
 
-    @property
-    def native_value(self) -> int:
-        """Return the state of the entity."""
-        bus_arrival: BusArrival = (
-            self.coordinator.data[self._bus_stop_code][self._service_no]
-            if self._bus_stop_code in self.coordinator.data
-            and self._service_no in self.coordinator.data[self._bus_stop_code]
-            else BusArrival(
-                self._bus_stop_code,
-                self._service_no,
-                "none",
-                [NextBus() for i in range(1, BUS_ARRIVALS_COUNT + 1)],
+    def _compute_state(self, data: dict[str, dict[str, BusArrival]]) -> EntityState:
+        bus_arrival: BusArrival = _get_bus_arrival(
+            data, self._bus_stop_code, self._service_no
+        )
+        return EntityState(
+            self.entity_description.value_fn(
+                self.entity_description.cardinality, bus_arrival
+            )
+        )
+
+
+class ArrivalHistorySensor(BusArrivalsEntity):
+    """Sensor tracking a statistic of the last arrivals of a bus service.
+
+    The statistics are computed from the arrival history of the coordinator, which
+    is updated on each poll of the bus stop.
+    """
+
+    def __init__(
+        self,
+        coordinator: BusArrivalsUpdateCoordinator,
+        subentry: ConfigSubentry,
+        entity_description: ArrivalHistorySensorDescription,
+        bus_stop_code: str,
+        description: str,
+        service_no: str,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self.entity_description = entity_description
+
+        self._attr_unique_id = f"{bus_stop_code}_{service_no}_{entity_description.key}"
+        self.entity_id = f"sensor.sgbusarrivals_{self._attr_unique_id}"
+        self._bus_stop_code = bus_stop_code
+        self._service_no = service_no
+
+        self._attr_device_info = DeviceInfo(
+            entry_type=DeviceEntryType.SERVICE,
+            translation_key="arrival_history",
+            translation_placeholders={
+                "service_no": service_no,
+                "description": description,
+            },
+            identifiers={(DOMAIN, subentry.subentry_id, "arrival_history")},
+        )
+
+    def _compute_state(self, data: dict[str, dict[str, BusArrival]]) -> EntityState:
+        assert self.coordinator.arrival_history is not None
+        return EntityState(
+            self.entity_description.value_fn(
+                self.coordinator.arrival_history.get_statistics(
+                    self._bus_stop_code, self._service_no
+                )
             )
         )
-        return self.entity_description.value_fn(
-            self.entity_description.cardinality, bus_arrival
+
+
+BUS_SERVICE_ATTRIBUTES: frozenset[str] = frozenset(
+    {"operator", "next_bus_estimated_arrivals"}
+    | {
+        f"next_bus_{i}_{attribute}"
+        for i in range(1, BUS_ARRIVALS_COUNT + 1)
+        for attribute in ("estimated_arrival", "bus_type", "feature", "load")
+    }
+)
+
+
+class BusServiceSensor(BusArrivalsEntity):
+    """Sensor tracking all arrivals of a bus service in a single entity.
+
+    Used in compact mode. The state is the next bus arrival in minutes and the
+    details of all arrivals are attributes, which are not recorded.
+    """
+
+    _attr_native_unit_of_measurement = UnitOfTime.MINUTES
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_translation_key = "next_bus_estimated_arrival"
+    _unrecorded_attributes = BUS_SERVICE_ATTRIBUTES
+    _restored_attributes = BUS_SERVICE_ATTRIBUTES
+
+    def __init__(
+        self,
+        coordinator: BusArrivalsUpdateCoordinator,
+        subentry: ConfigSubentry,
+        bus_stop_code: str,
+        description: str,
+        service_no: str,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+
+        self._attr_unique_id = f"{bus_stop_code}_{service_no}"
+        self.entity_id = f"sensor.sgbusarrivals_{self._attr_unique_id}"
+        self._bus_stop_code = bus_stop_code
+        self._service_no = service_no
+
+        self._attr_device_info = DeviceInfo(
+            entry_type=DeviceEntryType.SERVICE,
+            translation_key="next_bus_0",
+            translation_placeholders={
+                "service_no": service_no,
+                "description": description,
+            },
+            identifiers={(DOMAIN, subentry.subentry_id, 0)},
+        )
+
+    def _compute_state(self, data: dict[str, dict[str, BusArrival]]) -> EntityState:
+        bus_arrival: BusArrival = _get_bus_arrival(
+            data, self._bus_stop_code, self._service_no
+        )
+        attrs: dict[str, Any] = {
+            "operator": bus_arrival.operator,
+            "next_bus_estimated_arrivals": " / ".join(
+                [
+                    str(next_bus.estimated_arrival_minutes)
+                    if next_bus.estimated_arrival_minutes is not None
+                    else "-"
+                    for next_bus in bus_arrival.next_bus
+                ]
+            ),
+        }
+        for i, next_bus in enumerate(bus_arrival.next_bus, start=1):
+            attrs[f"next_bus_{i}_estimated_arrival"] = next_bus.estimated_arrival_minutes
+            attrs[f"next_bus_{i}_bus_type"] = next_bus.bus_type
+            attrs[f"next_bus_{i}_feature"] = next_bus.feature
+            attrs[f"next_bus_{i}_load"] = next_bus.load
+
+        return EntityState(bus_arrival.next_bus[0].estimated_arrival_minutes, attrs)
+
+
+class RecordedBusServiceSensor(BusServiceSensor):
+    """Compact mode sensor which also records the arrival details attributes."""
+
+    _unrecorded_attributes = frozenset()
+
+
+class BusStopSensor(BusArrivalsEntity):
+    """Sensor tracking the arrivals of all bus services at a bus stop.
+
+    The state is the next bus arrival in minutes across all bus services and the
+    bus services are sorted by their next arrival.
+    """
+
+    _attr_native_unit_of_measurement = UnitOfTime.MINUTES
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_translation_key = "next_bus_estimated_arrival"
+    _unrecorded_attributes = frozenset({"services"})
+    _restored_attributes = frozenset({"services"})
+
+    def __init__(
+        self,
+        coordinator: BusArrivalsUpdateCoordinator,
+        subentry: ConfigSubentry,
+        bus_stop_code: str,
+        description: str,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+
+        self._attr_unique_id = f"bus_stop_{bus_stop_code}"
+        self.entity_id = f"sensor.sgbusarrivals_{self._attr_unique_id}"
+        self._bus_stop_code = bus_stop_code
+
+        self._attr_device_info = DeviceInfo(
+            entry_type=DeviceEntryType.SERVICE,
+            translation_key="bus_stop",
+            translation_placeholders={
+                "bus_stop_code": bus_stop_code,
+                "description": description,
+            },
+            identifiers={(DOMAIN, subentry.subentry_id)},
+        )
+
+    def _compute_state(self, data: dict[str, dict[str, BusArrival]]) -> EntityState:
+        return _get_bus_stop_state(data, self._bus_stop_code)
+
+
+class NearbyBusStopSensor(BusArrivalsEntity):
+    """Sensor tracking the arrivals at a bus stop near a person or device.
+
+    The bus stop follows the tracker of the subentry, the state and the services
+    attribute are the same as those of a bus stop sensor.
+    """
+
+    _attr_native_unit_of_measurement = UnitOfTime.MINUTES
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_translation_key = "nearby_bus_stop"
+    _unrecorded_attributes = frozenset({"services", "distance"})
+    _restored_attributes = frozenset(
+        {"services", "bus_stop_code", "description", "road_name", "distance"}
+    )
+
+    def __init__(
+        self,
+        coordinator: BusArrivalsUpdateCoordinator,
+        subentry: ConfigSubentry,
+        rank: int,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+
+        tracker: str = subentry.data[SUBENTRY_CONF_TRACKER]
+        self._attr_unique_id = f"nearby_bus_stop_{subentry.subentry_id}_{rank}"
+        self.entity_id = (
+            f"sensor.sgbusarrivals_nearby_bus_stop_{tracker.split('.', 1)[1]}_{rank}"
         )
+        self._attr_translation_placeholders = {"rank": str(rank)}
+        self._subentry_id = subentry.subentry_id
+        self._rank = rank
+
+        self._attr_device_info = DeviceInfo(
+            entry_type=DeviceEntryType.SERVICE,
+            translation_key="nearby_bus_stops",
+            translation_placeholders={"title": subentry.title},
+            identifiers={(DOMAIN, subentry.subentry_id)},
+        )
+
+    def _compute_state(self, data: dict[str, dict[str, BusArrival]]) -> EntityState:
+        nearby_bus_stops: list[NearbyBusStop | None] = (
+            self.coordinator.nearby_bus_stops.get(self._subentry_id, [])
+        )
+        nearby_bus_stop: NearbyBusStop | None = (
+            nearby_bus_stops[self._rank - 1]
+            if self._rank <= len(nearby_bus_stops)
+            else None
+        )
+        if nearby_bus_stop is None:
+            return UNKNOWN_STATE
+
+        bus_stop_state: EntityState = _get_bus_stop_state(
+            data, nearby_bus_stop.bus_stop.bus_stop_code
+        )
+        assert bus_stop_state.extra_state_attributes is not None
+        return EntityState(
+            bus_stop_state.native_value,
+            {
+                "bus_stop_code": nearby_bus_stop.bus_stop.bus_stop_code,
+                "description": nearby_bus_stop.bus_stop.description,
+                "road_name": nearby_bus_stop.bus_stop.road_name,
+                "distance": round(nearby_bus_stop.distance),
+                **bus_stop_state.extra_state_attributes,
+            },
+        )
+
+
+def _get_bus_stop_state(
+    data: dict[str, dict[str, BusArrival]], bus_stop_code: str
+) -> EntityState:
+    """Get the next bus arrival at a bus stop and all its bus services.
+
+    The bus services are sorted by their next arrival.
+    """
+    bus_arrivals: list[BusArrival] = sorted(
+        data.get(bus_stop_code, {}).values(),
+        key=lambda bus_arrival: (
+            bus_arrival.next_bus[0].estimated_arrival_minutes is None,
+            bus_arrival.next_bus[0].estimated_arrival_minutes or 0,
+        ),
+    )
+    return EntityState(
+        bus_arrivals[0].next_bus[0].estimated_arrival_minutes if bus_arrivals else None,
+        {
+            "services": [
+                {
+                    "service_no": bus_arrival.service_no,
+                    "operator": bus_arrival.operator,
+                    "next_bus": [asdict(next_bus) for next_bus in bus_arrival.next_bus],
+                }
+                for bus_arrival in bus_arrivals
+            ]
+        },
+    )
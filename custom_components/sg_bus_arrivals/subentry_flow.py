@@ -1,6 +1,7 @@
 """Options flow for the SG Bus Arrivals integration. Handle adding of new bus stop code."""
 
 import logging
+import re
 from types import MappingProxyType
 from typing import Any
 
@@ -11,19 +12,37 @@ from homeassistant.config_entries import (
     ConfigSubentryFlow,
     SubentryFlowResult,
 )
+from homeassistant.core import State
 from homeassistant.helpers.selector import (
+    EntitySelector,
+    EntitySelectorConfig,
+    NumberSelector,
+    NumberSelectorConfig,
+    NumberSelectorMode,
+    SelectOptionDict,
     SelectSelector,
     SelectSelectorConfig,
     SelectSelectorMode,
+    TextSelector,
+    TextSelectorConfig,
 )
 
 from .api import SgBusArrivals
+from .bus_stop_index import BusStopSpatialIndex, BusStopTextIndex
 from .const import (
+    SUBENTRY_CONF_BUS_SERVICES,
     SUBENTRY_CONF_BUS_STOP_CODE,
+    SUBENTRY_CONF_COUNT,
     SUBENTRY_CONF_DESCRIPTION,
+    SUBENTRY_CONF_MINUTES,
+    SUBENTRY_CONF_NEARBY_DISTANCE,
     SUBENTRY_CONF_ROAD_NAME,
+    SUBENTRY_CONF_SEARCH,
     SUBENTRY_CONF_SERVICE_NO,
+    SUBENTRY_CONF_TRACKER,
     SUBENTRY_TYPE_BUS_SERVICE,
+    SUBENTRY_TYPE_BUS_STOP,
+    SUBENTRY_TYPE_NEARBY_BUS_STOPS,
     SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
 )
 from .coordinator import (
@@ -39,6 +58,125 @@ STEP_USER_DATA_SCHEMA: vol.Schema = vol.Schema(
     {vol.Required(SUBENTRY_CONF_BUS_STOP_CODE): str}
 )
 
+# either a bus stop code, a search or a distance from home to find nearby bus stops
+STEP_BUS_SERVICE_DATA_SCHEMA: vol.Schema = vol.Schema(
+    {
+        vol.Optional(SUBENTRY_CONF_BUS_STOP_CODE): str,
+        vol.Optional(SUBENTRY_CONF_SEARCH): str,
+        vol.Optional(SUBENTRY_CONF_NEARBY_DISTANCE): NumberSelector(
+            NumberSelectorConfig(
+                min=50,
+                max=2000,
+                step=50,
+                unit_of_measurement="m",
+                mode=NumberSelectorMode.BOX,
+            )
+        ),
+    }
+)
+
+STEP_NEARBY_BUS_STOPS_DATA_SCHEMA: vol.Schema = vol.Schema(
+    {
+        vol.Required(SUBENTRY_CONF_TRACKER): EntitySelector(
+            EntitySelectorConfig(domain=["person", "device_tracker"])
+        ),
+        vol.Required(SUBENTRY_CONF_COUNT, default=3): NumberSelector(
+            NumberSelectorConfig(min=1, max=10, step=1, mode=NumberSelectorMode.BOX)
+        ),
+    }
+)
+
+STEP_APPROACHING_BUS_DATA_SCHEMA: vol.Schema = vol.Schema(
+    {
+        vol.Required(SUBENTRY_CONF_BUS_STOP_CODE): str,
+        vol.Required(SUBENTRY_CONF_SERVICE_NO): str,
+        vol.Required(SUBENTRY_CONF_MINUTES, default=3): NumberSelector(
+            NumberSelectorConfig(
+                min=1,
+                max=30,
+                step=1,
+                unit_of_measurement="min",
+                mode=NumberSelectorMode.BOX,
+            )
+        ),
+    }
+)
+
+STEP_BULK_DATA_SCHEMA: vol.Schema = vol.Schema(
+    {
+        vol.Required(SUBENTRY_CONF_BUS_SERVICES): TextSelector(
+            TextSelectorConfig(multiline=True)
+        )
+    }
+)
+
+# bus stop code and service numbers are separated by commas, colons or spaces
+BUS_SERVICES_SEPARATOR: re.Pattern[str] = re.compile(r"[\s,;:]+")
+
+NEARBY_BUS_STOPS_LIMIT = 20
+SEARCH_RESULTS_LIMIT = 20
+
+
+async def _async_validate_bus_stop(
+    config_entry: SgBusArrivalsConfigEntry,
+    bus_stop_code: str,
+    errors: dict[str, str],
+) -> BusStop | None:
+    """Validate the bus stop code by looking up the bus stop."""
+    sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+    sg_bus_arrivals: SgBusArrivals = sg_bus_arrivals_data.api
+    bus_stop: BusStop | None = await sg_bus_arrivals.get_bus_stop(bus_stop_code)
+
+    if bus_stop is None:
+        errors["base"] = "invalid_bus_stop_code"
+
+    return bus_stop
+
+
+def _get_bus_stop_schema(options: list[SelectOptionDict]) -> vol.Schema:
+    """Return the schema to choose 1 of the bus stops."""
+    return vol.Schema(
+        {
+            vol.Required(SUBENTRY_CONF_BUS_STOP_CODE): SelectSelector(
+                SelectSelectorConfig(options=options, mode=SelectSelectorMode.LIST)
+            )
+        }
+    )
+
+
+def _create_bus_service_subentry(
+    bus_stop_code: str, description: str, service_no: str
+) -> ConfigSubentry:
+    """Create the subentry of a bus service at a bus stop."""
+    return ConfigSubentry(
+        data=MappingProxyType(
+            {
+                SUBENTRY_CONF_SERVICE_NO: service_no,
+                SUBENTRY_CONF_BUS_STOP_CODE: bus_stop_code,
+                SUBENTRY_CONF_DESCRIPTION: description,
+            }
+        ),
+        subentry_type=SUBENTRY_TYPE_BUS_SERVICE,
+        title=f"{service_no} @{description}",
+        unique_id=f"{bus_stop_code}_{service_no}",
+    )
+
+
+def _parse_bus_services(text: str) -> dict[str, list[str]]:
+    """Parse 1 bus stop per line, followed by optional bus service numbers.
+
+    A bus stop without bus service numbers includes all its bus services,
+    e.g. "83139, 15, 150" or "83139: 15 150" or "83139".
+    """
+    bus_services: dict[str, list[str]] = {}
+    for line in text.splitlines():
+        tokens: list[str] = [
+            token for token in BUS_SERVICES_SEPARATOR.split(line) if token
+        ]
+        if tokens:
+            bus_services.setdefault(tokens[0], []).extend(tokens[1:])
+    return bus_services
+
 
 class TrainServiceAlertsSubEntryFlowHandler(ConfigSubentryFlow):
     """Handles subentry flow for creating train service alerts."""
@@ -59,12 +197,135 @@ class TrainServiceAlertsSubEntryFlowHandler(ConfigSubentryFlow):
         )
 
 
+class BusStopSubEntryFlowHandler(ConfigSubentryFlow):
+    """Handles subentry flow for creating a sensor for all bus services at a bus stop."""
+
+    async def async_step_user(
+        self, user_input: dict[str, Any] | None = None
+    ) -> SubentryFlowResult:
+        """Prompt user for bus stop code."""
+        errors: dict[str, str] = {}
+        if user_input is not None:
+            bus_stop_code: str = user_input[SUBENTRY_CONF_BUS_STOP_CODE]
+            config_entry: SgBusArrivalsConfigEntry = self._get_entry()
+            for existing_subentry in config_entry.subentries.values():
+                if existing_subentry.subentry_type == SUBENTRY_TYPE_BUS_STOP and (
+                    existing_subentry.data[SUBENTRY_CONF_BUS_STOP_CODE] == bus_stop_code
+                ):
+                    return self.async_abort(reason="already_configured")
+
+            bus_stop: BusStop | None = await _async_validate_bus_stop(
+                config_entry, bus_stop_code, errors
+            )
+
+            if not errors:
+                assert bus_stop is not None
+                return self.async_create_entry(
+                    title=f"{bus_stop.description} ({bus_stop.bus_stop_code})",
+                    data={
+                        SUBENTRY_CONF_BUS_STOP_CODE: bus_stop.bus_stop_code,
+                        SUBENTRY_CONF_ROAD_NAME: bus_stop.road_name,
+                        SUBENTRY_CONF_DESCRIPTION: bus_stop.description,
+                    },
+                    unique_id=f"{SUBENTRY_TYPE_BUS_STOP}_{bus_stop.bus_stop_code}",
+                )
+
+        return self.async_show_form(
+            step_id="user", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
+        )
+
+
+class NearbyBusStopsSubEntryFlowHandler(ConfigSubentryFlow):
+    """Handles subentry flow for following the bus stops nearest to a tracker."""
+
+    async def async_step_user(
+        self, user_input: dict[str, Any] | None = None
+    ) -> SubentryFlowResult:
+        """Prompt user for the person or device tracker and number of bus stops."""
+        if user_input is not None:
+            tracker: str = user_input[SUBENTRY_CONF_TRACKER]
+            config_entry: SgBusArrivalsConfigEntry = self._get_entry()
+            for existing_subentry in config_entry.subentries.values():
+                if existing_subentry.unique_id == f"nearby_{tracker}":
+                    return self.async_abort(reason="already_configured")
+
+            state: State | None = self.hass.states.get(tracker)
+            return self.async_create_entry(
+                title=f"Bus stops near {state.name if state is not None else tracker}",
+                data={
+                    SUBENTRY_CONF_TRACKER: tracker,
+                    SUBENTRY_CONF_COUNT: int(user_input[SUBENTRY_CONF_COUNT]),
+                },
+                unique_id=f"nearby_{tracker}",
+            )
+
+        return self.async_show_form(
+            step_id="user", data_schema=STEP_NEARBY_BUS_STOPS_DATA_SCHEMA
+        )
+
+
+class ApproachingBusSubEntryFlowHandler(ConfigSubentryFlow):
+    """Handles subentry flow for firing an event when a bus is approaching.
+
+    The bus stop and bus service are validated against the cached bus stops and
+    bus services. No entities are added.
+    """
+
+    async def async_step_user(
+        self, user_input: dict[str, Any] | None = None
+    ) -> SubentryFlowResult:
+        """Prompt user for the bus stop, bus service and threshold."""
+        errors: dict[str, str] = {}
+        if user_input is not None:
+            bus_stop_code: str = user_input[SUBENTRY_CONF_BUS_STOP_CODE]
+            service_no: str = user_input[SUBENTRY_CONF_SERVICE_NO]
+            minutes: int = int(user_input[SUBENTRY_CONF_MINUTES])
+            config_entry: SgBusArrivalsConfigEntry = self._get_entry()
+            unique_id: str = f"approaching_{bus_stop_code}_{service_no}_{minutes}"
+            for existing_subentry in config_entry.subentries.values():
+                if existing_subentry.unique_id == unique_id:
+                    return self.async_abort(reason="already_configured")
+
+            sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+            coordinator: BusArrivalsUpdateCoordinator = (
+                sg_bus_arrivals_data.bus_arrivals_coordinator
+            )
+            bus_stop: BusStop | None = (await coordinator.get_all_bus_stops()).get(
+                bus_stop_code
+            )
+            if bus_stop is None:
+                errors["base"] = "invalid_bus_stop_code"
+            elif service_no not in await coordinator.get_bus_services(bus_stop_code):
+                errors["base"] = "invalid_service_no"
+            else:
+                return self.async_create_entry(
+                    title=f"{service_no} @{bus_stop.description} within {minutes} min",
+                    data={
+                        SUBENTRY_CONF_BUS_STOP_CODE: bus_stop_code,
+                        SUBENTRY_CONF_SERVICE_NO: service_no,
+                        SUBENTRY_CONF_DESCRIPTION: bus_stop.description,
+                        SUBENTRY_CONF_MINUTES: minutes,
+                    },
+                    unique_id=unique_id,
+                )
+
+        return self.async_show_form(
+            step_id="user",
+            data_schema=self.add_suggested_values_to_schema(
+                STEP_APPROACHING_BUS_DATA_SCHEMA, user_input
+            ),
+            errors=errors,
+        )
+
+
 class BusServiceSubEntryFlowHandler(ConfigSubentryFlow):
     """Handles subentry flow for creating new bus stops."""
 
     bus_stop_code: str
     road_name: str
     description: str
+    nearby_distance: float
+    matching_bus_stops: list[BusStop]
     new: bool = True
 
     async def _validate_bus_stop(
@@ -76,15 +337,7 @@ class BusServiceSubEntryFlowHandler(ConfigSubentryFlow):
 
         Data has the keys from STEP_USER_DATA_SCHEMA with values provided by the user.
         """
-        config_entry: SgBusArrivalsConfigEntry = self._get_entry()
-        sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
-        sg_bus_arrivals: SgBusArrivals = sg_bus_arrivals_data.api
-        bus_stop: BusStop | None = await sg_bus_arrivals.get_bus_stop(data)
-
-        if bus_stop is None:
-            errors["base"] = "invalid_bus_stop_code"
-
-        return bus_stop
+        return await _async_validate_bus_stop(self._get_entry(), data, errors)
 
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
@@ -92,21 +345,119 @@ class BusServiceSubEntryFlowHandler(ConfigSubentryFlow):
         """Prompt user for bus stop code."""
         errors: dict[str, str] = {}
         if user_input is not None:
-            bus_stop: BusStop | None = await self._validate_bus_stop(
-                user_input[SUBENTRY_CONF_BUS_STOP_CODE], errors
-            )
-            _LOGGER.debug("validate_bus_stop, bus_stop: %s", bus_stop)
+            if SUBENTRY_CONF_BUS_STOP_CODE in user_input:
+                bus_stop: BusStop | None = await self._validate_bus_stop(
+                    user_input[SUBENTRY_CONF_BUS_STOP_CODE], errors
+                )
+                _LOGGER.debug("validate_bus_stop, bus_stop: %s", bus_stop)
 
-            if not errors:
-                assert bus_stop is not None
-                self.bus_stop_code = bus_stop.bus_stop_code
-                self.road_name = bus_stop.road_name
-                self.description = bus_stop.description
-                return await self.async_step_service_no(user_input)
+                if not errors:
+                    assert bus_stop is not None
+                    self._set_bus_stop(bus_stop)
+                    return await self.async_step_service_no(user_input)
+            elif SUBENTRY_CONF_SEARCH in user_input:
+                text_index: BusStopTextIndex = (
+                    await self._get_coordinator().get_bus_stop_text_index()
+                )
+                self.matching_bus_stops = text_index.search(
+                    user_input[SUBENTRY_CONF_SEARCH], SEARCH_RESULTS_LIMIT
+                )
+                if self.matching_bus_stops:
+                    return await self.async_step_search()
+                errors["base"] = "no_matching_bus_stops"
+            elif SUBENTRY_CONF_NEARBY_DISTANCE in user_input:
+                self.nearby_distance = user_input[SUBENTRY_CONF_NEARBY_DISTANCE]
+                return await self.async_step_nearby()
+            else:
+                errors["base"] = "no_bus_stop"
 
         return self.async_show_form(
-            step_id="user", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
+            step_id="user",
+            data_schema=self.add_suggested_values_to_schema(
+                STEP_BUS_SERVICE_DATA_SCHEMA, user_input
+            ),
+            errors=errors,
+        )
+
+    async def async_step_search(
+        self, user_input: dict[str, Any] | None = None
+    ) -> SubentryFlowResult:
+        """Prompt user for one of the bus stops matching the search."""
+        if user_input is not None:
+            return await self._async_select_bus_stop(user_input)
+
+        return self.async_show_form(
+            step_id="search",
+            data_schema=_get_bus_stop_schema(
+                [
+                    SelectOptionDict(
+                        value=bus_stop.bus_stop_code,
+                        label=f"{bus_stop.description}, {bus_stop.road_name}"
+                        f" ({bus_stop.bus_stop_code})",
+                    )
+                    for bus_stop in self.matching_bus_stops
+                ]
+            ),
+        )
+
+    async def async_step_nearby(
+        self, user_input: dict[str, Any] | None = None
+    ) -> SubentryFlowResult:
+        """Prompt user for one of the bus stops nearest to home."""
+        if user_input is not None:
+            return await self._async_select_bus_stop(user_input)
+
+        spatial_index: BusStopSpatialIndex = (
+            await self._get_coordinator().get_bus_stop_spatial_index()
+        )
+        nearby_bus_stops: list[tuple[float, BusStop]] = spatial_index.search(
+            self.hass.config.latitude,
+            self.hass.config.longitude,
+            self.nearby_distance,
+            NEARBY_BUS_STOPS_LIMIT,
+        )
+        if not nearby_bus_stops:
+            return self.async_abort(
+                reason="no_nearby_bus_stops",
+                description_placeholders={
+                    SUBENTRY_CONF_NEARBY_DISTANCE: f"{self.nearby_distance:.0f}"
+                },
+            )
+
+        return self.async_show_form(
+            step_id="nearby",
+            data_schema=_get_bus_stop_schema(
+                [
+                    SelectOptionDict(
+                        value=bus_stop.bus_stop_code,
+                        label=f"{bus_stop.description}, {bus_stop.road_name}"
+                        f" ({bus_stop.bus_stop_code}) - {distance:.0f} m",
+                    )
+                    for distance, bus_stop in nearby_bus_stops
+                ]
+            ),
+        )
+
+    async def _async_select_bus_stop(
+        self, user_input: dict[str, Any]
+    ) -> SubentryFlowResult:
+        """Continue with the bus stop chosen from the cached bus stops."""
+        all_bus_stops: dict[str, BusStop] = (
+            await self._get_coordinator().get_all_bus_stops()
         )
+        self._set_bus_stop(all_bus_stops[user_input[SUBENTRY_CONF_BUS_STOP_CODE]])
+        return await self.async_step_service_no({})
+
+    def _get_coordinator(self) -> BusArrivalsUpdateCoordinator:
+        """Return the bus arrivals coordinator of the config entry."""
+        sg_bus_arrivals_data: SgBusArrivalsData = self._get_entry().runtime_data
+        return sg_bus_arrivals_data.bus_arrivals_coordinator
+
+    def _set_bus_stop(self, bus_stop: BusStop) -> None:
+        """Set the bus stop to add bus services for."""
+        self.bus_stop_code = bus_stop.bus_stop_code
+        self.road_name = bus_stop.road_name
+        self.description = bus_stop.description
 
     async def async_step_service_no(
         self, user_input: dict[str, Any]
@@ -141,17 +492,8 @@ class BusServiceSubEntryFlowHandler(ConfigSubentryFlow):
             for service_no in user_input[SUBENTRY_CONF_SERVICE_NO]:
                 self.hass.config_entries.async_add_subentry(
                     config_entry,
-                    ConfigSubentry(
-                        data=MappingProxyType(
-                            {
-                                SUBENTRY_CONF_SERVICE_NO: service_no,
-                                SUBENTRY_CONF_BUS_STOP_CODE: self.bus_stop_code,
-                                SUBENTRY_CONF_DESCRIPTION: self.description,
-                            }
-                        ),
-                        subentry_type=SUBENTRY_TYPE_BUS_SERVICE,
-                        title=f"{service_no} @{self.description}",
-                        unique_id=f"{self.bus_stop_code}_{service_no}",
+                    _create_bus_service_subentry(
+                        self.bus_stop_code, self.description, service_no
                     ),
                 )
 
@@ -185,3 +527,82 @@ class BusServiceSubEntryFlowHandler(ConfigSubentryFlow):
             },
             errors=errors,
         )
+
+
+class BulkBusServicesSubEntryFlowHandler(ConfigSubentryFlow):
+    """Handles subentry flow for adding many bus services across bus stops.
+
+    All bus stops and bus services are validated against the cached bus stops and
+    bus services before any subentry is added. The sensors of each subentry are
+    added to the loaded config entry without a reload.
+    """
+
+    async def async_step_user(
+        self, user_input: dict[str, Any] | None = None
+    ) -> SubentryFlowResult:
+        """Prompt user for the bus stops and bus services."""
+        errors: dict[str, str] = {}
+        description_placeholders: dict[str, str] = {"invalid": ""}
+        if user_input is not None:
+            config_entry: SgBusArrivalsConfigEntry = self._get_entry()
+            sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+            coordinator: BusArrivalsUpdateCoordinator = (
+                sg_bus_arrivals_data.bus_arrivals_coordinator
+            )
+            all_bus_stops: dict[str, BusStop] = await coordinator.get_all_bus_stops()
+
+            invalid: list[str] = []
+            new_subentries: dict[str, ConfigSubentry] = {}
+            existing_unique_ids: set[str | None] = {
+                existing_subentry.unique_id
+                for existing_subentry in config_entry.subentries.values()
+            }
+            for bus_stop_code, service_nos in _parse_bus_services(
+                user_input[SUBENTRY_CONF_BUS_SERVICES]
+            ).items():
+                bus_stop: BusStop | None = all_bus_stops.get(bus_stop_code)
+                if bus_stop is None:
+                    invalid.append(bus_stop_code)
+                    continue
+
+                bus_services: set[str] = await coordinator.get_bus_services(
+                    bus_stop_code
+                )
+                for service_no in service_nos or sorted(bus_services):
+                    if service_no not in bus_services:
+                        invalid.append(f"{service_no} @{bus_stop_code}")
+                        continue
+
+                    subentry: ConfigSubentry = _create_bus_service_subentry(
+                        bus_stop_code, bus_stop.description, service_no
+                    )
+                    if subentry.unique_id not in existing_unique_ids:
+                        existing_unique_ids.add(subentry.unique_id)
+                        new_subentries[subentry.subentry_id] = subentry
+
+            if invalid:
+                errors["base"] = "invalid_bus_services"
+                description_placeholders["invalid"] = ", ".join(invalid)
+            elif not new_subentries:
+                return self.async_abort(reason="already_configured")
+            else:
+                # each subentry attaches its sensors to the loaded config entry
+                for subentry in new_subentries.values():
+                    self.hass.config_entries.async_add_subentry(config_entry, subentry)
+                return self.async_abort(
+                    reason="subentries_created",
+                    description_placeholders={
+                        "service_nos": ", ".join(
+                            subentry.title for subentry in new_subentries.values()
+                        ),
+                    },
+                )
+
+        return self.async_show_form(
+            step_id="user",
+            data_schema=self.add_suggested_values_to_schema(
+                STEP_BULK_DATA_SCHEMA, user_input
+            ),
+            description_placeholders=description_placeholders,
+            errors=errors,
+        )
@@ -0,0 +1,159 @@
+"""WebSocket API for dashboard cards of the SG Bus Arrivals integration."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from aiohttp import ClientError
+import voluptuous as vol
+
+from homeassistant.components import websocket_api
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+
+from .api import ApiGeneralError
+from .const import DOMAIN, SUBENTRY_CONF_BUS_STOP_CODE
+from .coordinator import BusArrivalsUpdateCoordinator, SgBusArrivalsConfigEntry
+from .models import BusArrival, BusStop
+
+
+@callback
+def async_setup(hass: HomeAssistant) -> None:
+    """Register the websocket commands."""
+    websocket_api.async_register_command(hass, websocket_subscribe)
+
+
+def _get_services_payload(
+    bus_arrivals: dict[str, BusArrival] | None,
+) -> dict[str, dict[str, Any]]:
+    """Return the compact payload of the bus services at a bus stop."""
+    return {
+        service_no: {
+            "operator": bus_arrival.operator,
+            "next_bus": [
+                {
+                    "minutes": next_bus.estimated_arrival_minutes,
+                    "arrival": next_bus.estimated_arrival.isoformat()
+                    if next_bus.estimated_arrival is not None
+                    else None,
+                    "type": next_bus.bus_type,
+                    "feature": next_bus.feature,
+                    "load": next_bus.load,
+                }
+                for next_bus in bus_arrival.next_bus
+            ],
+        }
+        for service_no, bus_arrival in (bus_arrivals or {}).items()
+    }
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): f"{DOMAIN}/subscribe",
+        vol.Required(SUBENTRY_CONF_BUS_STOP_CODE): str,
+    }
+)
+@websocket_api.async_response
+async def websocket_subscribe(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Subscribe to the bus arrivals of a bus stop.
+
+    Sends a snapshot of all bus services at the bus stop, then only the changed
+    and removed bus services, once after each refresh which changes them. The bus
+    stop is polled while subscribed. The subscription ends with an error when the
+    config entry is unloaded, e.g. reloaded, and must be subscribed again.
+    """
+    config_entries: list[SgBusArrivalsConfigEntry] = (
+        hass.config_entries.async_loaded_entries(DOMAIN)
+    )
+    if not config_entries:
+        connection.send_error(
+            msg["id"], websocket_api.ERR_NOT_FOUND, "SG Bus Arrivals is not loaded"
+        )
+        return
+
+    config_entry: SgBusArrivalsConfigEntry = config_entries[0]
+    coordinator: BusArrivalsUpdateCoordinator = (
+        config_entry.runtime_data.bus_arrivals_coordinator
+    )
+    bus_stop_code: str = msg[SUBENTRY_CONF_BUS_STOP_CODE]
+    try:
+        all_bus_stops: dict[str, BusStop] = await coordinator.get_all_bus_stops()
+    except (ApiGeneralError, ClientError, TimeoutError) as err:
+        connection.send_error(
+            msg["id"],
+            websocket_api.ERR_HOME_ASSISTANT_ERROR,
+            f"Bus stops not available: {err}",
+        )
+        return
+    if bus_stop_code not in all_bus_stops:
+        connection.send_error(
+            msg["id"],
+            websocket_api.ERR_NOT_FOUND,
+            f"Invalid bus stop code: {bus_stop_code}",
+        )
+        return
+
+    services: dict[str, dict[str, Any]] = _get_services_payload(
+        (coordinator.data or {}).get(bus_stop_code)
+    )
+
+    @callback
+    def _async_bus_arrivals_updated() -> None:
+        """Send the bus services which changed since the last message."""
+        nonlocal services
+        updated_services: dict[str, dict[str, Any]] = _get_services_payload(
+            (coordinator.data or {}).get(bus_stop_code)
+        )
+        changed: dict[str, dict[str, Any]] = {
+            service_no: service
+            for service_no, service in updated_services.items()
+            if services.get(service_no) != service
+        }
+        removed: list[str] = [
+            service_no for service_no in services if service_no not in updated_services
+        ]
+        services = updated_services
+        if changed or removed:
+            connection.send_message(
+                websocket_api.event_message(
+                    msg["id"], {"changed": changed, "removed": removed}
+                )
+            )
+
+    unsubscribe_bus_stop: CALLBACK_TYPE | None = coordinator.async_subscribe_bus_stop(
+        bus_stop_code, _async_bus_arrivals_updated
+    )
+
+    @callback
+    def _async_unsubscribe() -> None:
+        """Stop polling the bus stop, once."""
+        nonlocal unsubscribe_bus_stop
+        if unsubscribe_bus_stop is not None:
+            unsubscribe_bus_stop()
+            unsubscribe_bus_stop = None
+
+    @callback
+    def _async_config_entry_unloaded() -> None:
+        """End the subscription, the coordinator is shut down."""
+        if unsubscribe_bus_stop is None:
+            return
+        _async_unsubscribe()
+        connection.subscriptions.pop(msg["id"], None)
+        connection.send_error(
+            msg["id"],
+            websocket_api.ERR_NOT_FOUND,
+            "SG Bus Arrivals was unloaded, subscribe again",
+        )
+
+    config_entry.async_on_unload(_async_config_entry_unloaded)
+    connection.subscriptions[msg["id"]] = _async_unsubscribe
+    connection.send_result(msg["id"])
+    connection.send_message(
+        websocket_api.event_message(
+            msg["id"],
+            {SUBENTRY_CONF_BUS_STOP_CODE: bus_stop_code, "services": services},
+        )
+    )
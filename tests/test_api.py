@@ -1,17 +1,35 @@
 """Tests for SgBusArrivals."""
 
+import asyncio
+from datetime import UTC, datetime, timedelta
 import json
+import ssl
 from typing import Any
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import aiofiles
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from anyio import Path
 from custom_components.sg_bus_arrivals.api import (
     ApiAuthenticationError,
+    ApiCircuitOpenError,
     ApiGeneralError,
     SgBusArrivals,
+    compute_arrival_minutes,
+    create_dedicated_session,
+    is_operating,
+)
+from custom_components.sg_bus_arrivals.models import (
+    AffectedSegment,
+    BusArrival,
+    BusStop,
+    ConnectionStatistics,
+    EndpointStatistics,
+    OperatingHours,
+    RateLimitEvent,
+    TrainServiceAlert,
 )
-from custom_components.sg_bus_arrivals.models import BusArrival, TrainServiceAlert
 import pytest
 
 
@@ -30,12 +48,20 @@ def mock_session():
         yield session
 
 
+def create_mock_response() -> AsyncMock:
+    """Mock aiohttp ClientResponse with an uncompressed, empty body."""
+    response = AsyncMock()
+    response.content_length = None
+    response.read.return_value = b""
+    return response
+
+
 async def test_authenticate_success(
     mock_session: MagicMock, service: SgBusArrivals
 ) -> None:
     """Test successful authentication."""
 
-    mock_response = AsyncMock()
+    mock_response = create_mock_response()
     mock_response.status = 200
     mock_session.get.return_value.__aenter__.return_value = mock_response
 
@@ -49,7 +75,7 @@ async def test_authenticate_failed(
 ) -> None:
     """Test successful authentication."""
 
-    mock_response = AsyncMock()
+    mock_response = create_mock_response()
     mock_response.status = 401
     mock_session.get.return_value.__aenter__.return_value = mock_response
 
@@ -64,7 +90,7 @@ async def test_authenticate_error(
 ) -> None:
     """Test successful authentication."""
 
-    mock_response = AsyncMock()
+    mock_response = create_mock_response()
     mock_response.status = 500
     mock_session.get.return_value.__aenter__.return_value = mock_response
 
@@ -82,7 +108,7 @@ async def test_get_bus_stop(mock_session: MagicMock, service: SgBusArrivals) ->
 
     json: str = await load_file("tests/fixtures/bus_stops.json")
 
-    mock_response = AsyncMock()
+    mock_response = create_mock_response()
     mock_response.status = 200
     mock_response.json.return_value = json
     mock_session.get.return_value.__aenter__.return_value = mock_response
@@ -100,7 +126,7 @@ async def test_get_bus_stop_not_found(
 
     json: str = await load_file("tests/fixtures/bus_stops_empty.json")
 
-    mock_response = AsyncMock()
+    mock_response = create_mock_response()
     mock_response.status = 200
     mock_response.json.return_value = json
     mock_session.get.return_value.__aenter__.return_value = mock_response
@@ -111,6 +137,112 @@ async def test_get_bus_stop_not_found(
     assert bus_stop is None
 
 
+async def test_get_all_bus_stops(
+    mock_session: MagicMock, service: SgBusArrivals
+) -> None:
+    """Test get all bus stops pages through the bus stops once."""
+
+    mock_response = create_mock_response()
+    mock_response.status = 200
+    mock_response.read.side_effect = [
+        json.dumps(await load_file("tests/fixtures/bus_stops.json")).encode(),
+        json.dumps(await load_file("tests/fixtures/bus_stops_empty.json")).encode(),
+    ]
+    mock_session.get.return_value.__aenter__.return_value = mock_response
+
+    all_bus_stops = await service.get_all_bus_stops()
+
+    assert mock_session.get.call_count == 2
+    assert all_bus_stops["01012"] == BusStop(
+        "01012",
+        "Victoria St",
+        "Hotel Grand Pacific",
+        1.29684825487647,
+        103.85253591654006,
+    )
+
+
+async def test_get_all_bus_services(
+    mock_session: MagicMock, service: SgBusArrivals
+) -> None:
+    """Test get all bus services keeps the first and last bus times."""
+
+    mock_response = create_mock_response()
+    mock_response.status = 200
+    mock_response.read.side_effect = [
+        json.dumps(await load_file("tests/fixtures/bus_routes.json")).encode(),
+        b'{"value": []}',
+    ]
+    mock_session.get.return_value.__aenter__.return_value = mock_response
+
+    all_bus_services = await service.get_all_bus_services()
+
+    # the terminus is visited twice, the last bus arrives after midnight
+    assert all_bus_services["75009"]["10"] == OperatingHours(
+        (300, 1520), (300, 1520), (300, 1516)
+    )
+
+
+async def test_get_all_bus_services_off_loop(
+    mock_session: MagicMock, service: SgBusArrivals
+) -> None:
+    """Test the bus routes are decoded and parsed in the executor, page by page."""
+
+    rows: list[dict[str, Any]] = [
+        {
+            "ServiceNo": str(index % 4),
+            "BusStopCode": f"{index % 50:05d}",
+            "WD_FirstBus": "0500",
+            "WD_LastBus": "2330",
+            "SAT_FirstBus": "0530",
+            "SAT_LastBus": "0030",
+            "SUN_FirstBus": "-",
+            "SUN_LastBus": "-",
+        }
+        for index in range(1200)
+    ]
+    mock_response = create_mock_response()
+    mock_response.status = 200
+    mock_response.read.side_effect = [
+        json.dumps({"value": rows[index : index + 500]}).encode()
+        for index in range(0, len(rows), 500)
+    ] + [b'{"value": []}']
+    mock_session.get.return_value.__aenter__.return_value = mock_response
+
+    loop = asyncio.get_running_loop()
+    with patch.object(
+        loop, "run_in_executor", wraps=loop.run_in_executor
+    ) as mock_run_in_executor:
+        all_bus_services = await service.get_all_bus_services()
+
+    assert len(all_bus_services) == 50
+    assert all_bus_services["00001"]["1"].sundays is None
+    # each page, including the last empty page, is parsed in the executor
+    assert [
+        call.args[1].__name__ for call in mock_run_in_executor.call_args_list
+    ] == ["_parse_page"] * 4
+
+
+def test_is_operating() -> None:
+    """Test the first and last bus times, including buses past midnight."""
+
+    operating_hours = OperatingHours((330, 1470), (360, 1410), None)
+    margin = timedelta(minutes=30)
+
+    # Monday
+    assert is_operating(operating_hours, datetime(2025, 6, 2, 5, 0), margin)
+    assert not is_operating(operating_hours, datetime(2025, 6, 2, 4, 59), margin)
+    # Saturday, after the last bus of Friday
+    assert is_operating(operating_hours, datetime(2025, 6, 7, 0, 59), margin)
+    assert not is_operating(operating_hours, datetime(2025, 6, 7, 1, 1), margin)
+    # Sunday, no buses
+    assert not is_operating(operating_hours, datetime(2025, 6, 8, 12, 0), margin)
+    # Monday, after the last bus of Sunday
+    assert not is_operating(
+        operating_hours, datetime(2025, 6, 9, 0, 30), timedelta(0)
+    )
+
+
 async def test_get_bus_arrivals(
     mock_session: MagicMock, service: SgBusArrivals
 ) -> None:
@@ -118,7 +250,7 @@ async def test_get_bus_arrivals(
 
     json: str = await load_file("tests/fixtures/bus_arrival.json")
 
-    mock_response = AsyncMock()
+    mock_response = create_mock_response()
     mock_response.status = 200
     mock_response.json.return_value = json
     mock_session.get.return_value.__aenter__.return_value = mock_response
@@ -129,12 +261,19 @@ async def test_get_bus_arrivals(
     assert arrivals
 
 
-async def test_compute_arrival_minutes(service: SgBusArrivals) -> None:
+def test_compute_arrival_minutes() -> None:
     """Test compute arrival minutes."""
 
-    result: int = service._compute_arrival_minutes("9999-12-31T12:00:00+08:00")  # noqa: SLF001
+    now_utc: datetime = datetime(2025, 1, 1, 4, tzinfo=UTC)
 
-    assert result > 0
+    assert (
+        compute_arrival_minutes(
+            datetime.fromisoformat("2025-01-01T12:05:59+08:00"), now_utc
+        )
+        == 5
+    )
+    # buses which are already past arrive now
+    assert compute_arrival_minutes(now_utc - timedelta(minutes=1), now_utc) == 0
 
 
 async def test_train_service_alerts(
@@ -144,7 +283,7 @@ async def test_train_service_alerts(
 
     json: str = await load_file("tests/fixtures/train_service_alerts.json")
 
-    mock_response = AsyncMock()
+    mock_response = create_mock_response()
     mock_response.status = 200
     mock_response.json.return_value = json
     mock_session.get.return_value.__aenter__.return_value = mock_response
@@ -157,6 +296,16 @@ async def test_train_service_alerts(
         [
             "1711hrs : NEL - Additional travelling time of 40 minutes between Boon Keng and Dhoby Ghaut stations towards HarbourFront station due to a signal fault. Free bus rides available at designated stops toward HarbourFront station."
         ],
+        [
+            AffectedSegment(
+                "nel",
+                "HarbourFront",
+                ["NE9", "NE8", "NE7", "NE6"],
+                ["NE9", "NE8", "NE7", "NE6"],
+                ["NE9", "NE8", "NE7", "NE6"],
+                "HarbourFront",
+            )
+        ],
     )
     assert response["ccl"] == TrainServiceAlert(
         "normal",
@@ -164,6 +313,216 @@ async def test_train_service_alerts(
     )
 
 
+async def test_train_service_alerts_whole_words(service: SgBusArrivals) -> None:
+    """Test line codes are only matched as whole words."""
+
+    response: dict[str, TrainServiceAlert] = service._parse_train_service_alerts(  # noqa: SLF001
+        {
+            "AffectedSegments": [{"Line": "EWL", "Stations": ""}],
+            "Message": [{"Content": "CCLE works. DTL/NSL: delays on DTL."}],
+        }
+    )
+
+    assert response["ccl"].status == "normal"
+    assert response["dtl"].messages == ["CCLE works. DTL/NSL: delays on DTL."]
+    assert response["nsl"].status == "disrupted"
+    assert response["ewl"].status == "disrupted"
+    assert response["ewl"].messages == []
+
+
+async def test_train_service_alerts_large_payload(service: SgBusArrivals) -> None:
+    """Test messages are assigned to lines for a large disruption payload."""
+
+    lines: list[str] = service.get_train_lines()
+    messages: list[dict[str, str]] = [
+        {"Content": f"{index:04d}hrs : {line.upper()} - Delays due to a fault. " * 5}
+        for index in range(1000)
+        for line in lines
+    ]
+
+    response: dict[str, TrainServiceAlert] = service._parse_train_service_alerts(  # noqa: SLF001
+        {"AffectedSegments": [], "Message": messages}
+    )
+
+    for line in lines:
+        assert response[line].status == "disrupted"
+        assert len(response[line].messages) == 1000
+
+
+async def test_accept_encoding(
+    mock_session: MagicMock, service: SgBusArrivals
+) -> None:
+    """Test compressed responses are requested."""
+
+    mock_response = create_mock_response()
+    mock_response.status = 200
+    mock_session.get.return_value.__aenter__.return_value = mock_response
+
+    await service.authenticate()
+
+    headers: dict[str, str] = mock_session.get.call_args.kwargs["headers"]
+    assert "gzip" in headers["Accept-Encoding"]
+
+
+async def test_statistics(mock_session: MagicMock, service: SgBusArrivals) -> None:
+    """Test response sizes are recorded by endpoint."""
+
+    mock_response = create_mock_response()
+    mock_response.status = 200
+    mock_response.content_length = 100
+    mock_response.read.return_value = b"x" * 400
+    mock_session.get.return_value.__aenter__.return_value = mock_response
+
+    await service.get_bus_arrivals("83139")
+    mock_response.content_length = None
+    await service.get_bus_arrivals("83139")
+
+    assert service.get_statistics() == {
+        "/v3/BusArrival": EndpointStatistics(2, 500, 800)
+    }
+
+
+async def test_instrumented_statistics(mock_session: MagicMock) -> None:
+    """Test status codes and latencies are recorded when instrumented."""
+
+    service = SgBusArrivals(mock_session, "test_api_key", instrumented=True)
+    mock_response = create_mock_response()
+    mock_response.status = 200
+    mock_session.get.return_value.__aenter__.return_value = mock_response
+
+    with patch(
+        "custom_components.sg_bus_arrivals.api.time.perf_counter",
+        side_effect=[0, 0.3, 1, 21],
+    ):
+        await service.get_bus_arrivals("83139")
+        await service.get_bus_arrivals("83139")
+
+    statistics: EndpointStatistics = service.get_statistics()["/v3/BusArrival"]
+    assert statistics.requests == 2
+    assert statistics.status_codes == {200: 2}
+    assert statistics.total_latency == pytest.approx(20.3)
+    assert statistics.latency_histogram == {"0.5": 1, "+Inf": 1}
+
+
+async def test_rate_limit_events(
+    mock_session: MagicMock, service: SgBusArrivals
+) -> None:
+    """Test rate limited responses and recent requests are recorded."""
+
+    mock_response = create_mock_response()
+    mock_response.status = 429
+    mock_response.headers = {"Retry-After": "60"}
+    mock_session.get.return_value.__aenter__.return_value = mock_response
+
+    with pytest.raises(ApiGeneralError):
+        await service.get_bus_arrivals("83139")
+
+    assert service.get_statistics()["/v3/BusArrival"].rate_limited == 1
+    assert service.get_recent_requests() == {"/v3/BusArrival": 1}
+    events: list[RateLimitEvent] = service.get_rate_limit_events()
+    assert len(events) == 1
+    assert events[0].endpoint == "/v3/BusArrival"
+    assert events[0].retry_after == "60"
+
+
+async def test_circuit_breaker(
+    mock_session: MagicMock, service: SgBusArrivals
+) -> None:
+    """Test failing endpoints fail fast until a probe request succeeds."""
+
+    mock_response = create_mock_response()
+    mock_response.status = 503
+    mock_session.get.return_value.__aenter__.return_value = mock_response
+
+    with patch(
+        "custom_components.sg_bus_arrivals.api.time.monotonic"
+    ) as mock_monotonic:
+        mock_monotonic.return_value = 0
+        for _ in range(5):
+            with pytest.raises(ApiGeneralError):
+                await service.get_bus_arrivals("83139")
+        assert service.get_circuit_breaker_state() == "open"
+
+        # no requests while open, the other endpoint families are not affected
+        with pytest.raises(ApiCircuitOpenError) as exc_info:
+            await service.get_bus_arrivals("83139")
+        assert exc_info.value.http_status is None
+        assert "circuit breaker is open" in str(exc_info.value)
+        assert "bus_arrivals" in str(exc_info.value)
+        assert mock_session.get.call_count == 5
+        assert service.get_circuit_breakers()["train_service_alerts"].state == (
+            "closed"
+        )
+
+        # a failed probe opens the circuit again
+        mock_monotonic.return_value = 61
+        with pytest.raises(ApiGeneralError):
+            await service.get_bus_arrivals("83139")
+        assert mock_session.get.call_count == 6
+        with pytest.raises(ApiCircuitOpenError):
+            await service.get_bus_arrivals("83139")
+
+        # a successful probe closes the circuit
+        mock_response.status = 200
+        mock_monotonic.return_value = 122
+        await service.get_bus_arrivals("83139")
+        await service.get_bus_arrivals("83139")
+
+    statistics = service.get_circuit_breakers()["bus_arrivals"]
+    assert statistics.state == "closed"
+    assert statistics.consecutive_failures == 0
+    assert statistics.opened == 1
+    assert statistics.rejected == 2
+    assert service.get_circuit_breaker_state() == "closed"
+
+
+async def test_recent_requests_window(
+    mock_session: MagicMock, service: SgBusArrivals
+) -> None:
+    """Test requests older than an hour are not counted."""
+
+    mock_response = create_mock_response()
+    mock_response.status = 200
+    mock_session.get.return_value.__aenter__.return_value = mock_response
+
+    with patch(
+        "custom_components.sg_bus_arrivals.api.time.monotonic"
+    ) as mock_monotonic:
+        mock_monotonic.return_value = 0
+        await service.get_bus_arrivals("83139")
+        mock_monotonic.return_value = 30 * 60
+        await service.get_bus_arrivals("83139")
+        await service.get_bus_arrivals("83139")
+        assert service.get_recent_requests() == {"/v3/BusArrival": 3}
+
+        mock_monotonic.return_value = 61 * 60
+        assert service.get_recent_requests() == {"/v3/BusArrival": 2}
+
+
+async def test_dedicated_session_reuses_connections(socket_enabled: None) -> None:
+    """Test the dedicated session keeps its connection alive between requests."""
+
+    async def handler(request: web.Request) -> web.Response:
+        return web.json_response({"value": []})
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    statistics = ConnectionStatistics()
+
+    async with TestServer(app) as server:
+        session = create_dedicated_session(ssl.create_default_context(), statistics)
+        try:
+            for _ in range(3):
+                async with session.get(server.make_url("/")) as response:
+                    await response.read()
+        finally:
+            await session.close()
+
+    assert statistics.new_connections == 1
+    assert statistics.reused_connections == 2
+    assert statistics.total_connect_time > 0
+
+
 async def load_file(filename: str) -> Any:
     """Load a file from the test data directory."""
 
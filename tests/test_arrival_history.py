@@ -0,0 +1,102 @@
+"""Tests for the arrival history."""
+
+from custom_components.sg_bus_arrivals.arrival_history import (
+    ArrivalHistory,
+    ArrivalStatistics,
+    ServiceHistory,
+)
+
+
+def test_statistics() -> None:
+    """Test the headway, bunching and prediction error of the detected arrivals."""
+
+    history = ServiceHistory(3)
+    # the 1st bus slips from 600 to 700 seconds, the 4th bus is bunched with
+    # the 3rd bus
+    for polled, first_arrival in (
+        (0, 600),
+        (300, 700),
+        (600, 700),
+        (690, 700),
+        (710, 1500),
+        (1450, 1500),
+        (1520, 2100),
+        (1600, 2100),
+        (2090, 2100),
+        (2110, 2200),
+        (2190, 2200),
+        (2210, None),
+    ):
+        history.record(polled, [first_arrival, None, None])
+
+    assert len(history) == 12
+    # headways of 800, 600 and 100 seconds, errors of 100, 0, 0 and 0 seconds
+    assert history.get_statistics() == ArrivalStatistics(8.3, 33.3, 0.4)
+
+    # the statistics are rebuilt from the saved polls
+    assert ServiceHistory.from_dict(history.to_dict()).get_statistics() == (
+        history.get_statistics()
+    )
+
+
+def test_statistics_poll_gap() -> None:
+    """Test arrivals are not detected across a gap between the polls."""
+
+    history = ServiceHistory(3, max_poll_gap=100)
+    # buses every 10 minutes in the evening, then the morning buses 6 hours
+    # after the last poll
+    morning: int = 2000 + 6 * 3600
+    arrivals: list[int] = [610, 1210, 1810, 2410, morning + 610, morning + 1210]
+    for polled in [*range(0, 2020, 20), *range(morning, morning + 1420, 20)]:
+        first_arrival: int | None = next(
+            (arrival for arrival in arrivals if arrival > polled), None
+        )
+        history.record(polled, [first_arrival, None, None])
+
+    # headways of 600, 600 and 600 seconds, without the 6 hours gap
+    assert history.get_statistics().headway == 10.0
+
+    # the gap is also skipped when the statistics are rebuilt
+    assert ServiceHistory.from_dict(history.to_dict(), 100).get_statistics() == (
+        history.get_statistics()
+    )
+
+
+def test_ring_buffer() -> None:
+    """Test only the last polls are kept."""
+
+    history = ServiceHistory(3, size=4)
+    for polled in range(0, 200, 20):
+        history.record(polled, [polled + 300, polled + 900])
+
+    assert len(history) == 4
+    assert sorted(history.polled) == [120, 140, 160, 180]
+    assert list(history.arrivals[0]) == [300, 300, 300, 300]
+    assert list(history.arrivals[1]) == [900, 900, 900, 900]
+    # the missing 3rd bus is not recorded
+    assert set(history.arrivals[2]) == {-32768}
+
+    restored = ServiceHistory.from_dict(history.to_dict())
+    assert len(restored) == 4
+    assert list(restored.polled) == list(history.polled)
+    assert restored.index == history.index
+
+
+def test_arrival_history() -> None:
+    """Test the histories of the bus services are saved and retained."""
+
+    arrival_history = ArrivalHistory(3)
+    arrival_history.record("11111", "10", 0, [300, None, None])
+    arrival_history.record("11111", "14", 0, [])
+    arrival_history.record("22222", "10", 0, [600, 1200, 1800])
+    assert len(arrival_history) == 3
+    assert arrival_history.get_polls() == 3
+
+    arrival_history.retain([("11111", "10"), ("22222", "10"), ("33333", "10")])
+    assert len(arrival_history) == 2
+    assert arrival_history.get_statistics("11111", "14") == ArrivalStatistics()
+
+    restored = ArrivalHistory(3)
+    restored.load(arrival_history.to_dict())
+    assert len(restored) == 2
+    assert restored.get_polls() == 2
@@ -0,0 +1,86 @@
+"""Tests for the bus stop indexes."""
+
+import random
+
+from custom_components.sg_bus_arrivals.bus_stop_index import (
+    BusStopSpatialIndex,
+    BusStopTextIndex,
+    distance_metres,
+)
+from custom_components.sg_bus_arrivals.models import BusStop
+
+
+def test_distance_metres() -> None:
+    """Test the distance of 0.001 degrees of latitude."""
+
+    assert round(distance_metres(1.3, 103.85, 1.301, 103.85)) == 111
+
+
+def test_spatial_index_search() -> None:
+    """Test searching the grid matches measuring the distance to every bus stop."""
+
+    rng = random.Random(1)
+    bus_stops: list[BusStop] = [
+        BusStop(
+            f"{i:05}",
+            "mock road",
+            f"stop {i}",
+            rng.uniform(1.25, 1.45),
+            rng.uniform(103.6, 104.0),
+        )
+        for i in range(5000)
+    ]
+    bus_stops.append(BusStop("99999", "mock road", "no location"))
+    spatial_index = BusStopSpatialIndex(bus_stops)
+    assert len(spatial_index) == 5000
+
+    for _ in range(20):
+        latitude: float = rng.uniform(1.25, 1.45)
+        longitude: float = rng.uniform(103.6, 104.0)
+        expected: list[str] = [
+            bus_stop.bus_stop_code
+            for distance, bus_stop in sorted(
+                (
+                    (
+                        distance_metres(
+                            latitude, longitude, bus_stop.latitude, bus_stop.longitude
+                        ),
+                        bus_stop,
+                    )
+                    for bus_stop in bus_stops[:-1]
+                ),
+                key=lambda result: result[0],
+            )
+            if distance <= 800
+        ][:10]
+
+        results = spatial_index.search(latitude, longitude, 800, 10)
+
+        assert [bus_stop.bus_stop_code for _, bus_stop in results] == expected
+
+
+def test_text_index_search() -> None:
+    """Test prefix and fuzzy matching of the bus stop names, roads and codes."""
+
+    text_index = BusStopTextIndex(
+        [
+            BusStop("46971", "Woodlands Ave 3", "Blk 123"),
+            BusStop("46979", "Woodlands Ave 3", "Opp Blk 123"),
+            BusStop("01012", "Victoria St", "Hotel Grand Pacific"),
+            BusStop("83139", "Bedok Nth Ave 1", "Blk 12"),
+        ]
+    )
+    assert len(text_index) == 4
+
+    def search(query: str) -> list[str]:
+        return [bus_stop.bus_stop_code for bus_stop in text_index.search(query, 10)]
+
+    # every word must match for the highest rank, ties are ordered by name
+    assert search("blk 12 woodlands")[:2] == ["46971", "46979"]
+    assert search("opp blk")[0] == "46979"
+    assert search("grand")[0] == "01012"
+    assert search("831") == ["83139"]
+    assert search("wodlands")[:2] == ["46971", "46979"]
+    assert search("victria st")[0] == "01012"
+    assert search("xyz") == []
+    assert text_index.search("blk", 1) == [BusStop("83139", "Bedok Nth Ave 1", "Blk 12")]
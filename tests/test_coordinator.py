@@ -0,0 +1,1166 @@
+"""Tests for the coordinators."""
+
+import asyncio
+from datetime import timedelta
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from custom_components.sg_bus_arrivals.api import ApiGeneralError
+from custom_components.sg_bus_arrivals.const import (
+    CONF_FAST_STARTUP,
+    DOMAIN,
+    EVENT_APPROACHING,
+    MIN_SCAN_INTERVAL_SECONDS,
+    SUBENTRY_CONF_BUS_STOP_CODE,
+    SUBENTRY_CONF_COUNT,
+    SUBENTRY_CONF_DESCRIPTION,
+    SUBENTRY_CONF_MINUTES,
+    SUBENTRY_CONF_SERVICE_NO,
+    SUBENTRY_CONF_TRACKER,
+    SUBENTRY_TYPE_APPROACHING_BUS,
+    SUBENTRY_TYPE_BUS_SERVICE,
+    SUBENTRY_TYPE_BUS_STOP,
+    SUBENTRY_TYPE_NEARBY_BUS_STOPS,
+    SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
+    TRAIN_SERVICE_ALERTS_MIN_SCAN_INTERVAL_SECONDS,
+    TRAIN_SERVICE_ALERTS_SCAN_INTERVAL_SECONDS,
+)
+from custom_components.sg_bus_arrivals.coordinator import SgBusArrivalsData
+from custom_components.sg_bus_arrivals.models import (
+    BusArrival,
+    BusStop,
+    NextBus,
+    OperatingHours,
+    TrainServiceAlert,
+)
+from freezegun.api import FrozenDateTimeFactory
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_capture_events,
+    async_fire_time_changed,
+)
+
+from homeassistant.config_entries import (
+    SOURCE_USER,
+    ConfigEntryState,
+    ConfigSubentry,
+    ConfigSubentryData,
+)
+from homeassistant.const import CONF_API_KEY, CONF_SCAN_INTERVAL
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+from homeassistant.util import dt as dt_util
+
+
+ALL_DAY = OperatingHours((0, 1440), (0, 1440), (0, 1440))
+
+
+def create_config_entry(
+    bus_stop_codes: list[str], fast_startup: bool = False
+) -> MockConfigEntry:
+    """Create a config entry with a bus service subentry for each bus stop."""
+    return MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+            CONF_FAST_STARTUP: fast_startup,
+        },
+        subentries_data=[
+            ConfigSubentryData(
+                data={
+                    SUBENTRY_CONF_BUS_STOP_CODE: bus_stop_code,
+                    SUBENTRY_CONF_DESCRIPTION: "mock description",
+                    SUBENTRY_CONF_SERVICE_NO: "10",
+                },
+                subentry_type=SUBENTRY_TYPE_BUS_SERVICE,
+                title="mock subentry",
+                unique_id=f"{bus_stop_code}_10",
+            )
+            for bus_stop_code in bus_stop_codes
+        ],
+    )
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_skip_out_of_service_bus_stops(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test bus stops are not polled outside the first and last bus times."""
+
+    mock_get_all_bus_services.return_value = {
+        "11111": {"10": ALL_DAY},
+        "22222": {"10": OperatingHours(), "14": ALL_DAY},
+        "33333": {"14": OperatingHours()},
+    }
+    mock_get_bus_arrivals.return_value = []
+
+    config_entry = create_config_entry(["11111", "22222", "33333"])
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    mock_get_bus_arrivals.reset_mock()
+    sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+    await sg_bus_arrivals_data.bus_arrivals_coordinator.async_refresh()
+
+    # bus service 10 does not run at the 2nd bus stop, the times of bus
+    # service 10 at the 3rd bus stop are unknown
+    polled = {call.args[0] for call in mock_get_bus_arrivals.call_args_list}
+    assert polled == {"11111", "33333"}
+    assert (
+        sg_bus_arrivals_data.bus_arrivals_coordinator.get_cache_statistics()[
+            "out_of_service_bus_stops"
+        ]
+        == 1
+    )
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_skip_disabled_bus_stops(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test bus stops without enabled sensors are not polled."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.return_value = []
+
+    config_entry = create_config_entry(["11111", "22222"])
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    polled: set[str] = {call.args[0] for call in mock_get_bus_arrivals.call_args_list}
+    assert polled == {"11111", "22222"}
+
+    # disable all sensors of the 1st bus stop
+    entity_registry: er.EntityRegistry = er.async_get(hass)
+    for entity_entry in er.async_entries_for_config_entry(
+        entity_registry, config_entry.entry_id
+    ):
+        if entity_entry.unique_id.startswith("11111_"):
+            entity_registry.async_update_entity(
+                entity_entry.entity_id, disabled_by=er.RegistryEntryDisabler.USER
+            )
+    await hass.async_block_till_done()
+
+    mock_get_bus_arrivals.reset_mock()
+    sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+    await sg_bus_arrivals_data.bus_arrivals_coordinator.async_refresh()
+
+    polled = {call.args[0] for call in mock_get_bus_arrivals.call_args_list}
+    assert polled == {"22222"}
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_sharded_polling(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test many bus stops are polled in shards spread across the scan interval."""
+
+    async def get_bus_arrivals(bus_stop_code: str) -> list[BusArrival]:
+        await asyncio.sleep(0)
+        return [
+            BusArrival(bus_stop_code, "10", "sbst", [NextBus(3), NextBus(), NextBus()])
+        ]
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.side_effect = get_bus_arrivals
+
+    bus_stop_codes: list[str] = [f"{code:05d}" for code in range(10000, 10500)]
+    config_entry = create_config_entry(bus_stop_codes)
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+    coordinator = sg_bus_arrivals_data.bus_arrivals_coordinator
+    assert coordinator.get_cache_statistics()["shards"] == 10
+    assert coordinator.update_interval == timedelta(
+        seconds=MIN_SCAN_INTERVAL_SECONDS / 10
+    )
+
+    mock_get_bus_arrivals.reset_mock()
+    for _ in range(10):
+        await coordinator.async_refresh()
+        assert coordinator.last_update_success
+
+    # every bus stop is polled once per scan interval and the shards are merged
+    polled: list[str] = [
+        call.args[0] for call in mock_get_bus_arrivals.call_args_list
+    ]
+    assert sorted(polled) == bus_stop_codes
+    assert set(coordinator.data) == set(bus_stop_codes)
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+@patch("custom_components.sg_bus_arrivals.coordinator.BUS_ARRIVALS_SHARD_SIZE", 2)
+async def test_shard_interval_budget(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test a slow bus stop delays the rotation by at most one shard interval."""
+
+    async def get_bus_arrivals(bus_stop_code: str) -> list[BusArrival]:
+        # up to 20 ms per request, 1 bus stop is slower than the shard interval
+        await asyncio.sleep(
+            5 if bus_stop_code == "10007" else int(bus_stop_code) % 3 / 100
+        )
+        return [
+            BusArrival(bus_stop_code, "10", "sbst", [NextBus(3), NextBus(), NextBus()])
+        ]
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.side_effect = get_bus_arrivals
+
+    bus_stop_codes: list[str] = [f"{code:05d}" for code in range(10000, 10200)]
+    config_entry = create_config_entry(bus_stop_codes)
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    coordinator = config_entry.runtime_data.bus_arrivals_coordinator
+    assert coordinator.update_interval == timedelta(
+        seconds=MIN_SCAN_INTERVAL_SECONDS / 100
+    )
+
+    mock_get_bus_arrivals.reset_mock()
+    for _ in range(100):
+        await coordinator.async_refresh()
+        assert coordinator.last_update_success
+
+    # the slow bus stop runs out of the shard interval, within the shard timeout
+    assert {call.args[0] for call in mock_get_bus_arrivals.call_args_list} == set(
+        bus_stop_codes
+    )
+    assert set(coordinator.data) == set(bus_stop_codes) - {"10007"}
+
+    # stop the short refresh interval before the api is unpatched
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_shard_time_budget(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test a slow bus stop does not fail the other bus stops of a shard."""
+
+    slow_bus_stop_codes: set[str] = {"22222"}
+
+    async def get_bus_arrivals(bus_stop_code: str) -> list[BusArrival]:
+        if bus_stop_code in slow_bus_stop_codes:
+            await asyncio.Event().wait()
+        now = dt_util.utcnow()
+        return [
+            BusArrival(
+                bus_stop_code,
+                "10",
+                "sbst",
+                [
+                    NextBus(3, estimated_arrival=now + timedelta(minutes=3)),
+                    NextBus(),
+                    NextBus(),
+                ],
+            )
+        ]
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.side_effect = get_bus_arrivals
+
+    config_entry = create_config_entry(["11111", "22222"])
+    config_entry.add_to_hass(hass)
+    with patch(
+        "custom_components.sg_bus_arrivals.coordinator.BUS_ARRIVALS_SHARD_TIMEOUT_SECONDS",
+        0.05,
+    ):
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done()
+
+        sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+        coordinator = sg_bus_arrivals_data.bus_arrivals_coordinator
+        assert coordinator.last_update_success
+        assert set(coordinator.data) == {"11111"}
+
+        # the buses yet to arrive are kept while the bus stop is slow
+        slow_bus_stop_codes.clear()
+        await coordinator.async_refresh()
+        next_bus = coordinator.data["11111"]["10"].next_bus[0]
+        slow_bus_stop_codes.add("11111")
+        await coordinator.async_refresh()
+        assert coordinator.last_update_success
+        assert set(coordinator.data) == {"11111", "22222"}
+        assert (
+            coordinator.data["11111"]["10"].next_bus[0].estimated_arrival
+            == next_bus.estimated_arrival
+        )
+
+        slow_bus_stop_codes.add("22222")
+        await coordinator.async_refresh()
+        assert not coordinator.last_update_success
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_failing_bus_stop(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+    freezer: FrozenDateTimeFactory,
+) -> None:
+    """Test the buses of a failing bus stop count down and expire once arrived."""
+
+    failing_bus_stop_codes: set[str] = set()
+
+    async def get_bus_arrivals(bus_stop_code: str) -> list[BusArrival]:
+        if bus_stop_code in failing_bus_stop_codes:
+            raise ApiGeneralError("/v3/BusArrival", 500)
+        now = dt_util.utcnow()
+        return [
+            BusArrival(
+                bus_stop_code,
+                "10",
+                "sbst",
+                [
+                    NextBus(3, estimated_arrival=now + timedelta(minutes=3)),
+                    NextBus(8, estimated_arrival=now + timedelta(minutes=8)),
+                    NextBus(),
+                ],
+            )
+        ]
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.side_effect = get_bus_arrivals
+
+    config_entry = create_config_entry(["11111", "22222"])
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    coordinator = config_entry.runtime_data.bus_arrivals_coordinator
+    failing_bus_stop_codes.add("22222")
+
+    def get_minutes(bus_stop_code: str) -> list[int | None] | None:
+        bus_arrivals = coordinator.data.get(bus_stop_code)
+        if bus_arrivals is None:
+            return None
+        return [
+            next_bus.estimated_arrival_minutes
+            for next_bus in bus_arrivals["10"].next_bus
+        ]
+
+    freezer.tick(timedelta(minutes=2))
+    await coordinator.async_refresh()
+    assert coordinator.last_update_success
+    assert get_minutes("11111") == [3, 8, None]
+    assert get_minutes("22222") == [1, 6, None]
+
+    # the first bus has arrived, the next bus moves up
+    freezer.tick(timedelta(minutes=2))
+    await coordinator.async_refresh()
+    assert get_minutes("22222") == [4, None, None]
+
+    # after all buses have arrived, the bus stop has no bus arrivals
+    freezer.tick(timedelta(minutes=5))
+    await coordinator.async_refresh()
+    assert coordinator.last_update_success
+    assert get_minutes("11111") == [3, 8, None]
+    assert get_minutes("22222") is None
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_approaching_events(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test an event fires once each time a bus comes within the threshold."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.return_value = []
+
+    config_entry = create_config_entry([])
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    # the bus stop of an approaching bus subentry is polled without any sensor
+    subentry = ConfigSubentry(
+        data={
+            SUBENTRY_CONF_BUS_STOP_CODE: "11111",
+            SUBENTRY_CONF_SERVICE_NO: "10",
+            SUBENTRY_CONF_DESCRIPTION: "mock description",
+            SUBENTRY_CONF_MINUTES: 3,
+        },
+        subentry_type=SUBENTRY_TYPE_APPROACHING_BUS,
+        title="mock subentry",
+        unique_id="approaching_11111_10_3",
+    )
+    hass.config_entries.async_add_subentry(config_entry, subentry)
+    await hass.async_block_till_done()
+    assert config_entry.state is ConfigEntryState.LOADED
+
+    events = async_capture_events(hass, EVENT_APPROACHING)
+    coordinator = config_entry.runtime_data.bus_arrivals_coordinator
+    # the estimate fluctuates around the threshold, the bus arrives and the
+    # next bus comes within the threshold
+    for minutes in (6, 4, 3, 4, 3, 1, 0, 2, None, 5, 3):
+        mock_get_bus_arrivals.return_value = [
+            BusArrival(
+                "11111", "10", "sbst", [NextBus(minutes), NextBus(), NextBus()]
+            )
+        ]
+        await coordinator.async_refresh()
+        assert coordinator.last_update_success
+    await hass.async_block_till_done()
+
+    assert {call.args[0] for call in mock_get_bus_arrivals.call_args_list} == {
+        "11111"
+    }
+    assert [event.data["estimated_arrival_minutes"] for event in events] == [
+        3,
+        2,
+        3,
+    ]
+    assert events[0].data["bus_stop_code"] == "11111"
+    assert events[0].data["service_no"] == "10"
+    assert events[0].data["threshold"] == 3
+
+    # a threshold added again fires for a bus approaching before it was removed
+    hass.config_entries.async_remove_subentry(config_entry, subentry.subentry_id)
+    await hass.async_block_till_done()
+    await coordinator.async_refresh()
+    hass.config_entries.async_add_subentry(config_entry, subentry)
+    await hass.async_block_till_done()
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    assert len(events) == 4
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_refresh_streaks(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test the success and failure streaks of the refreshes are recorded."""
+
+    mock_get_all_bus_services.return_value = {
+        "11111": dict.fromkeys(("10", "14"), ALL_DAY)
+    }
+    mock_get_bus_arrivals.return_value = []
+
+    config_entry = create_config_entry(["11111"])
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+    coordinator = sg_bus_arrivals_data.bus_arrivals_coordinator
+    assert coordinator.statistics.success_streak > 0
+    assert coordinator.statistics.last_failure is None
+
+    mock_get_bus_arrivals.side_effect = ApiGeneralError("/v3/BusArrival", 500)
+    await coordinator.async_refresh()
+    await coordinator.async_refresh()
+    assert coordinator.statistics.success_streak == 0
+    assert coordinator.statistics.failure_streak == 2
+    assert coordinator.statistics.last_failure is not None
+
+    mock_get_bus_arrivals.side_effect = None
+    await coordinator.async_refresh()
+    assert coordinator.statistics.success_streak == 1
+    assert coordinator.statistics.failure_streak == 0
+
+    await coordinator.get_bus_services("11111")
+    cache_statistics = coordinator.get_cache_statistics()
+    assert cache_statistics["all_bus_services"]["bus_stops"] == 1
+    assert cache_statistics["all_bus_services"]["bus_services"] == 2
+    assert cache_statistics["all_bus_services"]["loaded"] is not None
+    assert cache_statistics["polled_bus_stops"] == 1
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_add_remove_subentries_without_reload(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test bus subentries are attached and detached without a reload."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.return_value = []
+
+    config_entry = create_config_entry(["11111"])
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+    coordinator = sg_bus_arrivals_data.bus_arrivals_coordinator
+
+    subentry = ConfigSubentry(
+        data={
+            SUBENTRY_CONF_BUS_STOP_CODE: "22222",
+            SUBENTRY_CONF_DESCRIPTION: "mock description",
+        },
+        subentry_type=SUBENTRY_TYPE_BUS_STOP,
+        title="mock subentry",
+        unique_id="bus_stop_22222",
+    )
+    hass.config_entries.async_add_subentry(config_entry, subentry)
+    await hass.async_block_till_done()
+
+    assert config_entry.runtime_data is sg_bus_arrivals_data
+    assert mock_authenticate.call_count == 1
+    assert hass.states.get("sensor.sgbusarrivals_bus_stop_22222") is not None
+
+    mock_get_bus_arrivals.reset_mock()
+    await coordinator.async_refresh()
+    polled: set[str] = {call.args[0] for call in mock_get_bus_arrivals.call_args_list}
+    assert polled == {"11111", "22222"}
+
+    hass.config_entries.async_remove_subentry(config_entry, subentry.subentry_id)
+    await hass.async_block_till_done()
+
+    assert config_entry.runtime_data is sg_bus_arrivals_data
+    assert hass.states.get("sensor.sgbusarrivals_bus_stop_22222") is None
+
+    mock_get_bus_arrivals.reset_mock()
+    await coordinator.async_refresh()
+    polled = {call.args[0] for call in mock_get_bus_arrivals.call_args_list}
+    assert polled == {"11111"}
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_restore_bus_arrivals(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+    hass_storage: dict[str, Any],
+) -> None:
+    """Test the last bus arrivals are restored with the minutes recomputed."""
+
+    fetched = asyncio.Event()
+
+    async def get_bus_arrivals(bus_stop_code: str) -> list[BusArrival]:
+        await fetched.wait()
+        return [
+            BusArrival(
+                bus_stop_code,
+                "10",
+                "sbst",
+                [
+                    NextBus(2, "sd", "wab", "sea", now + timedelta(minutes=2, seconds=30)),
+                    NextBus(),
+                    NextBus(),
+                ],
+            )
+        ]
+
+    now = dt_util.utcnow()
+    config_entry = create_config_entry(["11111"], fast_startup=True)
+    hass_storage[f"{DOMAIN}.{config_entry.entry_id}.bus_arrivals"] = {
+        "version": 1,
+        "key": f"{DOMAIN}.{config_entry.entry_id}.bus_arrivals",
+        "data": {
+            "saved": now.isoformat(),
+            "bus_arrivals": {
+                "11111": [
+                    {
+                        "service_no": "10",
+                        "operator": "sbst",
+                        "next_bus": [
+                            {
+                                "estimated_arrival": (
+                                    now - timedelta(minutes=1)
+                                ).isoformat(),
+                                "bus_type": "sd",
+                                "feature": "wab",
+                                "load": "sea",
+                            },
+                            {
+                                "estimated_arrival": (
+                                    now + timedelta(minutes=5, seconds=30)
+                                ).isoformat(),
+                                "bus_type": "dd",
+                                "feature": "none",
+                                "load": "sda",
+                            },
+                            {
+                                "estimated_arrival": None,
+                                "bus_type": None,
+                                "feature": None,
+                                "load": None,
+                            },
+                        ],
+                    }
+                ]
+            },
+        },
+    }
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.side_effect = get_bus_arrivals
+
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    # the bus which already arrived is discarded
+    state = hass.states.get("sensor.sgbusarrivals_11111_10_next_bus_1_estimated_arrival")
+    assert state is not None
+    assert state.state == "5"
+    state = hass.states.get("sensor.sgbusarrivals_11111_10_next_bus_1_bus_type")
+    assert state is not None
+    assert state.state == "dd"
+    state = hass.states.get("sensor.sgbusarrivals_11111_10_next_bus_2_estimated_arrival")
+    assert state is not None
+    assert state.state == "unknown"
+
+    # the fetched bus arrivals are saved once the save interval has passed
+    fetched.set()
+    await hass.async_block_till_done(wait_background_tasks=True)
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=61))
+    await hass.async_block_till_done()
+
+    next_bus = hass_storage[f"{DOMAIN}.{config_entry.entry_id}.bus_arrivals"]["data"][
+        "bus_arrivals"
+    ]["11111"][0]["next_bus"][0]
+    assert next_bus["bus_type"] == "sd"
+    assert next_bus["estimated_arrival"] == (
+        now + timedelta(minutes=2, seconds=30)
+    ).isoformat()
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_restore_bus_arrivals_api_down(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+    hass_storage: dict[str, Any],
+    freezer: FrozenDateTimeFactory,
+) -> None:
+    """Test the restored bus arrivals count down while the api is down."""
+
+    now = dt_util.utcnow()
+    config_entry = create_config_entry(["11111"])
+    hass_storage[f"{DOMAIN}.{config_entry.entry_id}.bus_arrivals"] = {
+        "version": 1,
+        "key": f"{DOMAIN}.{config_entry.entry_id}.bus_arrivals",
+        "data": {
+            "saved": now.isoformat(),
+            "bus_arrivals": {
+                "11111": [
+                    {
+                        "service_no": "10",
+                        "operator": "sbst",
+                        "next_bus": [
+                            {
+                                "estimated_arrival": (
+                                    now + timedelta(minutes=5, seconds=30)
+                                ).isoformat(),
+                                "bus_type": "dd",
+                                "feature": "none",
+                                "load": "sda",
+                            },
+                        ],
+                    }
+                ]
+            },
+        },
+    }
+    mock_authenticate.side_effect = ApiGeneralError("/BusStops", 503)
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.side_effect = ApiGeneralError("/v3/BusArrival", 503)
+
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert config_entry.state is ConfigEntryState.LOADED
+
+    coordinator = config_entry.runtime_data.bus_arrivals_coordinator
+    assert not coordinator.last_update_success
+    entity_id = "sensor.sgbusarrivals_11111_10_next_bus_1_estimated_arrival"
+    state = hass.states.get(entity_id)
+    assert state is not None
+    assert state.state == "5"
+
+    # the minutes are recomputed on each failed refresh
+    for minutes in ("3", "1"):
+        freezer.tick(timedelta(minutes=2))
+        await coordinator.async_refresh()
+        await hass.async_block_till_done()
+        state = hass.states.get(entity_id)
+        assert state is not None
+        assert state.state == minutes
+
+    # unavailable once all restored buses have arrived
+    freezer.tick(timedelta(minutes=2))
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    state = hass.states.get(entity_id)
+    assert state is not None
+    assert state.state == "unavailable"
+
+    # without restored bus arrivals the setup is retried
+    assert await hass.config_entries.async_reload(config_entry.entry_id) is False
+    assert config_entry.state is ConfigEntryState.SETUP_RETRY
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_stops",
+    new_callable=AsyncMock,
+)
+async def test_saved_bus_stops(
+    mock_get_all_bus_stops: MagicMock,
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+    hass_storage: dict[str, Any],
+) -> None:
+    """Test the bus stops are saved and reused until they are too old."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.return_value = []
+    mock_get_all_bus_stops.return_value = {
+        "11111": BusStop("11111", "mock road", "stop 1", 1.3, 103.85)
+    }
+    config_entry = create_config_entry(["11111"])
+    key = f"{DOMAIN}.{config_entry.entry_id}.bus_stops"
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = config_entry.runtime_data.bus_arrivals_coordinator
+
+    text_index = await coordinator.get_bus_stop_text_index()
+    assert [bus_stop.bus_stop_code for bus_stop in text_index.search("stop", 5)] == [
+        "11111"
+    ]
+    assert hass_storage[key]["data"]["bus_stops"] == [
+        ["11111", "mock road", "stop 1", 1.3, 103.85]
+    ]
+
+    # the saved bus stops are loaded without the api after a reload
+    assert await hass.config_entries.async_reload(config_entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = config_entry.runtime_data.bus_arrivals_coordinator
+    assert await coordinator.get_all_bus_stops() == {
+        "11111": BusStop("11111", "mock road", "stop 1", 1.3, 103.85)
+    }
+    assert mock_get_all_bus_stops.call_count == 1
+
+    # old bus stops are used when they cannot be fetched
+    hass_storage[key]["data"]["saved"] = (
+        dt_util.utcnow() - timedelta(days=8)
+    ).isoformat()
+    mock_get_all_bus_stops.side_effect = ApiGeneralError("/BusStops", 500)
+    assert await hass.config_entries.async_reload(config_entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = config_entry.runtime_data.bus_arrivals_coordinator
+    assert "11111" in await coordinator.get_all_bus_stops()
+    assert mock_get_all_bus_stops.call_count == 2
+
+    # the saved bus stops are removed with the config entry
+    assert await hass.config_entries.async_remove(config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert key not in hass_storage
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_stops",
+    new_callable=AsyncMock,
+)
+async def test_nearby_bus_stops(
+    mock_get_all_bus_stops: MagicMock,
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test the nearby bus stops follow the tracker with hysteresis."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.return_value = []
+    # 0.001 degrees of latitude is about 111 m
+    mock_get_all_bus_stops.return_value = {
+        "11111": BusStop("11111", "mock road", "stop 1", 1.3, 103.8),
+        "22222": BusStop("22222", "mock road", "stop 2", 1.3011, 103.8),
+        "33333": BusStop("33333", "mock road", "stop 3", 1.298, 103.8),
+        "44444": BusStop("44444", "mock road", "stop 4", 1.35, 103.8),
+    }
+    hass.states.async_set(
+        "device_tracker.phone", "not_home", {"latitude": 1.3, "longitude": 103.8}
+    )
+
+    config_entry = create_config_entry([])
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    result = await hass.config_entries.subentries.async_init(
+        (config_entry.entry_id, SUBENTRY_TYPE_NEARBY_BUS_STOPS),
+        context={"source": SOURCE_USER},
+        data={SUBENTRY_CONF_TRACKER: "device_tracker.phone", SUBENTRY_CONF_COUNT: 2},
+    )
+    # the spatial index is built in an executor by a background task, the
+    # refresh requested for the nearby bus stops waits for the debounce cooldown
+    await hass.async_block_till_done(wait_background_tasks=True)
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=11))
+    await hass.async_block_till_done()
+    assert result.get("type") == "create_entry"
+
+    def get_nearby_bus_stops() -> list[tuple[str, int]]:
+        return [
+            (state.attributes["bus_stop_code"], state.attributes["distance"])
+            for state in (
+                hass.states.get(f"sensor.sgbusarrivals_nearby_bus_stop_phone_{rank}")
+                for rank in (1, 2)
+            )
+            if state is not None
+        ]
+
+    async def move(latitude: float) -> None:
+        hass.states.async_set(
+            "device_tracker.phone",
+            "not_home",
+            {"latitude": latitude, "longitude": 103.8},
+        )
+        await hass.async_block_till_done()
+
+    assert get_nearby_bus_stops() == [("11111", 0), ("22222", 122)]
+    assert {
+        call.args[0] for call in mock_get_bus_arrivals.call_args_list
+    } == {"11111", "22222"}
+
+    # small moves are ignored
+    await move(1.30005)
+    assert get_nearby_bus_stops() == [("11111", 0), ("22222", 122)]
+
+    # stop 3 is nearer than stop 2 but within the hysteresis
+    await move(1.2992)
+    assert get_nearby_bus_stops() == [("11111", 89), ("22222", 211)]
+
+    # stop 2 is replaced, stop 1 keeps its sensor
+    await move(1.2975)
+    assert get_nearby_bus_stops() == [("11111", 278), ("33333", 56)]
+
+    mock_get_bus_arrivals.reset_mock()
+    await config_entry.runtime_data.bus_arrivals_coordinator.async_refresh()
+    assert {
+        call.args[0] for call in mock_get_bus_arrivals.call_args_list
+    } == {"11111", "33333"}
+    assert mock_get_all_bus_stops.call_count == 1
+
+
+def create_train_service_alerts_config_entry() -> MockConfigEntry:
+    """Create a config entry with a train service alerts subentry."""
+    return MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+        },
+        subentries_data=[
+            ConfigSubentryData(
+                data={},
+                subentry_type=SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
+                title="Train Service Alerts",
+                unique_id=SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
+            )
+        ],
+    )
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_train_service_alerts",
+    new_callable=AsyncMock,
+)
+async def test_train_service_alerts_update_interval(
+    mock_get_train_service_alerts: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test train service alerts are polled faster while a line is disrupted."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_train_service_alerts.return_value = {
+        "ewl": TrainServiceAlert("normal", []),
+        "nsl": TrainServiceAlert("normal", []),
+    }
+
+    config_entry = create_train_service_alerts_config_entry()
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    coordinator = config_entry.runtime_data.train_service_alerts_coordinator
+    assert coordinator is not None
+    assert coordinator.update_interval == timedelta(
+        seconds=TRAIN_SERVICE_ALERTS_SCAN_INTERVAL_SECONDS
+    )
+
+    mock_get_train_service_alerts.return_value = {
+        "ewl": TrainServiceAlert("disrupted", ["mock message"]),
+        "nsl": TrainServiceAlert("normal", []),
+    }
+    await coordinator.async_refresh()
+    assert coordinator.update_interval == timedelta(
+        seconds=max(
+            MIN_SCAN_INTERVAL_SECONDS, TRAIN_SERVICE_ALERTS_MIN_SCAN_INTERVAL_SECONDS
+        )
+    )
+
+    mock_get_train_service_alerts.return_value = {
+        "ewl": TrainServiceAlert("normal", []),
+        "nsl": TrainServiceAlert("normal", []),
+    }
+    await coordinator.async_refresh()
+    assert coordinator.update_interval == timedelta(
+        seconds=TRAIN_SERVICE_ALERTS_SCAN_INTERVAL_SECONDS
+    )
+
+    # lines missing from the alerts are unavailable
+    await hass.async_block_till_done()
+    state = hass.states.get("sensor.sgbusarrivals_train_service_alert_ewl")
+    assert state is not None
+    assert state.state == "normal"
+    state = hass.states.get("sensor.sgbusarrivals_train_service_alert_ccl")
+    assert state is not None
+    assert state.state == "unavailable"
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_train_service_alerts",
+    new_callable=AsyncMock,
+)
+async def test_skip_disabled_train_service_alerts(
+    mock_get_train_service_alerts: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test train service alerts are not polled while all sensors are disabled."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_train_service_alerts.return_value = {
+        "ewl": TrainServiceAlert("normal", []),
+    }
+
+    config_entry = create_train_service_alerts_config_entry()
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    coordinator = config_entry.runtime_data.train_service_alerts_coordinator
+    assert coordinator is not None
+    entity_registry = er.async_get(hass)
+    entity_entries = [
+        entity_entry
+        for entity_entry in er.async_entries_for_config_entry(
+            entity_registry, config_entry.entry_id
+        )
+        if entity_entry.unique_id.startswith("train_service_alert_")
+    ]
+    assert entity_entries
+    for entity_entry in entity_entries[1:]:
+        entity_registry.async_update_entity(
+            entity_entry.entity_id, disabled_by=er.RegistryEntryDisabler.USER
+        )
+
+    # a single enabled sensor keeps the polling
+    mock_get_train_service_alerts.reset_mock()
+    await coordinator.async_refresh()
+    assert mock_get_train_service_alerts.call_count == 1
+
+    entity_registry.async_update_entity(
+        entity_entries[0].entity_id, disabled_by=er.RegistryEntryDisabler.USER
+    )
+    mock_get_train_service_alerts.reset_mock()
+    await coordinator.async_refresh()
+    assert mock_get_train_service_alerts.call_count == 0
+    assert coordinator.last_update_success
+    assert coordinator.data == {"ewl": TrainServiceAlert("normal", [])}
@@ -0,0 +1,129 @@
+"""Tests for the diagnostics."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from custom_components.sg_bus_arrivals.const import (
+    CONF_INSTRUMENTATION,
+    DOMAIN,
+    MIN_SCAN_INTERVAL_SECONDS,
+    SUBENTRY_CONF_BUS_STOP_CODE,
+    SUBENTRY_CONF_DESCRIPTION,
+    SUBENTRY_CONF_SERVICE_NO,
+    SUBENTRY_TYPE_BUS_SERVICE,
+    SUBENTRY_TYPE_BUS_STOP,
+    SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
+)
+from custom_components.sg_bus_arrivals.models import (
+    BusArrival,
+    NextBus,
+    TrainServiceAlert,
+)
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from pytest_homeassistant_custom_component.components.diagnostics import (
+    get_diagnostics_for_config_entry,
+)
+from pytest_homeassistant_custom_component.typing import ClientSessionGenerator
+
+from homeassistant.config_entries import ConfigSubentryData
+from homeassistant.const import CONF_API_KEY, CONF_SCAN_INTERVAL
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_train_service_alerts",
+    new_callable=AsyncMock,
+)
+async def test_diagnostics(
+    mock_get_train_service_alerts: MagicMock,
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+    hass_client: ClientSessionGenerator,
+) -> None:
+    """Test the diagnostics are redacted and serialise to JSON."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.return_value = [
+        BusArrival(
+            "11111",
+            "10",
+            "sbst",
+            [NextBus(3, estimated_arrival=dt_util.utcnow()), NextBus(), NextBus()],
+        )
+    ]
+    mock_get_train_service_alerts.return_value = {
+        "ewl": TrainServiceAlert("normal", [])
+    }
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+            CONF_INSTRUMENTATION: True,
+        },
+        subentries_data=[
+            ConfigSubentryData(
+                data={
+                    SUBENTRY_CONF_BUS_STOP_CODE: "11111",
+                    SUBENTRY_CONF_DESCRIPTION: "stop 1",
+                    SUBENTRY_CONF_SERVICE_NO: "10",
+                },
+                subentry_type=SUBENTRY_TYPE_BUS_SERVICE,
+                title="10 @stop 1",
+                unique_id="11111_10",
+            ),
+            ConfigSubentryData(
+                data={
+                    SUBENTRY_CONF_BUS_STOP_CODE: "11111",
+                    SUBENTRY_CONF_DESCRIPTION: "stop 1",
+                },
+                subentry_type=SUBENTRY_TYPE_BUS_STOP,
+                title="stop 1",
+                unique_id="11111",
+            ),
+            ConfigSubentryData(
+                data={},
+                subentry_type=SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
+                title="Train Service Alerts",
+                unique_id=SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
+            ),
+        ],
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    diagnostics = await get_diagnostics_for_config_entry(
+        hass, hass_client, config_entry
+    )
+
+    assert diagnostics["config_entry_data"][CONF_API_KEY] == "**REDACTED**"
+    assert diagnostics["config_entry_data"][CONF_INSTRUMENTATION]
+    assert diagnostics["bus_services"] == [
+        {SUBENTRY_CONF_BUS_STOP_CODE: "11111", SUBENTRY_CONF_SERVICE_NO: "10"}
+    ]
+    assert diagnostics["bus_stops"] == ["11111"]
+    assert diagnostics["train_service_alerts"] == "True"
+    assert set(diagnostics["coordinators"]) == {
+        "bus_arrivals",
+        "train_service_alerts",
+    }
+    assert diagnostics["coordinators"]["bus_arrivals"]["last_update_success"]
+    assert diagnostics["refresh_statistics"]
+    assert "caches" in diagnostics
@@ -0,0 +1,86 @@
+"""Tests for the integration setup and actions."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from custom_components.sg_bus_arrivals.const import (
+    DOMAIN,
+    MIN_SCAN_INTERVAL_SECONDS,
+    SERVICE_PROFILE,
+)
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from homeassistant.const import CONF_API_KEY, CONF_SCAN_INTERVAL
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+
+
+@patch("custom_components.sg_bus_arrivals.cProfile.Profile")
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_profile(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    mock_profile: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test the profile action profiles the refreshes and saves the results."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.return_value = []
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+        },
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    coordinator = config_entry.runtime_data.bus_arrivals_coordinator
+    with patch.object(
+        coordinator, "async_refresh", wraps=coordinator.async_refresh
+    ) as mock_refresh:
+        response = await hass.services.async_call(
+            DOMAIN,
+            SERVICE_PROFILE,
+            {"refresh_cycles": 2},
+            blocking=True,
+            return_response=True,
+        )
+
+    assert mock_refresh.call_count == 2
+    profiler = mock_profile.return_value
+    assert profiler.enable.call_count == 1
+    assert profiler.disable.call_count == 1
+    assert response is not None
+    assert response["filename"].startswith(hass.config.path(f"{DOMAIN}_profile_"))
+    profiler.dump_stats.assert_called_once_with(response["filename"])
+
+    # another active profiler fails the action instead of raising ValueError
+    profiler.enable.side_effect = ValueError(
+        "Another profiling tool is already active"
+    )
+    with pytest.raises(HomeAssistantError):
+        await hass.services.async_call(
+            DOMAIN,
+            SERVICE_PROFILE,
+            {"refresh_cycles": 1},
+            blocking=True,
+            return_response=True,
+        )
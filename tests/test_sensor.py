@@ -0,0 +1,557 @@
+"""Tests for the sensors."""
+
+import asyncio
+from dataclasses import asdict
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from custom_components.sg_bus_arrivals.const import (
+    CONF_ARRIVAL_HISTORY,
+    CONF_COMPACT_MODE,
+    CONF_FAST_STARTUP,
+    CONF_INSTRUMENTATION,
+    DOMAIN,
+    MIN_SCAN_INTERVAL_SECONDS,
+    SUBENTRY_CONF_BUS_STOP_CODE,
+    SUBENTRY_CONF_DESCRIPTION,
+    SUBENTRY_CONF_SERVICE_NO,
+    SUBENTRY_TYPE_BUS_SERVICE,
+    SUBENTRY_TYPE_BUS_STOP,
+    SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
+)
+from custom_components.sg_bus_arrivals.coordinator import SgBusArrivalsData
+from custom_components.sg_bus_arrivals.models import (
+    AffectedSegment,
+    BusArrival,
+    NextBus,
+    TrainServiceAlert,
+)
+from freezegun.api import FrozenDateTimeFactory
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    mock_restore_cache_with_extra_data,
+)
+
+from homeassistant.config_entries import ConfigEntryState, ConfigSubentryData
+from homeassistant.const import CONF_API_KEY, CONF_SCAN_INTERVAL
+from homeassistant.core import HomeAssistant, State
+from homeassistant.helpers import entity_registry as er
+from homeassistant.util import dt as dt_util
+
+
+def create_config_entry(
+    compact_mode: bool,
+    instrumentation: bool = False,
+    fast_startup: bool = False,
+    arrival_history: bool = False,
+) -> MockConfigEntry:
+    """Create a config entry with a single bus service."""
+    return MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+            CONF_COMPACT_MODE: compact_mode,
+            CONF_INSTRUMENTATION: instrumentation,
+            CONF_FAST_STARTUP: fast_startup,
+            CONF_ARRIVAL_HISTORY: arrival_history,
+        },
+        subentries_data=[
+            ConfigSubentryData(
+                data={
+                    SUBENTRY_CONF_BUS_STOP_CODE: "83139",
+                    SUBENTRY_CONF_DESCRIPTION: "mock description",
+                    SUBENTRY_CONF_SERVICE_NO: "15",
+                },
+                subentry_type=SUBENTRY_TYPE_BUS_SERVICE,
+                title="mock subentry",
+                unique_id="83139_15",
+            )
+        ],
+    )
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_compact_mode(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test compact mode creates a single sensor per bus service."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.return_value = [
+        BusArrival(
+            "83139",
+            "15",
+            "gas",
+            [NextBus(3, "sd", "wab", "sea"), NextBus(12, "dd", "none", "sda"), NextBus()],
+        )
+    ]
+
+    config_entry = create_config_entry(compact_mode=True)
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    entity_entries = er.async_entries_for_config_entry(
+        er.async_get(hass), config_entry.entry_id
+    )
+    assert sorted(entity_entry.unique_id for entity_entry in entity_entries) == [
+        "83139_15",
+        "circuit_breaker",
+    ]
+
+    # the circuit breaker sensor is added without the instrumentation
+    state = hass.states.get("sensor.sgbusarrivals_circuit_breaker")
+    assert state is not None
+    assert state.state == "closed"
+
+    state = hass.states.get("sensor.sgbusarrivals_83139_15")
+    assert state is not None
+    assert state.state == "3"
+    assert state.attributes["operator"] == "gas"
+    assert state.attributes["next_bus_estimated_arrivals"] == "3 / 12 / -"
+    assert state.attributes["next_bus_2_bus_type"] == "dd"
+    assert state.attributes["next_bus_3_estimated_arrival"] is None
+
+    # states are precomputed by the coordinator
+    sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+    coordinator = sg_bus_arrivals_data.bus_arrivals_coordinator
+    assert coordinator.states["83139_15"].native_value == 3
+
+    # unchanged states are not written again
+    last_updated = state.last_reported
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    state = hass.states.get("sensor.sgbusarrivals_83139_15")
+    assert state is not None
+    assert state.last_reported == last_updated
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_compact_mode_removes_stale_sensors(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test switching to compact mode removes the detailed sensors."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.return_value = []
+
+    config_entry = create_config_entry(compact_mode=False)
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    entity_registry: er.EntityRegistry = er.async_get(hass)
+    assert len(er.async_entries_for_config_entry(entity_registry, config_entry.entry_id)) == 18
+
+    hass.config_entries.async_update_entry(
+        config_entry, data={**config_entry.data, CONF_COMPACT_MODE: True}
+    )
+    await hass.async_block_till_done()
+
+    entity_entries = er.async_entries_for_config_entry(
+        entity_registry, config_entry.entry_id
+    )
+    assert sorted(entity_entry.unique_id for entity_entry in entity_entries) == [
+        "83139_15",
+        "circuit_breaker",
+    ]
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_bus_stop_sensor(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test the bus stop sensor lists all bus services by next arrival."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.return_value = [
+        BusArrival("83139", "15", "gas", [NextBus(), NextBus(), NextBus()]),
+        BusArrival("83139", "150", "sbst", [NextBus(7), NextBus(), NextBus()]),
+        BusArrival("83139", "43", "sbst", [NextBus(2), NextBus(9), NextBus()]),
+    ]
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+        },
+        subentries_data=[
+            ConfigSubentryData(
+                data={
+                    SUBENTRY_CONF_BUS_STOP_CODE: "83139",
+                    SUBENTRY_CONF_DESCRIPTION: "mock description",
+                },
+                subentry_type=SUBENTRY_TYPE_BUS_STOP,
+                title="mock subentry",
+                unique_id="bus_stop_83139",
+            )
+        ],
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert mock_get_bus_arrivals.call_count == 1
+
+    state = hass.states.get("sensor.sgbusarrivals_bus_stop_83139")
+    assert state is not None
+    assert state.state == "2"
+    assert [service["service_no"] for service in state.attributes["services"]] == [
+        "43",
+        "150",
+        "15",
+    ]
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_instrumentation_sensors(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test instrumentation adds diagnostic sensors, removed when turned off."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.return_value = [
+        BusArrival("83139", "15", "gas", [NextBus(3), NextBus(), NextBus()])
+    ]
+
+    config_entry = create_config_entry(compact_mode=True, instrumentation=True)
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    sg_bus_arrivals_data: SgBusArrivalsData = config_entry.runtime_data
+    coordinator = sg_bus_arrivals_data.bus_arrivals_coordinator
+    refreshes: int = coordinator.statistics.refreshes
+    assert refreshes > 0
+
+    # only changed states are counted
+    mock_get_bus_arrivals.return_value = [
+        BusArrival("83139", "15", "gas", [NextBus(2), NextBus(), NextBus()])
+    ]
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    assert coordinator.statistics.refreshes == refreshes + 1
+    assert coordinator.statistics.state_writes == 1
+
+    # state writes during the fan-out are shown after the next refresh
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    state = hass.states.get("sensor.sgbusarrivals_instrumentation_state_writes")
+    assert state is not None
+    assert state.state == "1"
+    assert hass.states.get("sensor.sgbusarrivals_instrumentation_api_requests")
+
+    hass.config_entries.async_update_entry(
+        config_entry, data={**config_entry.data, CONF_INSTRUMENTATION: False}
+    )
+    await hass.async_block_till_done()
+
+    entity_entries = er.async_entries_for_config_entry(
+        er.async_get(hass), config_entry.entry_id
+    )
+    assert sorted(entity_entry.unique_id for entity_entry in entity_entries) == [
+        "83139_15",
+        "circuit_breaker",
+    ]
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_fast_startup(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test fast startup restores the last state and fetches in the background."""
+
+    fetched = asyncio.Event()
+
+    async def get_bus_arrivals(bus_stop_code: str) -> list[BusArrival]:
+        await fetched.wait()
+        return [BusArrival("83139", "15", "gas", [NextBus(3), NextBus(), NextBus()])]
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.side_effect = get_bus_arrivals
+    mock_restore_cache_with_extra_data(
+        hass,
+        [
+            (
+                State(
+                    "sensor.sgbusarrivals_83139_15",
+                    "7",
+                    {"operator": "gas", "friendly_name": "mock"},
+                ),
+                {"native_value": 7, "native_unit_of_measurement": "min"},
+            )
+        ],
+    )
+
+    config_entry = create_config_entry(compact_mode=True, fast_startup=True)
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    # credentials are validated by the first fetch instead
+    assert not mock_authenticate.called
+    assert not mock_get_all_bus_services.called
+
+    state = hass.states.get("sensor.sgbusarrivals_83139_15")
+    assert state is not None
+    assert state.state == "7"
+    assert state.attributes["operator"] == "gas"
+
+    fetched.set()
+    await hass.async_block_till_done(wait_background_tasks=True)
+
+    state = hass.states.get("sensor.sgbusarrivals_83139_15")
+    assert state is not None
+    assert state.state == "3"
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_arrival_history_sensors(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+    freezer: FrozenDateTimeFactory,
+) -> None:
+    """Test the arrival history sensors are computed from the polls."""
+
+    start = dt_util.utcnow()
+
+    def set_first_arrival(seconds: int) -> None:
+        mock_get_bus_arrivals.return_value = [
+            BusArrival(
+                "83139",
+                "15",
+                "gas",
+                [
+                    NextBus(1, "sd", "wab", "sea", start + timedelta(seconds=seconds)),
+                    NextBus(),
+                    NextBus(),
+                ],
+            )
+        ]
+
+    mock_get_all_bus_services.return_value = {}
+    set_first_arrival(700)
+
+    config_entry = create_config_entry(compact_mode=True, arrival_history=True)
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    state = hass.states.get("sensor.sgbusarrivals_83139_15_headway")
+    assert state is not None
+    assert state.state == "unknown"
+
+    # the 1st bus arrives at 700 seconds and the 2nd bus at 1500 seconds, polled
+    # at most 5 scan intervals apart
+    coordinator = config_entry.runtime_data.bus_arrivals_coordinator
+    for polled, first_arrival in (
+        (690, 700),
+        (710, 1500),
+        *((polled, 1500) for polled in range(790, 1450, 80)),
+        (1450, 1500),
+        (1520, 2100),
+    ):
+        freezer.move_to(start + timedelta(seconds=polled))
+        set_first_arrival(first_arrival)
+        await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    for key, value in (
+        ("headway", "13.3"),
+        ("bunching", "0.0"),
+        ("prediction_error", "0.0"),
+    ):
+        state = hass.states.get(f"sensor.sgbusarrivals_83139_15_{key}")
+        assert state is not None
+        assert state.state == value
+    assert coordinator.get_cache_statistics()["arrival_history"]["bus_services"] == 1
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_train_service_alerts",
+    new_callable=AsyncMock,
+)
+async def test_train_service_alert_restore(
+    mock_get_train_service_alerts: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test the train service alerts are restored until the first fetch."""
+
+    fetched = asyncio.Event()
+
+    async def get_train_service_alerts() -> dict[str, TrainServiceAlert]:
+        await fetched.wait()
+        return {"ewl": TrainServiceAlert("normal", [])}
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_train_service_alerts.side_effect = get_train_service_alerts
+    segment = AffectedSegment("ewl", "pasir ris", ["EW1", "EW2"], [], [], "")
+    mock_restore_cache_with_extra_data(
+        hass,
+        [
+            (
+                State(
+                    "sensor.sgbusarrivals_train_service_alert_ewl",
+                    "disrupted",
+                    {
+                        "messages": ["mock message"],
+                        "affected_segments": [
+                            {
+                                "line": "ewl",
+                                "direction": "pasir ris",
+                                "stations": ["EW1", "EW2"],
+                                "free_public_bus": [],
+                                "free_mrt_shuttle": [],
+                                "mrt_shuttle_direction": "",
+                            }
+                        ],
+                    },
+                ),
+                {"native_value": "disrupted", "native_unit_of_measurement": None},
+            ),
+            (
+                State("sensor.sgbusarrivals_train_service_alert_nsl", "unknown"),
+                {"native_value": None, "native_unit_of_measurement": None},
+            ),
+        ],
+    )
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+            CONF_FAST_STARTUP: True,
+        },
+        subentries_data=[
+            ConfigSubentryData(
+                data={},
+                subentry_type=SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
+                title="Train Service Alerts",
+                unique_id=SUBENTRY_TYPE_TRAIN_SERVICE_ALERTS,
+            )
+        ],
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    state = hass.states.get("sensor.sgbusarrivals_train_service_alert_ewl")
+    assert state is not None
+    assert state.state == "disrupted"
+    assert state.attributes["messages"] == ["mock message"]
+    assert state.attributes["affected_segments"] == [asdict(segment)]
+    # lines without a last state, or with an unknown last state, are not restored
+    for line in ("nsl", "ccl"):
+        state = hass.states.get(f"sensor.sgbusarrivals_train_service_alert_{line}")
+        assert state is not None
+        assert state.state == "unavailable"
+
+    fetched.set()
+    await hass.async_block_till_done(wait_background_tasks=True)
+
+    state = hass.states.get("sensor.sgbusarrivals_train_service_alert_ewl")
+    assert state is not None
+    assert state.state == "normal"
+    assert state.attributes["messages"] == []
+    state = hass.states.get("sensor.sgbusarrivals_train_service_alert_nsl")
+    assert state is not None
+    assert state.state == "unavailable"
+
+    # the restore data of lines missing from the alerts is saved without errors
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert config_entry.state is ConfigEntryState.NOT_LOADED
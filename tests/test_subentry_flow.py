@@ -1,16 +1,32 @@
 """Tests for the config flow."""
 
+from datetime import timedelta
 from unittest.mock import AsyncMock, MagicMock, patch
 
+from custom_components.sg_bus_arrivals.api import ApiGeneralError
 from custom_components.sg_bus_arrivals.const import (
+    BUS_STOPS_MAX_AGE_DAYS,
+    BUS_STOPS_RETRY_HOURS,
     DOMAIN,
     MIN_SCAN_INTERVAL_SECONDS,
+    SUBENTRY_CONF_BUS_SERVICES,
     SUBENTRY_CONF_BUS_STOP_CODE,
     SUBENTRY_CONF_DESCRIPTION,
+    SUBENTRY_CONF_MINUTES,
+    SUBENTRY_CONF_NEARBY_DISTANCE,
+    SUBENTRY_CONF_SEARCH,
     SUBENTRY_CONF_SERVICE_NO,
+    SUBENTRY_TYPE_APPROACHING_BUS,
+    SUBENTRY_TYPE_BULK_BUS_SERVICES,
     SUBENTRY_TYPE_BUS_SERVICE,
 )
-from custom_components.sg_bus_arrivals.models import BusArrival, BusStop, NextBus
+from custom_components.sg_bus_arrivals.models import (
+    BusArrival,
+    BusStop,
+    NextBus,
+    OperatingHours,
+)
+from freezegun.api import FrozenDateTimeFactory
 from pytest_homeassistant_custom_component.common import MockConfigEntry
 
 from homeassistant.config_entries import SOURCE_USER, ConfigSubentryData
@@ -40,7 +56,9 @@ async def test_async_step_init(
 
     mock_authenticate.return_value = True
     mock_get_all_bus_services.return_value = {
-        "mock_bus_stop_code": ["mock_service_no", "mock_another_service_no"]
+        "mock_bus_stop_code": dict.fromkeys(
+            ("mock_service_no", "mock_another_service_no"), OperatingHours()
+        )
     }
 
     config_entry = MockConfigEntry(
@@ -212,3 +230,343 @@ async def notest_async_step_init_duplicate(
 
     assert mock_get_bus_arrivals.called
     assert result.get("reason") == "already_configured"
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_stops",
+    new_callable=AsyncMock,
+)
+async def test_bulk_bus_services(
+    mock_get_all_bus_stops: MagicMock,
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test bulk adding bus services across bus stops."""
+
+    mock_get_all_bus_services.return_value = {
+        "11111": dict.fromkeys(("10", "14", "16"), OperatingHours()),
+        "22222": dict.fromkeys(("30", "31"), OperatingHours()),
+    }
+    mock_get_bus_arrivals.return_value = []
+    mock_get_all_bus_stops.return_value = {
+        "11111": BusStop("11111", "mock road", "stop 1"),
+        "22222": BusStop("22222", "mock road", "stop 2"),
+    }
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+        },
+        subentries_data=[
+            ConfigSubentryData(
+                data={
+                    SUBENTRY_CONF_BUS_STOP_CODE: "11111",
+                    SUBENTRY_CONF_DESCRIPTION: "stop 1",
+                    SUBENTRY_CONF_SERVICE_NO: "10",
+                },
+                subentry_type=SUBENTRY_TYPE_BUS_SERVICE,
+                title="10 @stop 1",
+                unique_id="11111_10",
+            )
+        ],
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert mock_authenticate.call_count == 1
+
+    # invalid bus stops and bus services are reported
+    result = await hass.config_entries.subentries.async_init(
+        (config_entry.entry_id, SUBENTRY_TYPE_BULK_BUS_SERVICES),
+        context={"source": SOURCE_USER},
+        data={SUBENTRY_CONF_BUS_SERVICES: "11111, 10, 99\n33333"},
+    )
+    assert result.get("errors") == {"base": "invalid_bus_services"}
+    assert result.get("description_placeholders") == {"invalid": "99 @11111, 33333"}
+
+    result = await hass.config_entries.subentries.async_init(
+        (config_entry.entry_id, SUBENTRY_TYPE_BULK_BUS_SERVICES),
+        context={"source": SOURCE_USER},
+        data={SUBENTRY_CONF_BUS_SERVICES: "11111: 10 14\n\n22222"},
+    )
+    await hass.async_block_till_done()
+
+    assert result.get("reason") == "subentries_created"
+    assert sorted(
+        subentry.unique_id for subentry in config_entry.subentries.values()
+    ) == ["11111_10", "11111_14", "22222_30", "22222_31"]
+    # bus stops are loaded once and the config entry is not reloaded
+    assert mock_get_all_bus_stops.call_count == 1
+    assert mock_authenticate.call_count == 1
+    assert hass.states.get("sensor.sgbusarrivals_22222_31_next_bus_1_estimated_arrival")
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_stops",
+    new_callable=AsyncMock,
+)
+async def test_approaching_bus(
+    mock_get_all_bus_stops: MagicMock,
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test adding an approaching bus event."""
+
+    mock_get_all_bus_services.return_value = {
+        "11111": dict.fromkeys(("10", "14"), OperatingHours()),
+    }
+    mock_get_bus_arrivals.return_value = []
+    mock_get_all_bus_stops.return_value = {
+        "11111": BusStop("11111", "mock road", "stop 1"),
+    }
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+        },
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    result = await hass.config_entries.subentries.async_init(
+        (config_entry.entry_id, SUBENTRY_TYPE_APPROACHING_BUS),
+        context={"source": SOURCE_USER},
+        data={
+            SUBENTRY_CONF_BUS_STOP_CODE: "11111",
+            SUBENTRY_CONF_SERVICE_NO: "99",
+            SUBENTRY_CONF_MINUTES: 3,
+        },
+    )
+    assert result.get("errors") == {"base": "invalid_service_no"}
+
+    result = await hass.config_entries.subentries.async_init(
+        (config_entry.entry_id, SUBENTRY_TYPE_APPROACHING_BUS),
+        context={"source": SOURCE_USER},
+        data={
+            SUBENTRY_CONF_BUS_STOP_CODE: "11111",
+            SUBENTRY_CONF_SERVICE_NO: "14",
+            SUBENTRY_CONF_MINUTES: 3,
+        },
+    )
+    await hass.async_block_till_done()
+
+    assert result.get("type") == "create_entry"
+    assert result.get("title") == "14 @stop 1 within 3 min"
+    # the config entry is not reloaded
+    assert mock_authenticate.call_count == 1
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_stops",
+    new_callable=AsyncMock,
+)
+async def test_nearby_bus_stops(
+    mock_get_all_bus_stops: MagicMock,
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+) -> None:
+    """Test choosing a bus stop near home."""
+
+    await hass.config.async_update(latitude=1.3, longitude=103.85)
+    mock_get_all_bus_services.return_value = {
+        "11111": dict.fromkeys(("10", "14"), OperatingHours())
+    }
+    mock_get_bus_arrivals.return_value = []
+    mock_get_all_bus_stops.return_value = {
+        "11111": BusStop("11111", "mock road", "stop 1", 1.301, 103.85),
+        "22222": BusStop("22222", "mock road", "stop 2", 1.3, 103.8515),
+        "33333": BusStop("33333", "mock road", "stop 3", 1.31, 103.85),
+        "44444": BusStop("44444", "mock road", "stop 4"),
+    }
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+        },
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    result = await hass.config_entries.subentries.async_init(
+        (config_entry.entry_id, SUBENTRY_TYPE_BUS_SERVICE),
+        context={"source": SOURCE_USER},
+        data={},
+    )
+    assert result.get("errors") == {"base": "no_bus_stop"}
+
+    result = await hass.config_entries.subentries.async_init(
+        (config_entry.entry_id, SUBENTRY_TYPE_BUS_SERVICE),
+        context={"source": SOURCE_USER},
+        data={SUBENTRY_CONF_NEARBY_DISTANCE: 50},
+    )
+    assert result.get("reason") == "no_nearby_bus_stops"
+
+    # nearest first, stops further than the distance are excluded
+    result = await hass.config_entries.subentries.async_init(
+        (config_entry.entry_id, SUBENTRY_TYPE_BUS_SERVICE),
+        context={"source": SOURCE_USER},
+        data={SUBENTRY_CONF_NEARBY_DISTANCE: 500},
+    )
+    assert result.get("step_id") == "nearby"
+    options = result["data_schema"].schema[SUBENTRY_CONF_BUS_STOP_CODE].config[
+        "options"
+    ]
+    assert [option["value"] for option in options] == ["11111", "22222"]
+    assert options[0]["label"] == "stop 1, mock road (11111) - 111 m"
+
+    result = await hass.config_entries.subentries.async_configure(
+        result["flow_id"], {SUBENTRY_CONF_BUS_STOP_CODE: "11111"}
+    )
+    assert result.get("step_id") == "service_no"
+    assert result.get("errors") == {}
+
+    result = await hass.config_entries.subentries.async_configure(
+        result["flow_id"], {SUBENTRY_CONF_SERVICE_NO: ["14"]}
+    )
+    assert result.get("reason") == "subentries_created"
+    assert [
+        subentry.unique_id for subentry in config_entry.subentries.values()
+    ] == ["11111_14"]
+    assert mock_get_all_bus_stops.call_count == 1
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_stops",
+    new_callable=AsyncMock,
+)
+async def test_search_bus_stops(
+    mock_get_all_bus_stops: MagicMock,
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+    freezer: FrozenDateTimeFactory,
+) -> None:
+    """Test searching bus stops, with the bus stops fetched again when too old."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_bus_arrivals.return_value = []
+    mock_get_all_bus_stops.return_value = {
+        "11111": BusStop("11111", "mock road", "stop 1"),
+        "33333": BusStop("33333", "mock road", "stop 3"),
+    }
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+        },
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    async def search(query: str) -> list[dict[str, str]]:
+        """Return the bus stops matching the search, best first."""
+        result = await hass.config_entries.subentries.async_init(
+            (config_entry.entry_id, SUBENTRY_TYPE_BUS_SERVICE),
+            context={"source": SOURCE_USER},
+            data={SUBENTRY_CONF_SEARCH: query},
+        )
+        if result.get("errors") == {"base": "no_matching_bus_stops"}:
+            return []
+        assert result.get("step_id") == "search"
+        return result["data_schema"].schema[SUBENTRY_CONF_BUS_STOP_CODE].config[
+            "options"
+        ]
+
+    assert await search("xyz") == []
+    options = await search("stpo 3")
+    assert options[0] == {"value": "33333", "label": "stop 3, mock road (33333)"}
+    assert mock_get_all_bus_stops.call_count == 1
+
+    # the saved bus stops are used until too old, then fetched and indexed again
+    mock_get_all_bus_stops.return_value = {
+        **mock_get_all_bus_stops.return_value,
+        "55555": BusStop("55555", "new road", "stop 5"),
+    }
+    freezer.tick(timedelta(days=BUS_STOPS_MAX_AGE_DAYS - 1))
+    assert await search("55555") == []
+    assert mock_get_all_bus_stops.call_count == 1
+
+    freezer.tick(timedelta(days=2))
+    options = await search("55555")
+    assert options[0]["value"] == "55555"
+    assert mock_get_all_bus_stops.call_count == 2
+
+    # the old bus stops are kept when the fetch fails, which is retried later
+    mock_get_all_bus_stops.side_effect = ApiGeneralError("/BusStops", 500)
+    freezer.tick(timedelta(days=BUS_STOPS_MAX_AGE_DAYS, hours=1))
+    assert (await search("55555"))[0]["value"] == "55555"
+    assert (await search("55555"))[0]["value"] == "55555"
+    assert mock_get_all_bus_stops.call_count == 3
+    freezer.tick(timedelta(hours=BUS_STOPS_RETRY_HOURS, minutes=1))
+    assert (await search("55555"))[0]["value"] == "55555"
+    assert mock_get_all_bus_stops.call_count == 4
@@ -0,0 +1,220 @@
+"""Tests for the websocket API."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from custom_components.sg_bus_arrivals.api import ApiGeneralError
+from custom_components.sg_bus_arrivals.const import (
+    DOMAIN,
+    MIN_SCAN_INTERVAL_SECONDS,
+    SUBENTRY_CONF_BUS_STOP_CODE,
+    SUBENTRY_CONF_DESCRIPTION,
+    SUBENTRY_CONF_SERVICE_NO,
+    SUBENTRY_TYPE_BUS_SERVICE,
+)
+from custom_components.sg_bus_arrivals.models import BusArrival, BusStop, NextBus
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from pytest_homeassistant_custom_component.typing import WebSocketGenerator
+
+from homeassistant.config_entries import ConfigSubentryData
+from homeassistant.const import CONF_API_KEY, CONF_SCAN_INTERVAL
+from homeassistant.core import HomeAssistant
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_stops",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_subscribe(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_stops: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+) -> None:
+    """Test a snapshot of the bus stop is sent, then only the changes."""
+
+    bus_arrivals: dict[str, list[BusArrival]] = {
+        "11111": [
+            BusArrival("11111", "10", "sbst", [NextBus(3), NextBus(), NextBus()])
+        ],
+        "22222": [
+            BusArrival("22222", "14", "sbst", [NextBus(5), NextBus(), NextBus()]),
+            BusArrival("22222", "16", "smrt", [NextBus(7), NextBus(), NextBus()]),
+        ],
+    }
+
+    async def get_bus_arrivals(bus_stop_code: str) -> list[BusArrival]:
+        return bus_arrivals[bus_stop_code]
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_all_bus_stops.return_value = {
+        "11111": BusStop("11111", "mock road", "stop 1"),
+        "22222": BusStop("22222", "mock road", "stop 2"),
+    }
+    mock_get_bus_arrivals.side_effect = get_bus_arrivals
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+        },
+        subentries_data=[
+            ConfigSubentryData(
+                data={
+                    SUBENTRY_CONF_BUS_STOP_CODE: "11111",
+                    SUBENTRY_CONF_DESCRIPTION: "stop 1",
+                    SUBENTRY_CONF_SERVICE_NO: "10",
+                },
+                subentry_type=SUBENTRY_TYPE_BUS_SERVICE,
+                title="10 @stop 1",
+                unique_id="11111_10",
+            )
+        ],
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    client = await hass_ws_client(hass)
+    await client.send_json_auto_id(
+        {"type": "sg_bus_arrivals/subscribe", "bus_stop_code": "99999"}
+    )
+    msg = await client.receive_json()
+    assert not msg["success"]
+    assert msg["error"]["code"] == "not_found"
+
+    # the subscribed bus stop has no sensors, so it is not polled yet
+    await client.send_json_auto_id(
+        {"type": "sg_bus_arrivals/subscribe", "bus_stop_code": "22222"}
+    )
+    msg = await client.receive_json()
+    assert msg["success"]
+    msg = await client.receive_json()
+    assert msg["event"] == {"bus_stop_code": "22222", "services": {}}
+
+    coordinator = config_entry.runtime_data.bus_arrivals_coordinator
+    await coordinator.async_refresh()
+    msg = await client.receive_json()
+    assert set(msg["event"]["changed"]) == {"14", "16"}
+    assert msg["event"]["changed"]["16"]["operator"] == "smrt"
+    assert msg["event"]["changed"]["16"]["next_bus"][0]["minutes"] == 7
+    assert msg["event"]["removed"] == []
+
+    # unchanged bus stops send nothing, changed bus stops send only the changes
+    await coordinator.async_refresh()
+    bus_arrivals["22222"] = [
+        BusArrival("22222", "14", "sbst", [NextBus(4), NextBus(), NextBus()])
+    ]
+    await coordinator.async_refresh()
+    msg = await client.receive_json()
+    assert list(msg["event"]["changed"]) == ["14"]
+    assert msg["event"]["changed"]["14"]["next_bus"][0]["minutes"] == 4
+    assert msg["event"]["removed"] == ["16"]
+
+    # the bus stop is no longer polled after unsubscribing
+    await client.send_json_auto_id(
+        {"type": "unsubscribe_events", "subscription": msg["id"]}
+    )
+    msg = await client.receive_json()
+    assert msg["success"]
+    mock_get_bus_arrivals.reset_mock()
+    await coordinator.async_refresh()
+    assert {call.args[0] for call in mock_get_bus_arrivals.call_args_list} == {
+        "11111"
+    }
+
+
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.authenticate",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_services",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_all_bus_stops",
+    new_callable=AsyncMock,
+)
+@patch(
+    "custom_components.sg_bus_arrivals.api.SgBusArrivals.get_bus_arrivals",
+    new_callable=AsyncMock,
+)
+async def test_subscribe_reload(
+    mock_get_bus_arrivals: MagicMock,
+    mock_get_all_bus_stops: MagicMock,
+    mock_get_all_bus_services: MagicMock,
+    mock_authenticate: MagicMock,
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+) -> None:
+    """Test the subscription ends when the config entry is reloaded."""
+
+    mock_get_all_bus_services.return_value = {}
+    mock_get_all_bus_stops.side_effect = ApiGeneralError("/BusStops", 500)
+    mock_get_bus_arrivals.return_value = [
+        BusArrival("11111", "10", "sbst", [NextBus(3), NextBus(), NextBus()])
+    ]
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        unique_id="test_api",
+        data={
+            CONF_API_KEY: "mock account key",
+            CONF_SCAN_INTERVAL: MIN_SCAN_INTERVAL_SECONDS,
+        },
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    client = await hass_ws_client(hass)
+    await client.send_json_auto_id(
+        {"type": "sg_bus_arrivals/subscribe", "bus_stop_code": "11111"}
+    )
+    msg = await client.receive_json()
+    assert not msg["success"]
+    assert msg["error"]["code"] == "home_assistant_error"
+
+    mock_get_all_bus_stops.side_effect = None
+    mock_get_all_bus_stops.return_value = {
+        "11111": BusStop("11111", "mock road", "stop 1"),
+    }
+    await client.send_json_auto_id(
+        {"type": "sg_bus_arrivals/subscribe", "bus_stop_code": "11111"}
+    )
+    msg = await client.receive_json()
+    assert msg["success"]
+    subscription: int = msg["id"]
+    msg = await client.receive_json()
+    assert msg["event"] == {"bus_stop_code": "11111", "services": {}}
+    await config_entry.runtime_data.bus_arrivals_coordinator.async_refresh()
+    msg = await client.receive_json()
+    assert list(msg["event"]["changed"]) == ["10"]
+
+    assert await hass.config_entries.async_reload(config_entry.entry_id)
+    await hass.async_block_till_done()
+    msg = await client.receive_json()
+    assert msg["id"] == subscription
+    assert not msg["success"]
+    assert msg["error"]["code"] == "not_found"
+
+    # the reloaded coordinator does not poll the ended subscription
+    mock_get_bus_arrivals.reset_mock()
+    await config_entry.runtime_data.bus_arrivals_coordinator.async_refresh()
+    mock_get_bus_arrivals.assert_not_called()